@@ -0,0 +1,7 @@
+"""بنچمارک آفلاین مسیرهای پرتکرار ربات
+
+با دیتابیس مصنوعی، Bot جعلی و Gemini جعلی اجرا می‌شود و به شبکه نیازی ندارد:
+
+    python -m benchmarks.run --users 1000 --tasks 20 --output bench.json
+    python -m benchmarks.run --baseline bench.json
+"""
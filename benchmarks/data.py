@@ -0,0 +1,85 @@
+"""تولید داده مصنوعی برای بنچمارک"""
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from database import DailySummary, Task, User, productivity_score, scheduled_epoch
+
+TITLES = {
+    'lesson': ['کلاس ریاضی', 'درس فیزیک', 'مطالعه شیمی', 'کلاس زبان'],
+    'work': ['جلسه تیم', 'گزارش پروژه', 'جلسه کاری', 'بررسی کد'],
+    'sport': ['باشگاه', 'دویدن', 'شنا', 'یوگا'],
+    'personal': ['ناهار', 'دکتر', 'خرید', 'استراحت'],
+    'exam': ['امتحان فیزیک', 'آزمون ریاضی', 'کوئیز زبان'],
+}
+
+SAMPLE_TEXTS = [
+    "فردا ساعت ۱۰ جلسه ریاضی",
+    "پس‌فردا امتحان فیزیک دارم",
+    "شنبه ساعت ۱۴ جلسه کاری",
+    "ساعت ۵ عصر باشگاه",
+    "۱۵ آبان ساعت ۹ صبح دکتر",
+    "امروز ساعت ۸ شب به مدت ۲ ساعت مطالعه",
+    "می‌خوام یه چیزی برای هفته بعد بنویسم",
+]
+
+
+async def populate(db, users, tasks_per_user, days=7, seed=1, batch_size=5000):
+    """پر کردن دیتابیس با users کاربر و tasks_per_user تسک برای هر کدام
+
+    تسک‌ها در days روز اطراف امروز پخش می‌شوند و خلاصه‌های روزانه هم
+    مطابق آن‌ها ساخته می‌شوند. شناسه تلگرام کاربران 1 تا users است.
+    """
+    rng = random.Random(seed)
+    today = datetime.now().date()
+    types = list(TITLES)
+
+    async with db.engine.begin() as conn:
+        for first in range(1, users + 1, batch_size):
+            await conn.execute(insert(User), [
+                {'telegram_id': user_id, 'username': f'user{user_id}', 'first_name': f'کاربر {user_id}'}
+                for user_id in range(first, min(first + batch_size, users + 1))
+            ])
+
+        rows = []
+        counts = {}
+        for user_id in range(1, users + 1):
+            for _ in range(tasks_per_user):
+                date = (today + timedelta(days=rng.randint(-(days // 2), days // 2))).isoformat()
+                time = f"{rng.randint(6, 22):02d}:{rng.choice([0, 15, 30, 45]):02d}"
+                task_type = rng.choice(types)
+                status = rng.choices(['pending', 'completed', 'missed'], weights=[5, 4, 1])[0]
+                rows.append({
+                    'user_id': user_id,
+                    'title': rng.choice(TITLES[task_type]),
+                    'task_type': task_type,
+                    'scheduled_date': date,
+                    'scheduled_time': time,
+                    'scheduled_at': scheduled_epoch(date, time),
+                    'duration': rng.choice([30, 45, 60, 90]),
+                    'reminder_before': 15,
+                    'status': status,
+                    'notes': '',
+                    'reminder_sent': False,
+                })
+                completed, total = counts.get((user_id, date), (0, 0))
+                counts[(user_id, date)] = (completed + (status == 'completed'), total + 1)
+            if len(rows) >= batch_size:
+                await conn.execute(insert(Task), rows)
+                rows = []
+        if rows:
+            await conn.execute(insert(Task), rows)
+
+        summaries = [
+            {
+                'user_id': user_id, 'date': date,
+                'completed_tasks': completed, 'total_tasks': total,
+                'productivity_score': productivity_score(completed, total),
+            }
+            for (user_id, date), (completed, total) in counts.items()
+        ]
+        for first in range(0, len(summaries), batch_size):
+            await conn.execute(insert(DailySummary), summaries[first:first + batch_size])
+
+    return users * tasks_per_user
@@ -0,0 +1,232 @@
+"""اجرای بنچمارک‌ها و مقایسه با یک baseline ذخیره شده
+
+    python -m benchmarks.run --users 1000 --tasks 20 --output bench.json
+    python -m benchmarks.run --users 1000 --tasks 20 --baseline bench.json
+
+خروجی JSON است: برای هر بنچمارک تعداد اجرا و زمان‌ها به میلی‌ثانیه.
+با --baseline اگر p50 هر بنچمارک بیش از threshold برابر کندتر شده باشد
+کد خروج 1 برمی‌گردد.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+
+def summarize(samples):
+    """آمار زمان‌ها (ثانیه) به میلی‌ثانیه"""
+    ordered = sorted(samples)
+
+    def percentile(fraction):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000
+
+    return {
+        'n': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+        'p50_ms': round(percentile(0.5), 3),
+        'p95_ms': round(percentile(0.95), 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+
+
+async def measure(func, iterations):
+    samples = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        await func(i)
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+async def run_benchmarks(args):
+    # ماژول‌های ربات بعد از تنظیم متغیرهای محیطی import می‌شوند
+    import database
+    from benchmarks.data import SAMPLE_TEXTS, populate
+    from chart_generator import chart_generator
+    from fakes import FakeBot, FakeGeminiModel
+    from gemini_processor import GeminiProcessor
+    from outbox import Outbox
+    from scheduler import TaskScheduler
+
+    db = database.db
+    rng = random.Random(args.seed)
+    results = {}
+    today = datetime.now().strftime('%Y-%m-%d')
+
+    await db.init()
+    started = time.perf_counter()
+    task_count = await populate(db, args.users, args.tasks, seed=args.seed)
+    populate_seconds = time.perf_counter() - started
+
+    def some_user():
+        return rng.randint(1, args.users)
+
+    results['db.get_upcoming_tasks'] = await measure(
+        lambda i: db.get_upcoming_tasks(some_user(), hours=72), args.iterations
+    )
+
+    # خواندن از دیتابیس (کش روز قبل از هر بار خالی می‌شود) و خواندن تکراری از کش
+    async def today_uncached(i):
+        db.day_cache.clear()
+        await db.get_today_tasks(some_user())
+
+    results['db.get_today_tasks'] = await measure(today_uncached, args.iterations)
+    hot_users = rng.sample(range(1, args.users + 1), min(args.users, 20))
+    for user_id in hot_users:
+        await db.get_today_tasks(user_id)
+    results['db.get_today_tasks[cached]'] = await measure(
+        lambda i: db.get_today_tasks(hot_users[i % len(hot_users)]), args.iterations
+    )
+
+    # رندر مستقیم بدون کش نمودار تا هزینه واقعی backend دیده شود
+    chart_iterations = max(1, min(args.iterations, args.chart_iterations))
+    day_rows = []
+    while len(day_rows) < chart_iterations:
+        tasks = await db.get_today_tasks(some_user())
+        if tasks:
+            day_rows.append([
+                (task.title, task.task_type, task.scheduled_time, task.duration, task.status)
+                for task in tasks
+            ])
+
+    async def daily_chart(i):
+        await chart_generator.render(
+            chart_generator.backend.render_daily_chart, day_rows[i], today, chart_generator.colors
+        )
+
+    results[f'chart.daily[{chart_generator.backend_name}]'] = await measure(daily_chart, chart_iterations)
+    results[f'chart.productivity[{chart_generator.backend_name}]'] = await measure(
+        lambda i: chart_generator.generate_productivity_chart(some_user()), chart_iterations
+    )
+
+    processor = GeminiProcessor(model=FakeGeminiModel())
+
+    async def fallback(i):
+        processor.fallback_parsing(SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)])
+
+    async def extract_time(i):
+        processor.extract_time(SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)])
+
+    results['gemini.fallback_parsing'] = await measure(fallback, args.iterations)
+    results['gemini.extract_time'] = await measure(extract_time, args.iterations)
+
+    # fan-out خلاصه روزانه با Bot جعلی و بدون محدودیت نرخ، تا خود مسیر سنجیده شود
+    bot = FakeBot()
+    outbox = Outbox(bot, rate=1e6, per_chat_rate=1e6, per_chat_burst=1000)
+    outbox.start()
+    scheduler = TaskScheduler(outbox)
+    started = time.perf_counter()
+    report = await scheduler.send_daily_summary()
+    results['scheduler.send_daily_summary'] = dict(
+        summarize([time.perf_counter() - started]),
+        recipients=report.total,
+        messages=len(bot.sent),
+    )
+
+    # مسیر یادآوری: claim، خواندن تسک و ارسال از طریق صف
+    reminder_ids = [
+        task.id
+        for user_id in rng.sample(range(1, args.users + 1), min(args.users, args.iterations))
+        for task in (await db.get_upcoming_tasks(user_id, hours=96))[:1]
+        if not isinstance(task.id, str)
+    ]
+    if reminder_ids:
+        results['scheduler.send_task_reminder'] = await measure(
+            lambda i: scheduler.send_task_reminder(reminder_ids[i]), len(reminder_ids)
+        )
+
+    # زمان import ربات در پروسس تازه (همان اندازه‌گیری startup.py)
+    from startup import measure_import
+    results['startup.import_bot'] = summarize([
+        await asyncio.to_thread(measure_import) for _ in range(args.import_iterations)
+    ])
+
+    await outbox.stop()
+    chart_generator.shutdown()
+    await db.close()
+
+    return {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'users': args.users,
+            'tasks_per_user': args.tasks,
+            'tasks': task_count,
+            'iterations': args.iterations,
+            'chart_backend': chart_generator.backend_name,
+            'populate_seconds': round(populate_seconds, 3),
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold):
+    """جدول مقایسه p50 و لیست بنچمارک‌هایی که کندتر شده‌اند"""
+    regressions = []
+    lines = [f"{'benchmark':<40} {'baseline':>10} {'current':>10} {'ratio':>7}"]
+    for name, stats in current['results'].items():
+        base = baseline.get('results', {}).get(name)
+        if base is None or not base['p50_ms']:
+            lines.append(f"{name:<40} {'-':>10} {stats['p50_ms']:>10.3f} {'new':>7}")
+            continue
+        ratio = stats['p50_ms'] / base['p50_ms']
+        flag = ''
+        if ratio > threshold:
+            regressions.append(name)
+            flag = '  ❌'
+        lines.append(f"{name:<40} {base['p50_ms']:>10.3f} {stats['p50_ms']:>10.3f} {ratio:>7.2f}{flag}")
+    return "\n".join(lines), regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="بنچمارک آفلاین مسیرهای پرتکرار ربات")
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--tasks', type=int, default=20, help="تعداد تسک هر کاربر")
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--chart-iterations', type=int, default=20)
+    parser.add_argument('--import-iterations', type=int, default=5)
+    parser.add_argument('--chart-backend', choices=['plotly', 'native'])
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="مسیر فایل JSON نتیجه (پیش‌فرض: stdout)")
+    parser.add_argument('--baseline', help="فایل JSON یک اجرای قبلی برای مقایسه")
+    parser.add_argument('--threshold', type=float, default=1.25, help="حداکثر نسبت مجاز p50 به baseline")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='scheduler-bench-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['CHART_CACHE_DIR'] = os.path.join(workdir, 'chart_cache')
+    if args.chart_backend:
+        os.environ['CHART_BACKEND'] = args.chart_backend
+
+    try:
+        current = asyncio.run(run_benchmarks(args))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(current, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        table, regressions = compare(current, baseline, args.threshold)
+        print(table, file=sys.stderr)
+        if regressions:
+            print(f"❌ regressions: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
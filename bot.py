@@ -1,45 +1,131 @@
+from startup import startup_report
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
 import database as db
 import gemini_processor as gemini
 import chart_generator as chart_gen
 from scheduler import TaskScheduler
+from outbox import Outbox
+from transcription_service import transcription_service, TranscriptionBusy
+import voice_ingest
+import task_io
+import recurrence
+from occupancy import occupancy
+from metrics import metrics, MetricsExporter
+from webhook import WebhookServer
 import config
 from datetime import datetime
-import os
+import asyncio
 import io
+import signal
+import tempfile
 
-# ایجاد دایرکتوری برای فایل‌های موقت
-os.makedirs('temp', exist_ok=True)
+startup_report.mark('imports')
 
 class TelegramSchedulerBot:
     def __init__(self):
-        self.application = Application.builder().token(config.BOT_TOKEN).build()
-        self.scheduler = TaskScheduler(config.BOT_TOKEN)
-        self.setup_handlers()
+        with startup_report.phase('build application'):
+            self.application = (
+                Application.builder()
+                .token(config.BOT_TOKEN)
+                .post_init(self.post_init)
+                .post_shutdown(self.post_shutdown)
+                .concurrent_updates(config.CONCURRENT_UPDATES)
+                .build()
+            )
+            self.outbox = Outbox(self.application.bot)
+            self.scheduler = TaskScheduler(self.outbox)
+            self.metrics_exporter = MetricsExporter()
+            self.setup_handlers()
+        self._warm_up_task = None
+    
+    async def post_init(self, application: Application):
+        """آماده‌سازی دیتابیس، زمان‌بند و موتور یادآوری بعد از آماده شدن event loop"""
+        with startup_report.phase('database init'):
+            await db.db.init()
+        self.outbox.start()
+        await self.metrics_exporter.start()
+        with startup_report.phase('scheduler and reminders'):
+            await self.scheduler.start()
+        startup_report.mark('ready for updates')
+        
+        # زیرسیستم‌های سنگین همزمان با شروع polling گرم می‌شوند
+        self._warm_up_task = asyncio.create_task(self.warm_up())
+    
+    async def warm_up(self):
+        """آماده‌سازی نمودار، Whisper و Gemini در پس‌زمینه"""
+        try:
+            with startup_report.phase('chart renderer (background)'):
+                await chart_gen.chart_generator.start()
+            if transcription_service.available:
+                transcription_service.start()
+            with startup_report.phase('gemini sdk (background)'):
+                await gemini.gemini_processor.warm_up()
+        except Exception as e:
+            print(f"Error warming up subsystems: {e}")
+        print(startup_report.report())
+    
+    async def post_shutdown(self, application: Application):
+        if self._warm_up_task is not None:
+            self._warm_up_task.cancel()
+        await self.scheduler.shutdown()
+        await self.outbox.stop()
+        chart_gen.chart_generator.shutdown()
+        await transcription_service.stop()
+        await self.metrics_exporter.stop()
+        await db.db.close()
+    
+    async def reply_text(self, update: Update, text, **kwargs):
+        """پاسخ متنی از طریق صف ارسال با اولویت تعاملی"""
+        return await self.outbox.send_message(update.effective_chat.id, text, **kwargs)
+    
+    async def reply_photo(self, update: Update, photo, **kwargs):
+        return await self.outbox.send_photo(update.effective_chat.id, photo, **kwargs)
+    
+    async def reply_document(self, update: Update, document, **kwargs):
+        return await self.outbox.send_document(update.effective_chat.id, document, **kwargs)
+    
+    def instrumented(self, name, callback):
+        """ثبت زمان و خطاهای هر هندلر در متریک‌ها"""
+        async def handler(update, context):
+            with metrics.timer('bot_handler_seconds', handler=name):
+                try:
+                    return await callback(update, context)
+                except Exception:
+                    metrics.inc('bot_handler_errors_total', handler=name)
+                    raise
+        return handler
     
     def setup_handlers(self):
         """تنظیم هندلرهای ربات"""
         
         # دستورات
-        self.application.add_handler(CommandHandler("start", self.start_command))
-        self.application.add_handler(CommandHandler("help", self.help_command))
-        self.application.add_handler(CommandHandler("today", self.show_today_tasks))
-        self.application.add_handler(CommandHandler("schedule", self.show_schedule))
-        self.application.add_handler(CommandHandler("summary", self.show_weekly_summary))
-        self.application.add_handler(CommandHandler("add", self.add_task_command))
+        for command, callback in (
+            ("start", self.start_command),
+            ("help", self.help_command),
+            ("today", self.show_today_tasks),
+            ("schedule", self.show_schedule),
+            ("summary", self.show_weekly_summary),
+            ("add", self.add_task_command),
+            ("export", self.export_tasks),
+        ):
+            self.application.add_handler(CommandHandler(command, self.instrumented(command, callback)))
         
         # پیام‌ها
-        self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_text))
-        self.application.add_handler(MessageHandler(filters.VOICE, self.handle_voice))
+        self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.instrumented('text', self.handle_text)))
+        self.application.add_handler(MessageHandler(filters.VOICE, self.instrumented('voice', self.handle_voice)))
+        self.application.add_handler(MessageHandler(
+            filters.Document.FileExtension("csv") | filters.Document.FileExtension("ics"),
+            self.instrumented('document', self.handle_document)
+        ))
         
         # callback queries برای دکمه‌ها
-        self.application.add_handler(CallbackQueryHandler(self.handle_button_click))
+        self.application.add_handler(CallbackQueryHandler(self.instrumented('button', self.handle_button_click)))
     
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """دستور /start"""
         user = update.effective_user
-        db.db.add_user(user.id, user.username, user.first_name)
+        await db.db.add_user(user.id, user.username, user.first_name)
         
         welcome_text = (
             "🤖 **به ربات برنامه‌ریزی هوشمند خوش آمدید!**\n\n"
@@ -64,11 +150,12 @@ class TelegramSchedulerBot:
         ]
         reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
         
-        await update.message.reply_text(welcome_text, reply_markup=reply_markup, parse_mode='Markdown')
+        await self.reply_text(update, welcome_text, reply_markup=reply_markup, parse_mode='Markdown')
     
     async def add_task_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """دستور /add برای اضافه کردن تسک"""
-        await update.message.reply_text(
+        await self.reply_text(
+            update,
             "لطفاً تسک خود را به صورت متن یا ویس ارسال کنید. مثال‌ها:\n\n"
             "• \"فردا ساعت ۱۰ جلسه ریاضی\"\n"
             "• \"پس‌فردا امتحان فیزیک دارم\"\n"
@@ -76,6 +163,71 @@ class TelegramSchedulerBot:
             "• \"شنبه ساعت ۱۴ جلسه کاری\""
         )
     
+    async def handle_document(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """ورود گروهی تسک‌ها از فایل CSV یا iCalendar، بدون Gemini"""
+        document = update.message.document
+        user_id = update.effective_user.id
+        
+        if document.file_size and document.file_size > config.IMPORT_MAX_BYTES:
+            await self.reply_text(
+                update,
+                f"❌ فایل خیلی بزرگ است (حداکثر {config.IMPORT_MAX_BYTES // 1024} کیلوبایت)."
+            )
+            return
+        
+        await self.reply_text(update, "📥 در حال وارد کردن برنامه‌ها از فایل...")
+        buffer = io.BytesIO()
+        try:
+            telegram_file = await document.get_file()
+            await telegram_file.download_to_memory(buffer)
+            buffer.seek(0)
+            kind = 'ics' if (document.file_name or '').lower().endswith('.ics') else 'csv'
+            stream = io.TextIOWrapper(buffer, encoding='utf-8-sig', errors='replace', newline='')
+            report = await task_io.import_tasks(user_id, stream, kind, self.scheduler)
+        except Exception as e:
+            print(f"Error importing tasks: {e}")
+            await self.reply_text(update, "❌ خطا در خواندن فایل. لطفاً فرمت فایل را بررسی کنید.")
+            return
+        
+        response_text = f"✅ {report.imported} تسک وارد شد."
+        if report.recurring:
+            response_text += f"\n🔁 {report.recurring} برنامه تکراری ثبت شد."
+        if report.invalid:
+            lines = "، ".join(str(line) for line in report.invalid_lines[:10])
+            response_text += f"\n⚠️ {report.invalid} ردیف نامعتبر نادیده گرفته شد (خط {lines})."
+        await self.reply_text(update, response_text)
+    
+    async def export_tasks(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """دستور /export: همه برنامه‌ها به صورت فایل iCalendar"""
+        user_id = update.effective_user.id
+        # تولید فایل batch به batch از دیتابیس است و بیش از EXPORT_SPOOL_BYTES روی دیسک می‌رود؛
+        # ولی آپلود streaming نیست: InputFile تلگرام کل فایل را هنگام ارسال در حافظه می‌خواند
+        with tempfile.SpooledTemporaryFile(max_size=config.EXPORT_SPOOL_BYTES) as out:
+            count = await task_io.export_ics(user_id, out)
+            if not count:
+                await self.reply_text(update, "📭 هیچ برنامه‌ای برای خروجی گرفتن ثبت نشده است.")
+                return
+            out.seek(0)
+            await self.reply_document(
+                update, out, filename='schedule.ics',
+                caption=f"📤 {count} برنامه؛ این فایل را در تقویم خود وارد کنید."
+            )
+    
+    async def conflict_warning(self, user_id, task_data):
+        """هشدار تداخل تسک جدید با برنامه‌های ثبت شده و پیشنهاد اولین زمان آزاد"""
+        start = db.scheduled_epoch(task_data['scheduled_date'], task_data['scheduled_time'])
+        duration = (task_data.get('duration') or 60) * 60
+        conflicts = await occupancy.overlapping(user_id, start, start + duration)
+        if not conflicts:
+            return ""
+        
+        names = "، ".join(f"{task.title} ({task.scheduled_time})" for task in conflicts[:3])
+        free_at = datetime.fromtimestamp(await occupancy.next_free_slot(user_id, start, duration))
+        return (
+            f"\n\n⚠️ این تسک با برنامه‌های قبلی تداخل دارد: {names}\n"
+            f"💡 اولین زمان آزاد: {free_at.strftime('%Y-%m-%d %H:%M')}"
+        )
+    
     async def handle_text(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """پردازش پیام متنی"""
         user_text = update.message.text
@@ -92,12 +244,13 @@ class TelegramSchedulerBot:
             await self.show_weekly_summary(update, context)
         else:
             # پردازش با Gemini AI
-            await update.message.reply_text("🔄 در حال پردازش درخواست شما با Gemini AI...")
+            await self.reply_text(update, "🔄 در حال پردازش درخواست شما با Gemini AI...")
             
-            task_data = gemini.gemini_processor.parse_schedule_request(user_text)
+            task_data = await gemini.gemini_processor.parse_schedule_request(user_text)
             
             if task_data and task_data.get('confidence', 0) > 0.3:
-                task = db.db.add_task(user_id, task_data)
+                warning = await self.conflict_warning(user_id, task_data)
+                task = await db.db.add_task(user_id, task_data)
                 self.scheduler.schedule_task_reminder(task)
                 
                 response_text = (
@@ -111,10 +264,14 @@ class TelegramSchedulerBot:
                     f"📋 **توضیحات:** {task_data.get('notes', 'بدون توضیح')}\n\n"
                     f"اعتماد: {task_data.get('confidence', 0)*100:.1f}%"
                 )
+                if task_data.get('recurrence'):
+                    response_text += f"\n🔁 **تکرار:** {recurrence.describe(task_data['recurrence'])}"
+                response_text += warning
                 
-                await update.message.reply_text(response_text, parse_mode='Markdown')
+                await self.reply_text(update, response_text, parse_mode='Markdown')
             else:
-                await update.message.reply_text(
+                await self.reply_text(
+                    update,
                     "❌ متوجه درخواست شما نشدم. لطفاً واضح‌تر بیان کنید.\n\n"
                     "**مثال‌های صحیح:**\n"
                     "• \"فردا ساعت ۱۰ جلسه ریاضی\"\n"
@@ -123,73 +280,90 @@ class TelegramSchedulerBot:
                     "• \"هر روز ساعت ۱۸ باشگاه برم\""
                 )
     
-async def handle_voice(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """پردازش پیام ویس"""
-    await update.message.reply_text("🔊 در حال پردازش ویس شما...")
-    
-    # چک کردن فعال بودن ویس
-    if gemini.gemini_processor.whisper_model is None:
-        await update.message.reply_text(
-            "❌ پردازش ویس در حال حاضر غیرفعال است.\n\n"
-            "لطفاً از متن استفاده کنید یا ویس را به صورت دستی توصیف کنید."
-        )
-        return
-    
-    voice_file = await update.message.voice.get_file()
-    file_path = f"temp/voice_{update.effective_user.id}.ogg"
-    await voice_file.download_to_drive(file_path)
-    
-    # تبدیل ویس به متن با Whisper
-    transcribed_text = gemini.gemini_processor.transcribe_audio(file_path)
-    
-    if transcribed_text and not transcribed_text.startswith("پردازش ویس"):
-        await update.message.reply_text(f"📝 **متن استخراج شده:**\n{transcribed_text}")
+    async def handle_voice(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """پردازش پیام ویس"""
+        await self.reply_text(update, "🔊 در حال پردازش ویس شما...")
+        
+        # چک کردن فعال بودن ویس
+        if not transcription_service.available:
+            await self.reply_text(
+                update,
+                "❌ پردازش ویس در حال حاضر غیرفعال است.\n\n"
+                "لطفاً از متن استفاده کنید یا ویس را به صورت دستی توصیف کنید."
+            )
+            return
         
-        # پردازش متن با Gemini
-        task_data = gemini.gemini_processor.parse_schedule_request(transcribed_text)
+        # دانلود و decode در حافظه، بدون فایل موقت
+        try:
+            data = await voice_ingest.download(update.message.voice)
+        except voice_ingest.VoiceRejected:
+            await self.reply_text(
+                update,
+                f"❌ ویس خیلی بزرگ یا طولانی است. لطفاً ویس کوتاه‌تر از {config.VOICE_MAX_SECONDS} ثانیه بفرستید."
+            )
+            return
+        audio = await voice_ingest.decode(data)
         
-        if task_data and task_data.get('confidence', 0) > 0.3:
-            task = db.db.add_task(update.effective_user.id, task_data)
-            self.scheduler.schedule_task_reminder(task)
-            
-            response_text = (
-                f"✅ **تسک از ویس شما ثبت شد!**\n\n"
-                f"📝 {task_data['task_title']}\n"
-                f"🎯 نوع: {task_data['task_type']}\n"
-                f"📅 تاریخ: {task_data['scheduled_date']}\n"
-                f"⏰ زمان: {task_data['scheduled_time']}\n"
-                f"🔔 یادآوری: {task_data['reminder_before']} دقیقه قبل"
+        # تبدیل ویس به متن با Whisper در پروسس‌های جدا
+        try:
+            transcribed_text = await transcription_service.transcribe(audio) if audio is not None else None
+        except TranscriptionBusy:
+            await self.reply_text(
+                update,
+                "⏳ در حال حاضر ویس‌های زیادی در صف پردازش هستند.\n\n"
+                "لطفاً چند دقیقه دیگر دوباره بفرستید یا تسک را به صورت متن بنویسید."
             )
+            return
+        
+        if transcribed_text:
+            await self.reply_text(update, f"📝 **متن استخراج شده:**\n{transcribed_text}")
             
-            await update.message.reply_text(response_text, parse_mode='Markdown')
+            # پردازش متن با Gemini
+            task_data = await gemini.gemini_processor.parse_schedule_request(transcribed_text)
+            
+            if task_data and task_data.get('confidence', 0) > 0.3:
+                warning = await self.conflict_warning(update.effective_user.id, task_data)
+                task = await db.db.add_task(update.effective_user.id, task_data)
+                self.scheduler.schedule_task_reminder(task)
+                
+                response_text = (
+                    f"✅ **تسک از ویس شما ثبت شد!**\n\n"
+                    f"📝 {task_data['task_title']}\n"
+                    f"🎯 نوع: {task_data['task_type']}\n"
+                    f"📅 تاریخ: {task_data['scheduled_date']}\n"
+                    f"⏰ زمان: {task_data['scheduled_time']}\n"
+                    f"🔔 یادآوری: {task_data['reminder_before']} دقیقه قبل"
+                )
+                if task_data.get('recurrence'):
+                    response_text += f"\n🔁 تکرار: {recurrence.describe(task_data['recurrence'])}"
+                response_text += warning
+                
+                await self.reply_text(update, response_text, parse_mode='Markdown')
+            else:
+                await self.reply_text(
+                    update,
+                    "❌ متوجه محتوای ویس نشدم. لطفاً دوباره تلاش کنید.\n\n"
+                    "**مثال‌های صحیح:**\n"
+                    "\"فردا ساعت ده جلسه ریاضی دارم\"\n"
+                    "\"پس فردا امتحان فیزیک دارم\"\n"
+                    "\"شنبه ساعت دوازده جلسه کاری دارم\""
+                )
         else:
-            await update.message.reply_text(
-                "❌ متوجه محتوای ویس نشدم. لطفاً دوباره تلاش کنید.\n\n"
-                "**مثال‌های صحیح:**\n"
-                "\"فردا ساعت ده جلسه ریاضی دارم\"\n"
-                "\"پس فردا امتحان فیزیک دارم\"\n"
-                "\"شنبه ساعت دوازده جلسه کاری دارم\""
+            await self.reply_text(
+                update,
+                "❌ خطا در پردازش ویس. لطفاً از متن استفاده کنید.\n\n"
+                "ویژگی پردازش ویس نیاز به نصب صحیح whisper دارد."
             )
-    else:
-        await update.message.reply_text(
-            "❌ خطا در پردازش ویس. لطفاً از متن استفاده کنید.\n\n"
-            "ویژگی پردازش ویس نیاز به نصب صحیح whisper دارد."
-        )
-    
-    # حذف فایل موقت
-    try:
-        os.remove(file_path)
-    except:
-        pass
-    
+        
     async def show_today_tasks(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """نمایش تسک‌های امروز"""
         user_id = update.effective_user.id
         today = datetime.now().strftime('%Y-%m-%d')
-        tasks = db.db.get_today_tasks(user_id)
+        tasks = await db.db.get_today_tasks(user_id)
         
         if not tasks:
-            await update.message.reply_text(
+            await self.reply_text(
+                update,
                 "📭 هیچ تسکی برای امروز ثبت نشده است.\n\n"
                 "می‌توانید با دستور /add یا ارسال ویس تسک جدید اضافه کنید."
             )
@@ -211,24 +385,22 @@ async def handle_voice(self, update: Update, context: ContextTypes.DEFAULT_TYPE)
         
         tasks_text += f"📊 **پیشرفت:** {completed_count}/{len(tasks)} تکمیل شده"
         
-        # ارسال نمودار
-        chart_img = chart_gen.chart_generator.generate_daily_chart(user_id, today)
-        if chart_img:
-            await update.message.reply_photo(
-                photo=chart_img,
-                caption=tasks_text,
-                parse_mode='Markdown'
-            )
-        else:
-            await update.message.reply_text(tasks_text, parse_mode='Markdown')
+        # ارسال نمودار (از کش یا با file_id قبلی اگر تسک‌ها تغییر نکرده باشند)
+        message = await chart_gen.chart_generator.send_daily_chart(
+            lambda photo: self.reply_photo(update, photo=photo, caption=tasks_text, parse_mode='Markdown'),
+            user_id, today, tasks=tasks
+        )
+        if not message:
+            await self.reply_text(update, tasks_text, parse_mode='Markdown')
     
     async def show_schedule(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """نمایش برنامه‌های آینده"""
         user_id = update.effective_user.id
-        upcoming_tasks = db.db.get_upcoming_tasks(user_id, hours=72)  # 3 روز آینده
+        upcoming_tasks = await db.db.get_upcoming_tasks(user_id, hours=72)  # 3 روز آینده
         
         if not upcoming_tasks:
-            await update.message.reply_text(
+            await self.reply_text(
+                update,
                 "📭 هیچ برنامه آینده‌ای ثبت نشده است.\n\n"
                 "می‌توانید با دستور /add یا ارسال ویس تسک جدید اضافه کنید."
             )
@@ -251,24 +423,26 @@ async def handle_voice(self, update: Update, context: ContextTypes.DEFAULT_TYPE)
                 )
             schedule_text += "\n"
         
-        await update.message.reply_text(schedule_text, parse_mode='Markdown')
+        await self.reply_text(update, schedule_text, parse_mode='Markdown')
     
     async def show_weekly_summary(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """نمایش نمودار بهره‌وری هفتگی"""
         user_id = update.effective_user.id
         
-        await update.message.reply_text("📈 در حال تولید نمودار بهره‌وری هفتگی...")
+        await self.reply_text(update, "📈 در حال تولید نمودار بهره‌وری هفتگی...")
         
-        chart_img = chart_gen.chart_generator.generate_productivity_chart(user_id)
+        chart_img = await chart_gen.chart_generator.generate_productivity_chart(user_id)
         
         if chart_img:
-            await update.message.reply_photo(
+            await self.reply_photo(
+                update,
                 photo=chart_img,
                 caption="📊 **نمودار بهره‌وری هفتگی شما**\n\n"
                        "این نمودار عملکرد شما را در ۷ روز گذشته نشان می‌دهد."
             )
         else:
-            await update.message.reply_text(
+            await self.reply_text(
+                update,
                 "📊 داده کافی برای تولید نمودار وجود ندارد.\n"
                 "حداقل ۲ روز فعالیت نیاز است."
             )
@@ -285,7 +459,7 @@ async def handle_voice(self, update: Update, context: ContextTypes.DEFAULT_TYPE)
             "و یادآوری دریافت خواهید کرد."
         )
         
-        await update.message.reply_text(schedule_text, parse_mode='Markdown')
+        await self.reply_text(update, schedule_text, parse_mode='Markdown')
     
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """دستور /help"""
@@ -297,10 +471,12 @@ async def handle_voice(self, update: Update, context: ContextTypes.DEFAULT_TYPE)
             "/schedule - برنامه‌های آینده\n"
             "/summary - نمودار بهره‌وری\n"
             "/add - اضافه کردن تسک جدید\n"
+            "/export - خروجی تقویم (فایل ics)\n"
             "/help - این راهنما\n\n"
             "**نحوه استفاده:**\n"
             "• متن بفرستید: \"فردا ساعت ۱۰ جلسه دارم\"\n"
             "• ویس ضبط کنید: همین متن را بگویید\n"
+            "• فایل CSV یا ics بفرستید: همه برنامه‌ها یکجا وارد می‌شوند\n"
             "• از دکمه‌های کیبورد استفاده کنید\n\n"
             "**فناوری‌های استفاده شده:**\n"
             "🤖 Google Gemini AI - پردازش هوشمند\n"
@@ -309,7 +485,7 @@ async def handle_voice(self, update: Update, context: ContextTypes.DEFAULT_TYPE)
             "⏰ APScheduler - زمان‌بندی پیشرفته"
         )
         
-        await update.message.reply_text(help_text, parse_mode='Markdown')
+        await self.reply_text(update, help_text, parse_mode='Markdown')
     
     async def handle_button_click(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """پردازش کلیک روی دکمه‌ها"""
@@ -321,7 +497,47 @@ async def handle_voice(self, update: Update, context: ContextTypes.DEFAULT_TYPE)
         """اجرای ربات"""
         print("🤖 ربات برنامه‌ریزی هوشمند با Gemini AI در حال اجرا...")
         print("🔧 فناوری‌ها: Google Gemini + Whisper + Plotly")
-        self.application.run_polling()
+        if config.CLUSTER_SHARDS and config.BOT_MODE != 'webhook':
+            # تلگرام فقط یک getUpdates همزمان را می‌پذیرد؛ workerهای cluster باید پشت webhook باشند
+            print("Error starting bot: CLUSTER_SHARDS requires BOT_MODE=webhook")
+            raise SystemExit(1)
+        if config.BOT_MODE == 'webhook':
+            asyncio.run(self.run_webhook())
+        else:
+            self.application.run_polling()
+    
+    async def run_webhook(self):
+        """دریافت آپدیت‌ها با سرور webhook داخلی تا رسیدن SIGINT/SIGTERM
+        
+        در خاموش شدن ابتدا پذیرش درخواست قطع می‌شود، بعد Application آپدیت‌های
+        صف شده و در حال اجرا را تمام می‌کند و در آخر post_shutdown صف ارسال را تخلیه می‌کند.
+        """
+        application = self.application
+        server = WebhookServer(application)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        
+        await application.initialize()
+        try:
+            await self.post_init(application)
+            if config.WEBHOOK_URL:
+                await application.bot.set_webhook(
+                    config.WEBHOOK_URL.rstrip('/') + server.path,
+                    secret_token=server.secret_token,
+                    max_connections=config.WEBHOOK_MAX_CONNECTIONS,
+                    allowed_updates=Update.ALL_TYPES,
+                )
+            await application.start()
+            await server.start()
+            await stop.wait()
+        finally:
+            await server.stop()
+            if application.running:
+                await application.stop()
+            await self.post_shutdown(application)
+            await application.shutdown()
 
 if __name__ == "__main__":
     bot = TelegramSchedulerBot()
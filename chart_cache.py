@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+
+import config
+
+
+class ChartCache:
+    """کش نمودارها بر اساس hash ورودی‌های نمودار
+
+    دو لایه دارد: LRU در حافظه و فایل روی دیسک. بعد از اولین آپلود،
+    file_id تلگرام هم نگه داشته می‌شود تا درخواست تکراری بدون رندر و
+    آپلود دوباره فقط با شناسه فایل ارسال شود.
+    """
+
+    def __init__(self, directory=None, max_items=None):
+        self.directory = directory or config.CHART_CACHE_DIR
+        self.max_items = max_items or config.CHART_CACHE_MEMORY_ITEMS
+        self.max_file_ids = config.CHART_CACHE_FILE_IDS
+        self._images = OrderedDict()
+        # file_id ها و کلیدهای هر (کاربر، روز) هم LRU هستند تا در اجرای طولانی حافظه بی‌حد رشد نکند
+        self._file_ids = OrderedDict()
+        self._keys_by_day = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # پوشه در اولین نوشتن یا پاک‌سازی ساخته می‌شود، نه هنگام import
+        self._directory_ready = False
+
+    @staticmethod
+    def make_key(kind, user_id, date, rows):
+        payload = json.dumps([kind, user_id, date, rows], ensure_ascii=False, separators=(',', ':'))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _ensure_directory(self):
+        if not self._directory_ready:
+            os.makedirs(self.directory, exist_ok=True)
+            self._directory_ready = True
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, f"{key}.{suffix}")
+
+    def _track(self, key, user_id, date):
+        day = (user_id, date)
+        self._keys_by_day.setdefault(day, set()).add(key)
+        self._keys_by_day.move_to_end(day)
+        while len(self._keys_by_day) > self.max_file_ids:
+            # کلیدها hash محتوا هستند؛ روزی که از ردیابی بیرون می‌رود فقط از حافظه حذف می‌شود و فایل‌هایش با prune
+            _, keys = self._keys_by_day.popitem(last=False)
+            for old_key in keys:
+                self._images.pop(old_key, None)
+                self._file_ids.pop(old_key, None)
+
+    def _remember_file_id(self, key, file_id):
+        self._file_ids[key] = file_id
+        self._file_ids.move_to_end(key)
+        while len(self._file_ids) > self.max_file_ids:
+            self._file_ids.popitem(last=False)
+
+    def _remember_image(self, key, image):
+        self._images[key] = image
+        self._images.move_to_end(key)
+        while len(self._images) > self.max_items:
+            self._images.popitem(last=False)
+
+    async def get_file_id(self, key, user_id, date):
+        file_id = self._file_ids.get(key)
+        if file_id is None:
+            file_id = await asyncio.to_thread(self._read, self._path(key, 'id'))
+            if file_id is None:
+                return None
+            file_id = file_id.decode('utf-8')
+            self._remember_file_id(key, file_id)
+            self._track(key, user_id, date)
+        else:
+            self._file_ids.move_to_end(key)
+        self.hits += 1
+        return file_id
+
+    async def get_image(self, key, user_id, date):
+        image = self._images.get(key)
+        if image is not None:
+            self._images.move_to_end(key)
+        else:
+            image = await asyncio.to_thread(self._read, self._path(key, 'png'))
+            if image is None:
+                self.misses += 1
+                return None
+            self._remember_image(key, image)
+            self._track(key, user_id, date)
+        self.hits += 1
+        return image
+
+    async def put_image(self, key, user_id, date, image):
+        self._remember_image(key, image)
+        self._track(key, user_id, date)
+        await asyncio.to_thread(self._write, self._path(key, 'png'), image)
+
+    async def put_file_id(self, key, user_id, date, file_id):
+        self._remember_file_id(key, file_id)
+        self._track(key, user_id, date)
+        await asyncio.to_thread(self._write, self._path(key, 'id'), file_id.encode('utf-8'))
+
+    async def forget_file_id(self, key):
+        """file_id نامعتبر (مثلاً منقضی شده) حذف می‌شود تا دوباره آپلود شود"""
+        self._file_ids.pop(key, None)
+        await asyncio.to_thread(self._remove, self._path(key, 'id'))
+
+    def invalidate(self, user_id, date):
+        """حذف همه نمودارهای یک کاربر در یک روز بعد از تغییر تسک‌ها"""
+        paths = []
+        for key in self._keys_by_day.pop((user_id, date), ()):
+            self._images.pop(key, None)
+            self._file_ids.pop(key, None)
+            paths += [self._path(key, 'png'), self._path(key, 'id')]
+        if paths:
+            asyncio.get_running_loop().run_in_executor(None, self._remove_all, paths)
+
+    @classmethod
+    def _remove_all(cls, paths):
+        for path in paths:
+            cls._remove(path)
+
+    def prune(self, max_age_days=None):
+        """حذف فایل‌های قدیمی دیسک که دیگر به آن‌ها نیازی نیست"""
+        max_age = (max_age_days or config.CHART_CACHE_MAX_AGE_DAYS) * 86400
+        now = time.time()
+        self._ensure_directory()
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and now - entry.stat().st_mtime > max_age:
+                self._remove(entry.path)
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write(self, path, data):
+        self._ensure_directory()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
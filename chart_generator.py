@@ -1,10 +1,18 @@
-import plotly.graph_objects as go
-import plotly.express as px
-import pandas as pd
-from datetime import datetime
-import io
-import base64
+import asyncio
+import importlib
+from datetime import datetime, timedelta
+from telegram.error import BadRequest
 from database import db
+from chart_cache import ChartCache
+from render_service import RenderService
+from metrics import metrics
+import config
+
+# ماژول رندر هر backend؛ هر دو render_daily_chart و render_productivity_chart دارند
+CHART_BACKENDS = {
+    'plotly': 'chart_render',
+    'native': 'chart_native',
+}
 
 class ChartGenerator:
     def __init__(self):
@@ -15,108 +23,107 @@ class ChartGenerator:
             'personal': '#96CEB4',
             'exam': '#FFEAA7'
         }
+        self.backend_name = config.CHART_BACKEND
+        self.backend = importlib.import_module(CHART_BACKENDS[self.backend_name])
+        # plotly در پروسس‌های جدا رندر می‌شود تا event loop ربات بلاک نشود
+        self.renderer = RenderService(initializer=getattr(self.backend, 'warm_up', None))
+        metrics.gauge('chart_render_queue_depth', lambda: self.renderer.queue_depth)
+        self.cache = ChartCache()
+        db.add_task_listener(self.cache.invalidate)
     
-    def generate_daily_chart(self, user_id, date):
-        """تولید نمودار گانت روزانه"""
-        
-        tasks = db.session.query(db.Task).filter(
-            db.Task.user_id == user_id,
-            db.Task.scheduled_date == date
-        ).all()
-        
-        if not tasks:
+    async def render(self, func, *args):
+        """اجرای تابع رندر backend فعال"""
+        with metrics.timer('chart_render_seconds', backend=self.backend_name, chart=func.__name__):
+            if self.backend_name == 'native':
+                # چند میلی‌ثانیه؛ نیازی به pool پروسس نیست
+                try:
+                    return await asyncio.to_thread(func, *args)
+                except Exception as e:
+                    print(f"Error rendering chart {func.__name__}: {e}")
+                    return None
+            return await self.renderer.render(func, *args)
+    
+    async def start(self):
+        """راه‌اندازی رندر و پاک‌سازی کش دیسک در شروع ربات"""
+        if self.backend_name != 'native':
+            self.renderer.start()
+        await asyncio.to_thread(self.cache.prune)
+    
+    def shutdown(self):
+        self.renderer.shutdown()
+    
+    async def _daily_chart_rows(self, user_id, date, tasks):
+        if tasks is None:
+            tasks = await db.get_tasks_for_date(user_id, date)
+        
+        return [
+            (task.title, task.task_type, task.scheduled_time, task.duration, task.status)
+            for task in tasks
+        ]
+    
+    async def _daily_chart_image(self, key, user_id, date, rows):
+        image = await self.cache.get_image(key, user_id, date)
+        if image is None:
+            image = await self.render(self.backend.render_daily_chart, rows, date, self.colors)
+            if image is not None:
+                await self.cache.put_image(key, user_id, date, image)
+        return image
+    
+    async def generate_daily_chart(self, user_id, date, tasks=None):
+        """تولید نمودار گانت روزانه
+
+        اگر تسک‌ها از قبل خوانده شده باشند (مثلاً در خلاصه روزانه) دوباره کوئری نمی‌شوند.
+        """
+        rows = await self._daily_chart_rows(user_id, date, tasks)
+        if not rows:
             return None
         
-        # آماده‌سازی داده‌ها برای نمودار
-        tasks_data = []
-        for task in tasks:
-            start_time = datetime.strptime(task.scheduled_time, '%H:%M')
-            end_time = start_time + pd.Timedelta(minutes=task.duration or 60)
-            
-            tasks_data.append({
-                'Task': task.title,
-                'Start': start_time,
-                'Finish': end_time,
-                'Type': task.task_type,
-                'Status': task.status,
-                'Description': f"{task.title}\n{task.task_type}\nوضعیت: {task.status}"
-            })
-        
-        df = pd.DataFrame(tasks_data)
+        key = ChartCache.make_key(f'daily:{self.backend_name}', user_id, date, rows)
+        return await self._daily_chart_image(key, user_id, date, rows)
+    
+    async def send_daily_chart(self, send_photo, user_id, date, tasks=None):
+        """ارسال نمودار روزانه با استفاده مجدد از file_id تلگرام
+
+        send_photo یک coroutine با ورودی photo است و پیام ارسال شده را برمی‌گرداند.
+        اگر نموداری وجود نداشته باشد None برمی‌گردد.
+        """
+        rows = await self._daily_chart_rows(user_id, date, tasks)
+        if not rows:
+            return None
         
-        # ایجاد نمودار گانت
-        fig = px.timeline(
-            df, 
-            x_start="Start", 
-            x_end="Finish", 
-            y="Task",
-            color="Type",
-            color_discrete_map=self.colors,
-            title=f"برنامه روزانه - {date}",
-            hover_data=["Description"]
-        )
+        key = ChartCache.make_key(f'daily:{self.backend_name}', user_id, date, rows)
         
-        fig.update_layout(
-            title_x=0.5,
-            title_font_size=20,
-            font_family="Tahoma",
-            font_size=12,
-            xaxis_title="زمان",
-            yaxis_title="کارها",
-            height=400 + len(tasks) * 40
-        )
+        file_id = await self.cache.get_file_id(key, user_id, date)
+        if file_id:
+            try:
+                return await send_photo(file_id)
+            except BadRequest:
+                await self.cache.forget_file_id(key)
         
-        fig.update_xaxes(tickformat="%H:%M")
-        fig.update_yaxes(autorange="reversed")
+        image = await self._daily_chart_image(key, user_id, date, rows)
+        if image is None:
+            return None
         
-        # تبدیل به عکس
-        img_bytes = fig.to_image(format="png", width=800, height=600)
-        return img_bytes
+        message = await send_photo(image)
+        if message and message.photo:
+            await self.cache.put_file_id(key, user_id, date, message.photo[-1].file_id)
+        return message
     
-    def generate_productivity_chart(self, user_id, days=7):
+    async def generate_productivity_chart(self, user_id, days=7):
         """نمودار بهره‌وری هفتگی"""
         
         end_date = datetime.now().strftime('%Y-%m-%d')
-        start_date = (datetime.now() - pd.Timedelta(days=days)).strftime('%Y-%m-%d')
+        start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
         
-        summaries = db.session.query(db.DailySummary).filter(
-            db.DailySummary.user_id == user_id,
-            db.DailySummary.date >= start_date,
-            db.DailySummary.date <= end_date
-        ).all()
+        summaries = await db.get_daily_summaries(user_id, start_date, end_date)
         
         if not summaries:
             return None
         
-        dates = [summary.date for summary in summaries]
-        scores = [summary.productivity_score for summary in summaries]
-        completed = [summary.completed_tasks for summary in summaries]
-        total = [summary.total_tasks for summary in summaries]
-        
-        fig = go.Figure()
-        
-        fig.add_trace(go.Scatter(
-            x=dates, y=scores,
-            mode='lines+markers',
-            name='امتیاز بهره‌وری',
-            line=dict(color='#4ECDC4', width=3)
-        ))
-        
-        fig.add_trace(go.Bar(
-            x=dates, y=completed,
-            name='تسک‌های انجام شده',
-            marker_color='#FF6B6B'
-        ))
-        
-        fig.update_layout(
-            title="نمودار بهره‌وری هفتگی",
-            xaxis_title="تاریخ",
-            yaxis_title="تعداد/امتیاز",
-            barmode='group',
-            height=500
-        )
-        
-        img_bytes = fig.to_image(format="png", width=800, height=500)
-        return img_bytes
+        rows = [
+            (summary.date, summary.productivity_score, summary.completed_tasks, summary.total_tasks)
+            for summary in summaries
+        ]
+        return await self.render(self.backend.render_productivity_chart, rows)
 
 chart_generator = ChartGenerator()
@@ -0,0 +1,194 @@
+"""رندر سبک نمودارها مستقیماً با Pillow
+
+خروجی همان نمودارهای chart_render (گانت روزانه و بهره‌وری هفتگی) است،
+ولی بدون pandas و plotly و kaleido و در حد چند میلی‌ثانیه.
+برچسب‌های فارسی اگر Pillow با raqm ساخته شده باشد مستقیم راست‌به‌چپ
+چیده می‌شوند؛ در غیر این صورت اگر arabic_reshaper و python-bidi نصب
+باشند از آن‌ها استفاده می‌شود.
+"""
+import io
+import os
+import re
+from datetime import datetime, timedelta
+
+from PIL import Image, ImageDraw, ImageFont, features
+
+import config
+
+try:
+    import arabic_reshaper
+    from bidi.algorithm import get_display
+    RESHAPER_AVAILABLE = True
+except ImportError:
+    RESHAPER_AVAILABLE = False
+
+RAQM_AVAILABLE = features.check('raqm')
+
+FONT_CANDIDATES = [
+    'Vazirmatn-Regular.ttf',
+    'tahoma.ttf',
+    '/usr/share/fonts/truetype/vazirmatn/Vazirmatn-Regular.ttf',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    'DejaVuSans.ttf',
+]
+
+BACKGROUND = '#FFFFFF'
+PLOT_BACKGROUND = '#E5ECF6'
+GRID = '#FFFFFF'
+TEXT = '#2A3F5F'
+
+_RTL_CHARS = re.compile('[\u0590-\u08FF\uFB1D-\uFDFF\uFE70-\uFEFF]')
+_fonts = {}
+
+
+def _font(size):
+    font = _fonts.get(size)
+    if font is None:
+        candidates = [config.CHART_FONT_PATH] if config.CHART_FONT_PATH else []
+        for path in candidates + FONT_CANDIDATES:
+            try:
+                layout = ImageFont.Layout.RAQM if RAQM_AVAILABLE else ImageFont.Layout.BASIC
+                font = ImageFont.truetype(path, size, layout_engine=layout)
+                break
+            except OSError:
+                continue
+        else:
+            font = ImageFont.load_default(size)
+        _fonts[size] = font
+    return font
+
+
+def _text(draw, xy, text, size, fill=TEXT, anchor='la'):
+    """نوشتن متن با پشتیبانی راست‌به‌چپ"""
+    text = str(text)
+    options = {}
+    if _RTL_CHARS.search(text):
+        if RAQM_AVAILABLE:
+            options['direction'] = 'rtl'
+        elif RESHAPER_AVAILABLE:
+            text = get_display(arabic_reshaper.reshape(text))
+    draw.text(xy, text, font=_font(size), fill=fill, anchor=anchor, **options)
+
+
+def _text_width(draw, text, size):
+    if _RTL_CHARS.search(text) and not RAQM_AVAILABLE and RESHAPER_AVAILABLE:
+        text = get_display(arabic_reshaper.reshape(text))
+    return draw.textlength(text, font=_font(size))
+
+
+def _png(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', optimize=False, compress_level=1)
+    return buffer.getvalue()
+
+
+def render_daily_chart(rows, date, colors):
+    """تولید نمودار گانت روزانه
+
+    rows: لیست (title, task_type, scheduled_time, duration, status)
+    """
+    width, height = 800, 600
+    image = Image.new('RGB', (width, height), BACKGROUND)
+    draw = ImageDraw.Draw(image)
+
+    bars = []
+    for title, task_type, scheduled_time, duration, status in rows:
+        start = datetime.strptime(scheduled_time, '%H:%M')
+        bars.append((title, task_type, start, start + timedelta(minutes=duration or 60)))
+
+    # محور زمان به ساعت‌های کامل گرد می‌شود
+    first = min(bar[2] for bar in bars).replace(minute=0)
+    last = max(bar[3] for bar in bars)
+    if last.minute:
+        last = last.replace(minute=0) + timedelta(hours=1)
+    span = max((last - first).total_seconds(), 3600)
+
+    _text(draw, (width / 2, 20), f"برنامه روزانه - {date}", 20, anchor='mt')
+
+    # برچسب کارها در سمت راست (راست‌به‌چپ)
+    label_width = min(220, max(_text_width(draw, title, 12) for title, *_ in bars) + 20)
+    left, top = 60, 70
+    right, bottom = width - label_width - 10, height - 90
+    draw.rectangle((left, top, right, bottom), fill=PLOT_BACKGROUND)
+
+    hours = int(span // 3600)
+    step = max(1, hours // 12)
+    for h in range(0, hours + 1, step):
+        x = left + (right - left) * (h * 3600) / span
+        draw.line((x, top, x, bottom), fill=GRID, width=1)
+        _text(draw, (x, bottom + 6), (first + timedelta(hours=h)).strftime('%H:%M'), 11, anchor='mt')
+    _text(draw, ((left + right) / 2, bottom + 26), "زمان", 12, anchor='mt')
+    _text(draw, (width - 10, top - 24), "کارها", 12, anchor='ra')
+
+    row_height = (bottom - top) / len(bars)
+    bar_height = max(4, min(32, row_height * 0.7))
+    for i, (title, task_type, start, end) in enumerate(bars):
+        y = top + row_height * (i + 0.5)
+        x0 = left + (right - left) * (start - first).total_seconds() / span
+        x1 = left + (right - left) * (end - first).total_seconds() / span
+        draw.rectangle(
+            (x0, y - bar_height / 2, max(x1, x0 + 2), y + bar_height / 2),
+            fill=colors.get(task_type, '#636EFA')
+        )
+        _text(draw, (width - 10, y), title, 12, anchor='rm')
+
+    # راهنمای رنگ‌ها
+    x = left
+    for task_type in dict.fromkeys(bar[1] for bar in bars):
+        draw.rectangle((x, height - 40, x + 14, height - 26), fill=colors.get(task_type, '#636EFA'))
+        _text(draw, (x + 20, height - 33), task_type, 12, anchor='lm')
+        x += 40 + _text_width(draw, str(task_type), 12)
+
+    return _png(image)
+
+
+def render_productivity_chart(rows):
+    """نمودار بهره‌وری هفتگی
+
+    rows: لیست (date, productivity_score, completed_tasks, total_tasks)
+    """
+    width, height = 800, 500
+    image = Image.new('RGB', (width, height), BACKGROUND)
+    draw = ImageDraw.Draw(image)
+
+    _text(draw, (width / 2, 20), "نمودار بهره‌وری هفتگی", 20, anchor='mt')
+
+    left, top, right, bottom = 70, 70, width - 30, height - 90
+    draw.rectangle((left, top, right, bottom), fill=PLOT_BACKGROUND)
+
+    scores = [row[1] or 0 for row in rows]
+    completed = [row[2] or 0 for row in rows]
+    top_value = max(scores + completed + [1])
+
+    def y_of(value):
+        return bottom - (bottom - top) * value / top_value
+
+    for i in range(5):
+        value = top_value * i / 4
+        y = y_of(value)
+        draw.line((left, y, right, y), fill=GRID, width=1)
+        _text(draw, (left - 8, y), f"{value:g}", 11, anchor='rm')
+
+    slot = (right - left) / len(rows)
+    bar_width = slot * 0.5
+    points = []
+    for i, (date, *_rest) in enumerate(rows):
+        cx = left + slot * (i + 0.5)
+        draw.rectangle((cx - bar_width / 2, y_of(completed[i]), cx + bar_width / 2, bottom), fill='#FF6B6B')
+        points.append((cx, y_of(scores[i])))
+        _text(draw, (cx, bottom + 6), date, 11, anchor='mt')
+
+    if len(points) > 1:
+        draw.line(points, fill='#4ECDC4', width=3)
+    for x, y in points:
+        draw.ellipse((x - 5, y - 5, x + 5, y + 5), fill='#4ECDC4')
+
+    _text(draw, ((left + right) / 2, bottom + 26), "تاریخ", 12, anchor='mt')
+    _text(draw, (left, top - 8), "تعداد/امتیاز", 12, anchor='ld')
+
+    draw.rectangle((left, height - 35, left + 14, height - 21), fill='#4ECDC4')
+    _text(draw, (left + 20, height - 28), 'امتیاز بهره‌وری', 12, anchor='lm')
+    draw.rectangle((left + 180, height - 35, left + 194, height - 21), fill='#FF6B6B')
+    _text(draw, (left + 200, height - 28), 'تسک‌های انجام شده', 12, anchor='lm')
+
+    return _png(image)
@@ -0,0 +1,107 @@
+"""رندر نمودارها با plotly/kaleido
+
+این ماژول در پروسس‌های worker سرویس رندر اجرا می‌شود، پس فقط داده ساده
+(tuple و dict) می‌گیرد و به دیتابیس یا ربات وابسته نیست.
+"""
+from datetime import datetime, timedelta
+
+
+def warm_up():
+    """initializer پروسس worker: بارگذاری plotly و راه‌اندازی kaleido یک بار برای همیشه"""
+    import plotly.graph_objects as go
+
+    try:
+        go.Figure().to_image(format="png", width=10, height=10)
+    except Exception as e:
+        print(f"Error warming up chart renderer: {e}")
+
+
+def render_daily_chart(rows, date, colors):
+    """تولید نمودار گانت روزانه
+
+    rows: لیست (title, task_type, scheduled_time, duration, status)
+    """
+    import pandas as pd
+    import plotly.express as px
+
+    # آماده‌سازی داده‌ها برای نمودار
+    tasks_data = []
+    for title, task_type, scheduled_time, duration, status in rows:
+        start_time = datetime.strptime(scheduled_time, '%H:%M')
+        end_time = start_time + timedelta(minutes=duration or 60)
+
+        tasks_data.append({
+            'Task': title,
+            'Start': start_time,
+            'Finish': end_time,
+            'Type': task_type,
+            'Status': status,
+            'Description': f"{title}\n{task_type}\nوضعیت: {status}"
+        })
+
+    df = pd.DataFrame(tasks_data)
+
+    # ایجاد نمودار گانت
+    fig = px.timeline(
+        df,
+        x_start="Start",
+        x_end="Finish",
+        y="Task",
+        color="Type",
+        color_discrete_map=colors,
+        title=f"برنامه روزانه - {date}",
+        hover_data=["Description"]
+    )
+
+    fig.update_layout(
+        title_x=0.5,
+        title_font_size=20,
+        font_family="Tahoma",
+        font_size=12,
+        xaxis_title="زمان",
+        yaxis_title="کارها",
+        height=400 + len(rows) * 40
+    )
+
+    fig.update_xaxes(tickformat="%H:%M")
+    fig.update_yaxes(autorange="reversed")
+
+    # تبدیل به عکس
+    return fig.to_image(format="png", width=800, height=600)
+
+
+def render_productivity_chart(rows):
+    """نمودار بهره‌وری هفتگی
+
+    rows: لیست (date, productivity_score, completed_tasks, total_tasks)
+    """
+    import plotly.graph_objects as go
+
+    dates = [row[0] for row in rows]
+    scores = [row[1] for row in rows]
+    completed = [row[2] for row in rows]
+
+    fig = go.Figure()
+
+    fig.add_trace(go.Scatter(
+        x=dates, y=scores,
+        mode='lines+markers',
+        name='امتیاز بهره‌وری',
+        line=dict(color='#4ECDC4', width=3)
+    ))
+
+    fig.add_trace(go.Bar(
+        x=dates, y=completed,
+        name='تسک‌های انجام شده',
+        marker_color='#FF6B6B'
+    ))
+
+    fig.update_layout(
+        title="نمودار بهره‌وری هفتگی",
+        xaxis_title="تاریخ",
+        yaxis_title="تعداد/امتیاز",
+        barmode='group',
+        height=500
+    )
+
+    return fig.to_image(format="png", width=800, height=500)
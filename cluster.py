@@ -0,0 +1,151 @@
+"""تقسیم کاربران بین چند worker با lease های دیتابیسی
+
+کاربران با shard_of(telegram_id) در CLUSTER_SHARDS شارد قرار می‌گیرند و
+هر شارد با یک lease در جدول leases به یک worker تعلق دارد. هر worker با
+lease خودش (worker:<id>) اعلام زنده بودن می‌کند و سهم منصفانه‌اش
+(ceil(شاردها / workerهای زنده)) را نگه می‌دارد؛ lease های یک worker مرده
+بعد از CLUSTER_LEASE_TTL منقضی و بین بقیه تقسیم می‌شوند.
+
+jobهای زمان‌بندی شده برای هر شارد یک ردیف در job_runs درج می‌کنند، پس حتی
+اگر مالکیت وسط کار جابه‌جا شود هر اجرا برای هر شارد فقط یک بار انجام
+می‌شود. با CLUSTER_SHARDS=0 همه چیز مثل حالت تک‌پروسسی است.
+
+آپدیت‌ها باید با BOT_MODE=webhook از یک load balancer به workerها برسند؛
+چند پروسس polling هم‌زمان getUpdates را صدا می‌زنند و تلگرام آن را رد می‌کند.
+"""
+import asyncio
+import math
+import os
+import random
+import socket
+import time
+
+import config
+import database as db
+from metrics import metrics
+
+
+def _shard_lease(shard):
+    return f"shard:{shard}"
+
+
+class ShardCoordinator:
+    """مالکیت شاردهای این worker و ثبت اجرای jobها"""
+
+    def __init__(self, shard_count=None, worker_id=None, lease_ttl=None):
+        self.shard_count = config.CLUSTER_SHARDS if shard_count is None else shard_count
+        self.worker_id = worker_id or config.WORKER_ID or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_ttl = lease_ttl or config.CLUSTER_LEASE_TTL
+        self.owned = set()
+        self._listeners = []
+        self._runner = None
+        self._pruned_at = 0.0
+        metrics.gauge('cluster_owned_shards', lambda: len(self.owned))
+
+    @property
+    def enabled(self):
+        return self.shard_count > 0
+
+    def add_listener(self, callback):
+        """ثبت coroutine callback(gained, lost) که بعد از هر تغییر مالکیت صدا زده می‌شود"""
+        self._listeners.append(callback)
+
+    def shards(self):
+        """شاردهای این worker؛ None یعنی همه کاربران (حالت تک‌پروسسی)"""
+        return sorted(self.owned) if self.enabled else None
+
+    def owns(self, user_id):
+        return not self.enabled or db.shard_of(user_id) in self.owned
+
+    async def start(self):
+        if self.enabled and self._runner is None:
+            await self.rebalance()
+            self._runner = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """آزاد کردن lease ها تا بقیه workerها بدون انتظار برای انقضا شاردها را بگیرند"""
+        if self._runner is None:
+            return
+        self._runner.cancel()
+        try:
+            await self._runner
+        except asyncio.CancelledError:
+            pass
+        self._runner = None
+        await db.db.release_leases(
+            [f"worker:{self.worker_id}", *(_shard_lease(shard) for shard in self.owned)], self.worker_id
+        )
+        self.owned = set()
+
+    async def _run(self):
+        while True:
+            # تمدید سه بار در هر TTL تا یک تأخیر کوتاه باعث از دست رفتن شاردها نشود
+            await asyncio.sleep(self.lease_ttl / 3)
+            try:
+                await self.rebalance()
+                if time.time() - self._pruned_at > 3600:
+                    self._pruned_at = time.time()
+                    await db.db.prune_cluster_state(time.time() - 2 * 86400)
+            except Exception as e:
+                print(f"Error rebalancing shards: {e}")
+
+    async def rebalance(self):
+        """تمدید lease ها و رساندن تعداد شاردهای این worker به سهم منصفانه"""
+        await db.db.acquire_lease(f"worker:{self.worker_id}", self.worker_id, self.lease_ttl)
+        now = time.time()
+        leases = await db.db.get_leases()
+        workers = {
+            owner for name, (owner, expires_at) in leases.items()
+            if name.startswith('worker:') and expires_at > now
+        }
+        target = math.ceil(self.shard_count / max(1, len(workers)))
+
+        held = {
+            shard for shard in range(self.shard_count)
+            if leases.get(_shard_lease(shard), (None, 0))[0] == self.worker_id
+        }
+        renewed = await db.db.renew_leases([_shard_lease(shard) for shard in held], self.worker_id, self.lease_ttl)
+        held = {shard for shard in held if _shard_lease(shard) in renewed}
+
+        if len(held) > target:
+            extra = sorted(held)[target:]
+            await db.db.release_leases([_shard_lease(shard) for shard in extra], self.worker_id)
+            held -= set(extra)
+        else:
+            free = [
+                shard for shard in range(self.shard_count)
+                if shard not in held and leases.get(_shard_lease(shard), (None, 0))[1] < now
+            ]
+            # ترتیب تصادفی تا workerهایی که همزمان بالا می‌آیند سر یک شارد رقابت نکنند
+            random.shuffle(free)
+            for shard in free:
+                if len(held) >= target:
+                    break
+                if await db.db.acquire_lease(_shard_lease(shard), self.worker_id, self.lease_ttl):
+                    held.add(shard)
+
+        gained, lost = held - self.owned, self.owned - held
+        self.owned = held
+        if gained or lost:
+            print(f"🧩 Worker {self.worker_id} shards: {sorted(held)} (+{sorted(gained)} -{sorted(lost)})")
+            for callback in self._listeners:
+                try:
+                    await callback(gained, lost)
+                except Exception as e:
+                    print(f"Error in shard listener {callback!r}: {e}")
+
+    async def claim(self, job_key, shards=None):
+        """شاردهایی (از shards یا همه شاردهای این worker) که اجرای job_key برایشان به این worker رسید
+
+        در حالت تک‌پروسسی None برمی‌گردد یعنی همه کاربران.
+        """
+        if not self.enabled:
+            return None
+        candidates = self.owned if shards is None else set(shards) & self.owned
+        keys = {f"{job_key}:{shard}": shard for shard in candidates}
+        claimed = await db.db.claim_job_runs(sorted(keys), self.worker_id)
+        return sorted(keys[key] for key in claimed)
+
+
+# هماهنگ‌کننده سراسری
+cluster = ShardCoordinator()
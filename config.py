@@ -10,7 +10,118 @@ BOT_TOKEN = os.getenv("BOT_TOKEN", "YOUR_BOT_TOKEN")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "YOUR_GEMINI_API_KEY")
 
 # Database
-DATABASE_URL = "sqlite:///scheduler.db"
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///scheduler.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "busy_timeout": 5000,
+    "synchronous": "NORMAL",
+    "cache_size": -20000,  # حدود 20MB
+    "temp_store": "MEMORY",
+}
+
+# ارسال‌های گروهی (خلاصه روزانه و ...)
+FANOUT_BATCH_SIZE = int(os.getenv("FANOUT_BATCH_SIZE", "1000"))
+FANOUT_CONCURRENCY = int(os.getenv("FANOUT_CONCURRENCY", "50"))
+
+# صف ارسال پیام (محدودیت‌های flood تلگرام)
+OUTBOX_RATE = float(os.getenv("OUTBOX_RATE", "30"))  # پیام در ثانیه برای کل ربات
+OUTBOX_PER_CHAT_RATE = float(os.getenv("OUTBOX_PER_CHAT_RATE", "1"))
+OUTBOX_PER_CHAT_BURST = int(os.getenv("OUTBOX_PER_CHAT_BURST", "3"))
+OUTBOX_MAX_INFLIGHT = int(os.getenv("OUTBOX_MAX_INFLIGHT", "30"))
+
+# رندر نمودار: "plotly" (کیفیت بالا، در پروسس‌های جدا) یا "native" (Pillow، چند میلی‌ثانیه)
+CHART_BACKEND = os.getenv("CHART_BACKEND", "plotly")
+CHART_FONT_PATH = os.getenv("CHART_FONT_PATH")
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", str(min(2, os.cpu_count() or 1))))
+CHART_QUEUE_SIZE = int(os.getenv("CHART_QUEUE_SIZE", "32"))
+CHART_RENDER_TIMEOUT = float(os.getenv("CHART_RENDER_TIMEOUT", "20"))
+
+# کش نمودارها
+CHART_CACHE_DIR = os.getenv("CHART_CACHE_DIR", "chart_cache")
+CHART_CACHE_MEMORY_ITEMS = int(os.getenv("CHART_CACHE_MEMORY_ITEMS", "256"))
+CHART_CACHE_MAX_AGE_DAYS = int(os.getenv("CHART_CACHE_MAX_AGE_DAYS", "2"))
+CHART_CACHE_FILE_IDS = int(os.getenv("CHART_CACHE_FILE_IDS", "10000"))  # file_id ها و (کاربر، روز)های ردیابی شده در حافظه
+
+# فراخوانی Gemini
+GEMINI_CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", "16"))
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "10"))  # ثانیه برای هر درخواست
+GEMINI_SLOW_CALL = float(os.getenv("GEMINI_SLOW_CALL", "6"))  # فراخوانی کندتر از این شکست حساب می‌شود
+GEMINI_BREAKER_FAILURES = int(os.getenv("GEMINI_BREAKER_FAILURES", "5"))
+GEMINI_BREAKER_RESET = float(os.getenv("GEMINI_BREAKER_RESET", "30"))
+GEMINI_BATCH_WINDOW = float(os.getenv("GEMINI_BATCH_WINDOW", "0.05"))  # ثانیه انتظار برای جمع شدن درخواست‌ها
+GEMINI_BATCH_MAX = int(os.getenv("GEMINI_BATCH_MAX", "8"))
+
+# تبدیل ویس به متن با Whisper در پروسس‌های جدا
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")
+WHISPER_WORKERS = int(os.getenv("WHISPER_WORKERS", "1"))
+WHISPER_QUEUE_SIZE = int(os.getenv("WHISPER_QUEUE_SIZE", "16"))
+WHISPER_TIMEOUT = float(os.getenv("WHISPER_TIMEOUT", "120"))  # ثانیه، شامل زمان انتظار در صف
+VOICE_MAX_BYTES = int(os.getenv("VOICE_MAX_BYTES", str(2 * 1024 * 1024)))
+VOICE_MAX_SECONDS = int(os.getenv("VOICE_MAX_SECONDS", "120"))
+FFMPEG_PATH = os.getenv("FFMPEG_PATH", "ffmpeg")
+
+# کش نتیجه پردازش متن با Gemini
+PARSE_CACHE_MEMORY_ITEMS = int(os.getenv("PARSE_CACHE_MEMORY_ITEMS", "5000"))
+PARSE_CACHE_TTL = int(os.getenv("PARSE_CACHE_TTL", str(30 * 86400)))  # ثانیه
+PARSE_CACHE_MAX_ROWS = int(os.getenv("PARSE_CACHE_MAX_ROWS", "100000"))
+
+# پارسر محلی: اگر اطمینان نتیجه حداقل این مقدار باشد Gemini صدا زده نمی‌شود
+LOCAL_PARSER_CONFIDENCE = float(os.getenv("LOCAL_PARSER_CONFIDENCE", "0.8"))
+
+# حداکثر زمان مجاز import ماژول bot (ثانیه) برای python startup.py
+# (اندازه فعلی حدود ۱ ثانیه است که بیشترش import خود telegram و sqlalchemy است)
+STARTUP_IMPORT_BUDGET = float(os.getenv("STARTUP_IMPORT_BUDGET", "1.5"))
+
+# طولانی‌ترین مدت یک تسک (دقیقه)؛ کران پایین جستجوی تسک‌های در حال اجرا
+MAX_TASK_DURATION = int(os.getenv("MAX_TASK_DURATION", str(24 * 60)))
+
+# ایندکس بازه‌های اشغال شده برای تشخیص تداخل
+OCCUPANCY_HORIZON_DAYS = int(os.getenv("OCCUPANCY_HORIZON_DAYS", "7"))
+OCCUPANCY_MAX_USERS = int(os.getenv("OCCUPANCY_MAX_USERS", "10000"))
+
+# متریک‌ها: endpoint محلی Prometheus (پورت 0 یعنی خاموش) و ذخیره دوره‌ای JSON
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # مثلاً 9464؛ هر worker روی یک میزبان پورت جدا لازم دارد
+METRICS_DUMP_PATH = os.getenv("METRICS_DUMP_PATH")
+METRICS_DUMP_INTERVAL = float(os.getenv("METRICS_DUMP_INTERVAL", "60"))  # ثانیه
+
+# دریافت آپدیت‌ها: "polling" یا "webhook" (سرور HTTP داخلی)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "16"))  # تعداد آپدیت‌هایی که همزمان پردازش می‌شوند
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # آدرس عمومی؛ اگر خالی باشد setWebhook صدا زده نمی‌شود
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+WEBHOOK_MAX_BODY = int(os.getenv("WEBHOOK_MAX_BODY", str(1024 * 1024)))
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "10"))  # ثانیه
+
+# چند worker: کاربران با telegram_id % CLUSTER_SHARDS بین workerها تقسیم می‌شوند (0 یعنی تک‌پروسسی)
+# فقط با BOT_MODE=webhook؛ چند مصرف‌کننده getUpdates با هم تداخل دارند و ربات در حالت polling اجرا نمی‌شود
+CLUSTER_SHARDS = int(os.getenv("CLUSTER_SHARDS", "0"))
+WORKER_ID = os.getenv("WORKER_ID")  # پیش‌فرض: hostname:pid
+CLUSTER_LEASE_TTL = float(os.getenv("CLUSTER_LEASE_TTL", "30"))  # ثانیه؛ بعد از آن شاردهای worker مرده گرفته می‌شوند
+CLUSTER_CATCH_UP = float(os.getenv("CLUSTER_CATCH_UP", "600"))  # jobهای اجرا شده در این بازه برای شاردهای تحویل گرفته تکرار می‌شوند
+
+# ورود گروهی تسک از فایل CSV/iCalendar و خروجی iCalendar
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", str(1024 * 1024)))
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", "5000"))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+EXPORT_SPOOL_BYTES = int(os.getenv("EXPORT_SPOOL_BYTES", str(1024 * 1024)))  # بزرگ‌تر از این هنگام ساخت فایل روی دیسک نوشته می‌شود
+
+# کش تسک‌های روز هر کاربر (DAY_CACHE_MAX_ENTRIES=0 یعنی بدون کش)
+DAY_CACHE_MAX_ENTRIES = int(os.getenv("DAY_CACHE_MAX_ENTRIES", "10000"))  # تعداد (کاربر، روز)
+DAY_CACHE_MAX_ROWS = int(os.getenv("DAY_CACHE_MAX_ROWS", "200000"))  # سقف مجموع تسک‌های کش شده
+DAY_CACHE_TTL = float(os.getenv("DAY_CACHE_TTL", "300"))  # ثانیه؛ برای دیدن نوشتن‌های پروسس‌های دیگر
+
+# موتور یادآوری: صف هر REMINDER_RELOAD ثانیه با تسک‌ها و وقوع‌هایی که تا REMINDER_LOOKAHEAD ثانیه
+# بعد شروع می‌شوند از دیتابیس تکمیل می‌شود؛ LOOKAHEAD باید از فاصله بارگذاری به اضافه طولانی‌ترین
+# «یادآوری قبل از شروع» بیشتر باشد
+REMINDER_RELOAD = float(os.getenv("REMINDER_RELOAD", os.getenv("CLUSTER_REMINDER_RELOAD", "300")))
+REMINDER_LOOKAHEAD = float(os.getenv("REMINDER_LOOKAHEAD", str(2 * 86400)))
 
 # Default Schedule
 DEFAULT_SCHEDULE = {
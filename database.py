@@ -1,8 +1,17 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text, JSON
+from sqlalchemy import bindparam, case, delete, event, func, insert, inspect, select, text, update, Index, Column, Integer, String, DateTime, Boolean, Float, Text, JSON
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from collections import Counter
 from datetime import datetime, timedelta
 import json
+import time
+import config
+from day_cache import DayCache, snapshot
+from metrics import metrics
+from recurrence import (
+    DAILY, SKIPPED, Occurrence, encode_weekdays, next_occurrence_date,
+    occurrence_dates, parse_occurrence_id
+)
 
 Base = declarative_base()
 
@@ -22,12 +31,74 @@ class Task(Base):
     task_type = Column(String)  # lesson, work, sport, personal, exam
     scheduled_date = Column(String)  # YYYY-MM-DD
     scheduled_time = Column(String)  # HH:MM
+    scheduled_at = Column(Integer)  # epoch ثانیه، نسخه نرمال‌شده تاریخ و زمان
     duration = Column(Integer)  # minutes
     reminder_before = Column(Integer, default=15)  # minutes
     status = Column(String, default='pending')  # pending, completed, missed
     notes = Column(Text)
+    reminder_sent = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.now())
 
+    __table_args__ = (
+        Index('ix_tasks_user_status_scheduled_at', 'user_id', 'status', 'scheduled_at'),
+        Index('ix_tasks_user_scheduled_at', 'user_id', 'scheduled_at'),
+        # ایندکس پوششی برای تجمیع روزانه روی همه کاربران
+        Index('ix_tasks_scheduled_at_user_status', 'scheduled_at', 'user_id', 'status'),
+    )
+
+def scheduled_epoch(scheduled_date, scheduled_time):
+    """تبدیل تاریخ و زمان متنی تسک به epoch (به وقت محلی)"""
+    return int(datetime.strptime(f"{scheduled_date} {scheduled_time}", '%Y-%m-%d %H:%M').timestamp())
+
+def day_bounds(date):
+    """بازه [شروع، پایان) یک روز به epoch"""
+    start = datetime.strptime(date, '%Y-%m-%d')
+    return int(start.timestamp()), int((start + timedelta(days=1)).timestamp())
+
+def next_day(date):
+    """تاریخ روز بعد به صورت YYYY-MM-DD"""
+    return (datetime.strptime(date, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+
+def shard_of(telegram_id):
+    """شارد یک کاربر در حالت چند worker"""
+    return telegram_id % config.CLUSTER_SHARDS
+
+def _in_shards(column, shards):
+    """شرط SQL معادل shard_of(column) in shards"""
+    return (column % config.CLUSTER_SHARDS).in_(list(shards))
+
+def async_database_url(url):
+    """انتخاب درایور async متناظر با DATABASE_URL"""
+    drivers = {
+        'sqlite://': 'sqlite+aiosqlite://',
+        'postgresql://': 'postgresql+asyncpg://',
+        'mysql://': 'mysql+aiomysql://',
+    }
+    for prefix, async_prefix in drivers.items():
+        if url.startswith(prefix):
+            return async_prefix + url[len(prefix):]
+    return url
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL تا خواننده‌ها نویسنده را بلاک نکنند، و تنظیمات کش و sync"""
+    cursor = dbapi_connection.cursor()
+    for pragma, value in config.SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    # روی context هر اجرا، نه روی connection: برای کوئری خطادار after_cursor_execute صدا زده نمی‌شود
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    """زمان هر کوئری به تفکیک نوع آن (SELECT، INSERT، ...)"""
+    started = getattr(context, '_query_started', None)
+    if started is None:
+        return
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'OTHER'
+    metrics.observe('db_query_seconds', time.perf_counter() - started, statement=verb)
+
 class DailySummary(Base):
     __tablename__ = 'daily_summaries'
     id = Column(Integer, primary_key=True)
@@ -40,70 +111,956 @@ class DailySummary(Base):
     chart_image_path = Column(String)
     created_at = Column(DateTime, default=datetime.now())
 
+    # شمارنده‌ها با هر add_task و update_task_status به‌روز می‌شوند (فقط تسک‌های یک‌باره؛
+    # وقوع‌های برنامه‌های تکراری هنگام خواندن از قانون‌ها اضافه می‌شوند)
+    __table_args__ = (
+        Index('ux_daily_summaries_user_date', 'user_id', 'date', unique=True),
+        Index('ix_daily_summaries_date', 'date'),
+    )
+
+def productivity_score(completed, total):
+    return int(completed * 100 / total) if total else 0
+
+class ParseCacheEntry(Base):
+    __tablename__ = 'parse_cache'
+    key = Column(String, primary_key=True)  # sha256 متن نرمال‌شده
+    payload = Column(Text)  # JSON نتیجه با تاریخ نسبی
+    created_at = Column(Integer, index=True)  # epoch
+
+class RecurringTask(Base):
+    """قانون یک برنامه تکراری؛ وقوع‌ها با recurrence.occurrence_dates ساخته می‌شوند"""
+    __tablename__ = 'recurring_tasks'
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer)
+    title = Column(String)
+    task_type = Column(String)
+    freq = Column(String)  # daily, weekly
+    weekdays = Column(String)  # روزهای هفته برای weekly، مثل "5,6,0" (0 = دوشنبه)
+    start_date = Column(String)  # YYYY-MM-DD
+    end_date = Column(String)  # YYYY-MM-DD یا NULL برای بی‌پایان
+    scheduled_time = Column(String)  # HH:MM
+    duration = Column(Integer)
+    reminder_before = Column(Integer, default=15)
+    notes = Column(Text)
+    created_at = Column(DateTime, default=datetime.now())
+
+    __table_args__ = (
+        Index('ix_recurring_tasks_user_start', 'user_id', 'start_date'),
+        Index('ix_recurring_tasks_start_end', 'start_date', 'end_date'),
+    )
+
+class RecurrenceException(Base):
+    """وضعیت یک وقوع که با پیش‌فرض (pending، بدون یادآوری) فرق دارد"""
+    __tablename__ = 'recurrence_exceptions'
+    id = Column(Integer, primary_key=True)
+    rule_id = Column(Integer)
+    date = Column(String)  # YYYY-MM-DD
+    status = Column(String, default='pending')  # pending, completed, missed, skipped
+    reminder_sent = Column(Boolean, default=False)
+    notes = Column(Text)
+
+    __table_args__ = (
+        Index('ux_recurrence_exceptions_rule_date', 'rule_id', 'date', unique=True),
+    )
+
+class Lease(Base):
+    """مالکیت موقت یک منبع در حالت چند worker (شارد یا heartbeat یک worker)"""
+    __tablename__ = 'leases'
+    name = Column(String, primary_key=True)  # shard:3 یا worker:<id>
+    owner = Column(String)
+    expires_at = Column(Float)  # epoch
+
+class JobRun(Base):
+    """ثبت اجرای یک job زمان‌بندی شده برای یک شارد؛ هر کلید فقط یک بار درج می‌شود"""
+    __tablename__ = 'job_runs'
+    key = Column(String, primary_key=True)  # مثل daily_summary:2026-10-18:3
+    owner = Column(String)
+    claimed_at = Column(Integer, index=True)  # epoch
+
 class Database:
-    def __init__(self):
-        self.engine = create_engine('sqlite:///scheduler.db')
-        Base.metadata.create_all(self.engine)
-        Session = sessionmaker(bind=self.engine)
-        self.session = Session()
-
-    def add_user(self, telegram_id, username, first_name):
-        user = self.session.query(User).filter_by(telegram_id=telegram_id).first()
-        if not user:
-            user = User(telegram_id=telegram_id, username=username, first_name=first_name)
-            self.session.add(user)
-            self.session.commit()
-        return user
-
-    def add_task(self, user_id, task_data):
+    def __init__(self, url=None):
+        self.url = async_database_url(url or config.DATABASE_URL)
+        self._engine = None
+        self._session_factory = None
+        self._task_listeners = []
+        self.day_cache = DayCache()
+
+    @property
+    def engine(self):
+        """engine در اولین استفاده ساخته می‌شود، نه هنگام import"""
+        if self._engine is None:
+            from sqlalchemy.ext.asyncio import create_async_engine
+            pool_options = {} if ':memory:' in self.url else {'pool_size': config.DB_POOL_SIZE, 'max_overflow': 0}
+            self._engine = create_async_engine(self.url, **pool_options)
+            if self._engine.dialect.name == 'sqlite':
+                event.listen(self._engine.sync_engine, 'connect', _set_sqlite_pragmas)
+            event.listen(self._engine.sync_engine, 'before_cursor_execute', _query_started)
+            event.listen(self._engine.sync_engine, 'after_cursor_execute', _query_finished)
+        return self._engine
+
+    @property
+    def Session(self):
+        # هر هندلر و job یک session کوتاه‌عمر از این کارخانه می‌گیرد
+        if self._session_factory is None:
+            from sqlalchemy.ext.asyncio import async_sessionmaker
+            self._session_factory = async_sessionmaker(self.engine, expire_on_commit=False)
+        return self._session_factory
+
+    def add_task_listener(self, callback):
+        """ثبت callback(user_id, date) که بعد از هر تغییر در تسک‌های یک روز صدا زده می‌شود"""
+        self._task_listeners.append(callback)
+
+    def _notify_task_change(self, user_id, date, task=None):
+        """به‌روز کردن کش روز (با task مستقیم، بدون آن با دور ریختن) و صدا زدن listenerها"""
+        if task is not None:
+            self.day_cache.apply(task)
+        else:
+            self.day_cache.invalidate(user_id, date)
+        for callback in self._task_listeners:
+            try:
+                callback(user_id, date)
+            except Exception as e:
+                print(f"Error in task listener {callback!r}: {e}")
+
+    async def init(self):
+        """ساخت جدول‌ها و اجرای مایگریشن؛ یک بار در شروع برنامه"""
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(self._migrate)
+
+    async def close(self):
+        if self._engine is not None:
+            await self._engine.dispose()
+
+    # ستون‌هایی که بعد از نسخه اول به جدول tasks اضافه شده‌اند
+    TASK_MIGRATIONS = [
+        ('reminder_sent', 'BOOLEAN DEFAULT 0'),
+        ('scheduled_at', 'INTEGER'),
+    ]
+
+    def _migrate(self, conn):
+        """افزودن ستون‌های جدید به دیتابیس‌های قدیمی"""
+        columns = {column['name'] for column in inspect(conn).get_columns('tasks')}
+        for name, ddl in self.TASK_MIGRATIONS:
+            if name not in columns:
+                conn.execute(text(f"ALTER TABLE tasks ADD COLUMN {name} {ddl}"))
+
+        # create_all ایندکس جدول‌های از قبل موجود را نمی‌سازد
+        for index in [*Task.__table__.indexes, *DailySummary.__table__.indexes]:
+            index.create(conn, checkfirst=True)
+
+        self._backfill_scheduled_at(conn)
+
+    def _backfill_scheduled_at(self, conn, batch_size=1000):
+        """پر کردن scheduled_at برای ردیف‌های قدیمی"""
+        while True:
+            rows = conn.execute(text(
+                "SELECT id, scheduled_date, scheduled_time FROM tasks "
+                "WHERE scheduled_at IS NULL AND scheduled_date IS NOT NULL LIMIT :limit"
+            ), {'limit': batch_size}).all()
+            if not rows:
+                break
+
+            updates = []
+            for task_id, scheduled_date, scheduled_time in rows:
+                try:
+                    epoch = scheduled_epoch(scheduled_date, scheduled_time)
+                except (TypeError, ValueError):
+                    # ردیف خراب؛ با -1 علامت می‌خورد تا دوباره بررسی نشود
+                    epoch = -1
+                updates.append({'id': task_id, 'scheduled_at': epoch})
+
+            conn.execute(
+                text("UPDATE tasks SET scheduled_at = :scheduled_at WHERE id = :id"),
+                updates
+            )
+
+    async def add_user(self, telegram_id, username, first_name):
+        async with self.Session() as session:
+            user = await session.scalar(select(User).filter_by(telegram_id=telegram_id))
+            if not user:
+                user = User(telegram_id=telegram_id, username=username, first_name=first_name)
+                session.add(user)
+                await session.commit()
+            return user
+
+    async def get_all_users(self):
+        async with self.Session() as session:
+            return (await session.scalars(select(User))).all()
+
+    async def add_task(self, user_id, task_data):
+        """ثبت تسک؛ برای task_data دارای recurrence اولین وقوع برگردانده می‌شود"""
+        if task_data.get('recurrence'):
+            return await self.add_recurring_task(user_id, task_data)
+        
         task = Task(
             user_id=user_id,
             title=task_data['task_title'],
             task_type=task_data['task_type'],
             scheduled_date=task_data['scheduled_date'],
             scheduled_time=task_data['scheduled_time'],
+            scheduled_at=scheduled_epoch(task_data['scheduled_date'], task_data['scheduled_time']),
             duration=task_data.get('duration', 60),
             reminder_before=task_data.get('reminder_before', 15),
             notes=task_data.get('notes', '')
         )
-        self.session.add(task)
-        self.session.commit()
+        async with self.Session() as session:
+            session.add(task)
+            await self._bump_summary(session, task.user_id, task.scheduled_date, total=1)
+            await session.commit()
+        self._notify_task_change(task.user_id, task.scheduled_date, task)
         return task
 
-    def get_today_tasks(self, user_id):
+    async def add_tasks(self, user_id, tasks_data):
+        """ثبت دسته‌ای تسک‌های یک‌باره با یک executemany در یک تراکنش
+
+        خلاصه‌های روزانه برای هر تاریخ یک بار به‌روز می‌شوند و listenerها برای
+        هر تاریخ یک بار صدا زده می‌شوند. خروجی لیست (task_id, scheduled_at,
+        زمان یادآوری) برای زمان‌بندی دسته‌ای یادآوری‌هاست.
+        """
+        if not tasks_data:
+            return []
+        rows = [
+            {
+                'user_id': user_id,
+                'title': task_data['task_title'],
+                'task_type': task_data['task_type'],
+                'scheduled_date': task_data['scheduled_date'],
+                'scheduled_time': task_data['scheduled_time'],
+                'scheduled_at': scheduled_epoch(task_data['scheduled_date'], task_data['scheduled_time']),
+                'duration': task_data.get('duration', 60),
+                'reminder_before': task_data.get('reminder_before', 15),
+                'status': 'pending',
+                'notes': task_data.get('notes', ''),
+                'reminder_sent': False,
+            }
+            for task_data in tasks_data
+        ]
+        per_date = Counter(row['scheduled_date'] for row in rows)
+        async with self.Session() as session:
+            inserted = (await session.execute(
+                insert(Task).returning(Task.id, Task.scheduled_at, Task.reminder_before), rows
+            )).all()
+            await self._bump_summaries(session, user_id, per_date)
+            await session.commit()
+        for date in per_date:
+            self._notify_task_change(user_id, date)
+        return [
+            (task_id, scheduled_at, scheduled_at - (reminder_before or 0) * 60)
+            for task_id, scheduled_at, reminder_before in inserted
+        ]
+
+    async def _bump_summary(self, session, user_id, date, completed=0, total=0):
+        """افزایش شمارنده‌های خلاصه روزانه در همان تراکنش تغییر تسک"""
+        new_completed = DailySummary.completed_tasks + completed
+        new_total = DailySummary.total_tasks + total
+        values = {
+            'completed_tasks': new_completed,
+            'total_tasks': new_total,
+            'productivity_score': case((new_total > 0, new_completed * 100 // new_total), else_=0),
+        }
+        where = (DailySummary.user_id == user_id, DailySummary.date == date)
+        
+        result = await session.execute(update(DailySummary).where(*where).values(**values))
+        if result.rowcount:
+            return
+        try:
+            async with session.begin_nested():
+                session.add(DailySummary(
+                    user_id=user_id, date=date,
+                    completed_tasks=completed, total_tasks=total,
+                    productivity_score=productivity_score(completed, total)
+                ))
+        except IntegrityError:
+            # ردیف همزمان توسط درخواست دیگری ساخته شده
+            await session.execute(update(DailySummary).where(*where).values(**values))
+
+    async def _bump_summaries(self, session, user_id, totals):
+        """افزایش total_tasks چند تاریخ یک کاربر ({date: count}) با کوئری‌های دسته‌ای"""
+        existing = set(await session.scalars(
+            select(DailySummary.date).where(
+                DailySummary.user_id == user_id, DailySummary.date.in_(list(totals))
+            )
+        ))
+        if existing:
+            table = DailySummary.__table__
+            new_total = table.c.total_tasks + bindparam('added')
+            await session.execute(
+                update(table)
+                .where(table.c.user_id == user_id, table.c.date == bindparam('summary_date'))
+                .values(
+                    total_tasks=new_total,
+                    productivity_score=table.c.completed_tasks * 100 // new_total
+                ),
+                [{'summary_date': date, 'added': totals[date]} for date in existing]
+            )
+        
+        missing = [date for date in totals if date not in existing]
+        if not missing:
+            return
+        try:
+            async with session.begin_nested():
+                await session.execute(insert(DailySummary), [
+                    {'user_id': user_id, 'date': date, 'completed_tasks': 0,
+                     'total_tasks': totals[date], 'productivity_score': 0}
+                    for date in missing
+                ])
+        except IntegrityError:
+            # بعضی ردیف‌ها همزمان ساخته شده‌اند؛ تک‌تک به‌روز می‌شوند
+            for date in missing:
+                await self._bump_summary(session, user_id, date, total=totals[date])
+
+    async def add_recurring_task(self, user_id, task_data):
+        recurrence = task_data['recurrence']
+        rule = RecurringTask(
+            user_id=user_id,
+            title=task_data['task_title'],
+            task_type=task_data['task_type'],
+            freq=recurrence.get('freq', DAILY),
+            weekdays=encode_weekdays(recurrence.get('weekdays')),
+            start_date=task_data['scheduled_date'],
+            end_date=recurrence.get('until'),
+            scheduled_time=task_data['scheduled_time'],
+            duration=task_data.get('duration', 60),
+            reminder_before=task_data.get('reminder_before', 15),
+            notes=task_data.get('notes', '')
+        )
+        async with self.Session() as session:
+            session.add(rule)
+            await session.commit()
+        
+        # اولین وقوع حداکثر یک هفته بعد از تاریخ شروع است
+        start = datetime.strptime(rule.start_date, '%Y-%m-%d').date()
+        first = next(occurrence_dates(rule, start, start + timedelta(days=7)), None)
+        # قانون جدید روی همه روزهای کش شده کاربر اثر دارد
+        self.day_cache.invalidate(user_id)
+        self._notify_task_change(user_id, first.isoformat() if first else rule.start_date)
+        return Occurrence(rule, first) if first else None
+
+    async def _get_occurrences(self, session, start, end, user_ids=None, rule_ids=None):
+        """وقوع‌های قانون‌های فعال در بازه تاریخ [start, end)، بدون وقوع‌های رد شده"""
+        query = select(RecurringTask).where(
+            RecurringTask.start_date < end,
+            (RecurringTask.end_date.is_(None)) | (RecurringTask.end_date >= start)
+        )
+        if user_ids is not None:
+            query = query.where(RecurringTask.user_id.in_(user_ids))
+        if rule_ids is not None:
+            query = query.where(RecurringTask.id.in_(rule_ids))
+        rules = (await session.scalars(query)).all()
+        if not rules:
+            return []
+        
+        exceptions = {
+            (exception.rule_id, exception.date): exception
+            for exception in (await session.scalars(
+                select(RecurrenceException).where(
+                    RecurrenceException.rule_id.in_([rule.id for rule in rules]),
+                    RecurrenceException.date >= start,
+                    RecurrenceException.date < end
+                )
+            )).all()
+        }
+        
+        occurrences = []
+        for rule in rules:
+            for date in occurrence_dates(rule, start, end):
+                exception = exceptions.get((rule.id, date.isoformat()))
+                if exception is None or exception.status != SKIPPED:
+                    occurrences.append(Occurrence(rule, date, exception))
+        return occurrences
+
+    @staticmethod
+    def _date_range(start_epoch, end_epoch):
+        """بازه تاریخ [start, end) که بازه epoch را پوشش می‌دهد"""
+        start = datetime.fromtimestamp(start_epoch).date()
+        end = datetime.fromtimestamp(end_epoch).date() + timedelta(days=1)
+        return start.isoformat(), end.isoformat()
+
+    async def get_occurrence(self, task_id):
+        rule_id, date = parse_occurrence_id(task_id)
+        async with self.Session() as session:
+            rule = await session.get(RecurringTask, rule_id)
+            if rule is None:
+                return None
+            exception = await session.scalar(
+                select(RecurrenceException).filter_by(rule_id=rule_id, date=date)
+            )
+        if exception is not None and exception.status == SKIPPED:
+            return None
+        if date not in {day.isoformat() for day in occurrence_dates(rule, date, next_day(date))}:
+            return None
+        return Occurrence(rule, date, exception)
+
+    async def get_task(self, task_id):
+        if parse_occurrence_id(task_id):
+            return await self.get_occurrence(task_id)
+        async with self.Session() as session:
+            return await session.get(Task, task_id)
+
+    async def get_today_tasks(self, user_id):
         today = datetime.now().strftime('%Y-%m-%d')
-        return self.session.query(Task).filter(
-            Task.user_id == user_id,
-            Task.scheduled_date == today
-        ).all()
+        return await self.get_tasks_for_date(user_id, today)
 
-    def get_upcoming_tasks(self, user_id, hours=24):
+    async def get_tasks_for_date(self, user_id, date):
+        """تسک‌های یک روز به صورت TaskSnapshot، از کش یا با اسکن بازه‌ای روی ایندکس (user_id, scheduled_at)"""
+        cached = self.day_cache.get(user_id, date)
+        if cached is not None:
+            return list(cached)
+        generation = self.day_cache.generation
+        tasks = [snapshot(task) for task in await self._load_tasks_for_date(user_id, date)]
+        self.day_cache.put(user_id, date, tasks, generation)
+        return tasks
+
+    async def _load_tasks_for_date(self, user_id, date):
+        start, end = day_bounds(date)
+        async with self.Session() as session:
+            tasks = (await session.scalars(
+                select(Task).filter(
+                    Task.user_id == user_id,
+                    Task.scheduled_at >= start,
+                    Task.scheduled_at < end
+                ).order_by(Task.scheduled_at)
+            )).all()
+            occurrences = await self._get_occurrences(session, date, next_day(date), user_ids=[user_id])
+        if not occurrences:
+            return tasks
+        return sorted([*tasks, *occurrences], key=lambda task: task.scheduled_at)
+
+    async def get_upcoming_tasks(self, user_id, hours=24):
         now = datetime.now()
         future = now + timedelta(hours=hours)
         
-        tasks = self.session.query(Task).filter(
-            Task.user_id == user_id,
-            Task.status == 'pending'
-        ).all()
+        start, end = int(now.timestamp()), int(future.timestamp())
+        async with self.Session() as session:
+            tasks = (await session.scalars(
+                select(Task).filter(
+                    Task.user_id == user_id,
+                    Task.status == 'pending',
+                    Task.scheduled_at >= start,
+                    Task.scheduled_at <= end
+                ).order_by(Task.scheduled_at)
+            )).all()
+            occurrences = [
+                occurrence
+                for occurrence in await self._get_occurrences(session, *self._date_range(start, end), user_ids=[user_id])
+                if occurrence.status == 'pending' and start <= occurrence.scheduled_at <= end
+            ]
+        if not occurrences:
+            return tasks
+        return sorted([*tasks, *occurrences], key=lambda task: task.scheduled_at)
+
+    async def get_tasks_between(self, user_id, start_epoch, end_epoch):
+        """همه تسک‌ها و وقوع‌های کاربر که در بازه [start_epoch, end_epoch) شروع می‌شوند"""
+        async with self.Session() as session:
+            tasks = (await session.scalars(
+                select(Task).filter(
+                    Task.user_id == user_id,
+                    Task.scheduled_at >= start_epoch,
+                    Task.scheduled_at < end_epoch
+                ).order_by(Task.scheduled_at)
+            )).all()
+            occurrences = [
+                occurrence
+                for occurrence in await self._get_occurrences(session, *self._date_range(start_epoch, end_epoch), user_ids=[user_id])
+                if start_epoch <= occurrence.scheduled_at < end_epoch
+            ]
+        if not occurrences:
+            return tasks
+        return sorted([*tasks, *occurrences], key=lambda task: task.scheduled_at)
+
+    async def iter_user_ids(self, batch_size=1000, shards=None):
+        """پیمایش دسته‌ای telegram_id همه کاربران (keyset pagination)، در صورت تعیین فقط در shards"""
+        conditions = [] if shards is None else [_in_shards(User.telegram_id, shards)]
+        last_id = 0
+        while True:
+            async with self.Session() as session:
+                rows = (await session.execute(
+                    select(User.id, User.telegram_id)
+                    .where(User.id > last_id, *conditions)
+                    .order_by(User.id)
+                    .limit(batch_size)
+                )).all()
+            if not rows:
+                return
+            last_id = rows[-1].id
+            yield [row.telegram_id for row in rows]
+
+    async def iter_user_tasks(self, user_id, batch_size=500):
+        """پیمایش دسته‌ای همه تسک‌های یک‌باره یک کاربر به ترتیب شناسه"""
+        last_id = 0
+        while True:
+            async with self.Session() as session:
+                tasks = (await session.scalars(
+                    select(Task)
+                    .where(Task.user_id == user_id, Task.id > last_id)
+                    .order_by(Task.id)
+                    .limit(batch_size)
+                )).all()
+            if not tasks:
+                return
+            last_id = tasks[-1].id
+            yield tasks
+
+    async def get_recurring_tasks(self, user_id):
+        """قانون‌های تکراری یک کاربر و تاریخ‌های رد شده هر کدام: [(rule, [date])]"""
+        async with self.Session() as session:
+            rules = (await session.scalars(
+                select(RecurringTask).where(RecurringTask.user_id == user_id).order_by(RecurringTask.id)
+            )).all()
+            skipped = (await session.execute(
+                select(RecurrenceException.rule_id, RecurrenceException.date).where(
+                    RecurrenceException.rule_id.in_([rule.id for rule in rules]),
+                    RecurrenceException.status == SKIPPED
+                )
+            )).all() if rules else []
+        skipped_by_rule = {}
+        for rule_id, date in skipped:
+            skipped_by_rule.setdefault(rule_id, []).append(date)
+        return [(rule, sorted(skipped_by_rule.get(rule.id, []))) for rule in rules]
+
+    async def iter_free_user_ids(self, at_epoch, batch_size=1000, shards=None):
+        """پیمایش دسته‌ای telegram_id کاربرانی که در لحظه at_epoch تسکی ندارند
+
+        کاربران مشغول با یک زیرکوئری روی ایندکس scheduled_at حذف می‌شوند
+        (تسک‌هایی که شروع شده‌اند و هنوز تمام نشده‌اند، حتی اگر از نیمه‌شب
+        گذشته باشند)؛ وقوع‌های برنامه‌های تکراری همان لحظه هم کنار گذاشته می‌شوند.
+        """
+        busy_tasks = select(Task.user_id).where(
+            Task.scheduled_at > at_epoch - config.MAX_TASK_DURATION * 60,
+            Task.scheduled_at <= at_epoch,
+            Task.scheduled_at + func.coalesce(Task.duration, 60) * 60 > at_epoch
+        )
+        
+        async with self.Session() as session:
+            occurrences = await self._get_occurrences(
+                session, *self._date_range(at_epoch - config.MAX_TASK_DURATION * 60, at_epoch)
+            )
+        busy_recurring = {
+            occurrence.user_id
+            for occurrence in occurrences
+            if occurrence.scheduled_at <= at_epoch < occurrence.scheduled_at + (occurrence.duration or 60) * 60
+        }
         
-        upcoming = []
+        conditions = [] if shards is None else [_in_shards(User.telegram_id, shards)]
+        last_id = 0
+        while True:
+            async with self.Session() as session:
+                rows = (await session.execute(
+                    select(User.id, User.telegram_id)
+                    .where(User.id > last_id, User.telegram_id.not_in(busy_tasks), *conditions)
+                    .order_by(User.id)
+                    .limit(batch_size)
+                )).all()
+            if not rows:
+                return
+            last_id = rows[-1].id
+            yield [row.telegram_id for row in rows if row.telegram_id not in busy_recurring]
+
+    async def get_day_counts(self, date):
+        """{user_id: (completed, total)} برای همه کاربران از خلاصه‌های روزانه"""
+        async with self.Session() as session:
+            rows = (await session.execute(
+                select(
+                    DailySummary.user_id,
+                    DailySummary.completed_tasks,
+                    DailySummary.total_tasks
+                ).where(
+                    DailySummary.date == date,
+                    DailySummary.total_tasks > 0
+                )
+            )).all()
+            occurrences = await self._get_occurrences(session, date, next_day(date))
+        counts = {user_id: (completed, total) for user_id, completed, total in rows}
+        for occurrence in occurrences:
+            completed, total = counts.get(occurrence.user_id, (0, 0))
+            counts[occurrence.user_id] = (completed + (occurrence.status == 'completed'), total + 1)
+        return counts
+
+    async def get_tasks_for_users_on_date(self, user_ids, date):
+        """تسک‌های یک روز برای یک دسته کاربر: {user_id: [Task]}
+
+        کاربرانی که در کش روز هستند از کش و بقیه با یک کوئری خوانده می‌شوند.
+        نتیجه کوئری در کش ذخیره نمی‌شود تا خلاصه شبانه کاربران فعال را بیرون نکند.
+        """
+        tasks_by_user = {}
+        misses = []
+        for user_id in user_ids:
+            cached = self.day_cache.get(user_id, date)
+            if cached is None:
+                misses.append(user_id)
+            elif cached:
+                tasks_by_user[user_id] = list(cached)
+        user_ids = misses
+        if not user_ids:
+            return tasks_by_user
+        start, end = day_bounds(date)
+        async with self.Session() as session:
+            tasks = (await session.scalars(
+                select(Task).where(
+                    Task.user_id.in_(user_ids),
+                    Task.scheduled_at >= start,
+                    Task.scheduled_at < end
+                ).order_by(Task.user_id, Task.scheduled_at)
+            )).all()
+            occurrences = await self._get_occurrences(session, date, next_day(date), user_ids=user_ids)
         for task in tasks:
-            task_datetime = datetime.strptime(
-                f"{task.scheduled_date} {task.scheduled_time}", 
-                '%Y-%m-%d %H:%M'
-            )
-            if now <= task_datetime <= future:
-                upcoming.append(task)
+            tasks_by_user.setdefault(task.user_id, []).append(task)
+        for occurrence in occurrences:
+            tasks_by_user.setdefault(occurrence.user_id, []).append(occurrence)
+        if occurrences:
+            for user_tasks in tasks_by_user.values():
+                user_tasks.sort(key=lambda task: task.scheduled_at)
+        return tasks_by_user
+
+    async def get_daily_summaries(self, user_id, start_date, end_date):
+        """خلاصه روزهای [start_date, end_date] با O(تعداد روز) ردیف، بدون اسکن تسک‌ها"""
+        async with self.Session() as session:
+            summaries = (await session.scalars(
+                select(DailySummary).filter(
+                    DailySummary.user_id == user_id,
+                    DailySummary.date >= start_date,
+                    DailySummary.date <= end_date
+                ).order_by(DailySummary.date)
+            )).all()
+            occurrences = await self._get_occurrences(session, start_date, next_day(end_date), user_ids=[user_id])
+        if not occurrences:
+            return [summary for summary in summaries if summary.total_tasks]
         
-        return upcoming
+        # سهم برنامه‌های تکراری روی نسخه جدا از session اضافه می‌شود و ذخیره نمی‌شود
+        by_date = {
+            summary.date: DailySummary(
+                user_id=user_id, date=summary.date,
+                completed_tasks=summary.completed_tasks, total_tasks=summary.total_tasks
+            )
+            for summary in summaries
+        }
+        for occurrence in occurrences:
+            summary = by_date.setdefault(
+                occurrence.scheduled_date,
+                DailySummary(user_id=user_id, date=occurrence.scheduled_date, completed_tasks=0, total_tasks=0)
+            )
+            summary.total_tasks += 1
+            summary.completed_tasks += occurrence.status == 'completed'
+        for summary in by_date.values():
+            summary.productivity_score = productivity_score(summary.completed_tasks, summary.total_tasks)
+        return [by_date[date] for date in sorted(by_date) if by_date[date].total_tasks]
 
-    def update_task_status(self, task_id, status, notes=None):
-        task = self.session.query(Task).filter_by(id=task_id).first()
-        if task:
-            task.status = status
+    async def rebuild_daily_summaries(self, batch_size=1000):
+        """محاسبه دوباره همه خلاصه‌های روزانه از جدول tasks (برای داده‌های قدیمی)"""
+        async with self.Session() as session:
+            counts = {
+                (user_id, date): (completed, total)
+                for user_id, date, completed, total in (await session.execute(
+                    select(
+                        Task.user_id,
+                        Task.scheduled_date,
+                        func.sum(case((Task.status == 'completed', 1), else_=0)),
+                        func.count()
+                    ).group_by(Task.user_id, Task.scheduled_date)
+                )).all()
+            }
+            existing = {
+                (summary.user_id, summary.date): summary
+                for summary in (await session.scalars(select(DailySummary))).all()
+            }
+            
+            pending = 0
+            for key in counts.keys() | existing.keys():
+                completed, total = counts.get(key, (0, 0))
+                summary = existing.get(key)
+                if summary is None:
+                    summary = DailySummary(user_id=key[0], date=key[1])
+                    session.add(summary)
+                summary.completed_tasks = completed
+                summary.total_tasks = total
+                summary.productivity_score = productivity_score(completed, total)
+                pending += 1
+                if pending % batch_size == 0:
+                    await session.flush()
+            await session.commit()
+        return len(counts)
+
+    async def _get_exception(self, session, rule_id, date):
+        """ردیف وضعیت یک وقوع؛ اگر وجود نداشته باشد ساخته می‌شود"""
+        exception = await session.scalar(
+            select(RecurrenceException).filter_by(rule_id=rule_id, date=date)
+        )
+        if exception is None:
+            try:
+                async with session.begin_nested():
+                    exception = RecurrenceException(rule_id=rule_id, date=date, status='pending', reminder_sent=False)
+                    session.add(exception)
+            except IntegrityError:
+                # همزمان توسط درخواست دیگری ساخته شده
+                exception = await session.scalar(
+                    select(RecurrenceException).filter_by(rule_id=rule_id, date=date)
+                )
+        return exception
+
+    async def update_occurrence_status(self, task_id, status, notes=None):
+        """ثبت وضعیت یک وقوع (completed، missed یا skipped برای رد کردن)"""
+        occurrence = await self.get_occurrence(task_id)
+        if occurrence is None:
+            return None
+        async with self.Session() as session:
+            exception = await self._get_exception(session, occurrence.rule_id, occurrence.scheduled_date)
+            exception.status = status
             if notes:
-                task.notes = notes
-            self.session.commit()
-        return task
+                exception.notes = notes
+            await session.commit()
+        occurrence.status = status
+        # وقوع رد شده از برنامه روز حذف می‌شود
+        self._notify_task_change(
+            occurrence.user_id, occurrence.scheduled_date, None if status == SKIPPED else occurrence
+        )
+        return occurrence
+
+    async def update_task_status(self, task_id, status, notes=None):
+        if parse_occurrence_id(task_id):
+            return await self.update_occurrence_status(task_id, status, notes)
+        async with self.Session() as session:
+            task = await session.get(Task, task_id)
+            if task:
+                completed = (status == 'completed') - (task.status == 'completed')
+                task.status = status
+                if notes:
+                    task.notes = notes
+                if completed:
+                    await self._bump_summary(session, task.user_id, task.scheduled_date, completed=completed)
+                await session.commit()
+                self._notify_task_change(task.user_id, task.scheduled_date, task)
+            return task
+
+    async def get_pending_reminders(self, now_epoch, shards=None, horizon_epoch=None):
+        """یادآوری‌های ارسال نشده برای تسک‌هایی که هنوز شروع نشده‌اند
+
+        خروجی لیستی از (task_id, زمان یادآوری به epoch) است؛ با shards فقط
+        یادآوری‌های کاربران همان شاردها و با horizon_epoch فقط تسک‌ها و وقوع‌هایی
+        که تا آن زمان شروع می‌شوند (بقیه در بارگذاری‌های دوره‌ای بعدی می‌آیند).
+        """
+        reminder_at = Task.scheduled_at - func.coalesce(Task.reminder_before, 0) * 60
+        conditions = [] if shards is None else [_in_shards(Task.user_id, shards)]
+        if horizon_epoch is not None:
+            conditions.append(Task.scheduled_at <= horizon_epoch)
+        today = datetime.fromtimestamp(now_epoch).date().isoformat()
+        horizon = datetime.fromtimestamp(horizon_epoch).date() if horizon_epoch is not None else None
+        rule_conditions = [] if shards is None else [_in_shards(RecurringTask.user_id, shards)]
+        if horizon is not None:
+            rule_conditions.append(RecurringTask.start_date <= horizon.isoformat())
+        async with self.Session() as session:
+            reminders = (await session.execute(
+                select(Task.id, reminder_at).filter(
+                    Task.status == 'pending',
+                    Task.reminder_sent.isnot(True),
+                    Task.scheduled_at > now_epoch,
+                    *conditions
+                )
+            )).all()
+            # برای هر برنامه تکراری فقط وقوع بعدی؛ بقیه بعد از ارسال یادآوری زمان‌بندی می‌شوند
+            rules = (await session.scalars(
+                select(RecurringTask).where(
+                    (RecurringTask.end_date.is_(None)) | (RecurringTask.end_date >= today),
+                    *rule_conditions
+                )
+            )).all()
+            exceptions = {}
+            if rules:
+                exceptions = {
+                    (exception.rule_id, exception.date): exception
+                    for exception in (await session.scalars(
+                        select(RecurrenceException).where(
+                            RecurrenceException.rule_id.in_([rule.id for rule in rules]),
+                            RecurrenceException.date >= today
+                        )
+                    )).all()
+                }
+        
+        occurrences = []
+        yesterday = (datetime.fromtimestamp(now_epoch).date() - timedelta(days=1)).isoformat()
+        for rule in rules:
+            date = next_occurrence_date(rule, yesterday)
+            while date is not None and (horizon is None or date <= horizon):
+                occurrence = Occurrence(rule, date, exceptions.get((rule.id, date.isoformat())))
+                if occurrence.status == 'pending' and not occurrence.reminder_sent and occurrence.scheduled_at > now_epoch:
+                    occurrences.append(occurrence)
+                    break
+                date = next_occurrence_date(rule, date)
+        
+        return [*reminders, *(
+            (occurrence.id, occurrence.scheduled_at - (occurrence.reminder_before or 0) * 60)
+            for occurrence in occurrences
+        )]
+
+    async def get_next_occurrence(self, task_id):
+        """وقوع بعدی همان برنامه تکراری بعد از وقوع task_id"""
+        rule_id, date = parse_occurrence_id(task_id)
+        async with self.Session() as session:
+            rule = await session.get(RecurringTask, rule_id)
+            while rule is not None:
+                following = next_occurrence_date(rule, date)
+                if following is None:
+                    return None
+                date = following.isoformat()
+                exception = await session.scalar(
+                    select(RecurrenceException).filter_by(rule_id=rule_id, date=date)
+                )
+                if exception is None or exception.status != SKIPPED:
+                    return Occurrence(rule, date, exception)
+        return None
+
+    async def claim_reminder(self, task_id):
+        """علامت‌گذاری اتمیک یادآوری؛ فقط اولین فراخواننده True می‌گیرد"""
+        occurrence = parse_occurrence_id(task_id)
+        if occurrence:
+            rule_id, date = occurrence
+            async with self.Session() as session:
+                await self._get_exception(session, rule_id, date)
+                result = await session.execute(
+                    update(RecurrenceException).where(
+                        RecurrenceException.rule_id == rule_id,
+                        RecurrenceException.date == date,
+                        RecurrenceException.status == 'pending',
+                        RecurrenceException.reminder_sent.isnot(True)
+                    ).values(reminder_sent=True)
+                )
+                await session.commit()
+                return result.rowcount == 1
+        
+        async with self.Session() as session:
+            result = await session.execute(
+                update(Task).where(
+                    Task.id == task_id,
+                    Task.status == 'pending',
+                    Task.reminder_sent.isnot(True)
+                ).values(reminder_sent=True)
+            )
+            await session.commit()
+            return result.rowcount == 1
+
+    async def acquire_lease(self, name, owner, ttl):
+        """گرفتن یا تمدید lease؛ اگر کس دیگری lease منقضی نشده را دارد False"""
+        now = time.time()
+        async with self.Session() as session:
+            result = await session.execute(
+                update(Lease).where(
+                    Lease.name == name,
+                    (Lease.owner == owner) | (Lease.expires_at < now)
+                ).values(owner=owner, expires_at=now + ttl)
+            )
+            await session.commit()
+            if result.rowcount == 1:
+                return True
+            
+            session.add(Lease(name=name, owner=owner, expires_at=now + ttl))
+            try:
+                await session.commit()
+                return True
+            except IntegrityError:
+                return False
+
+    async def renew_leases(self, names, owner, ttl):
+        """تمدید lease های owner از بین names؛ مجموعه نام‌هایی که هنوز در اختیار owner است"""
+        if not names:
+            return set()
+        now = time.time()
+        async with self.Session() as session:
+            await session.execute(
+                update(Lease).where(
+                    Lease.name.in_(list(names)),
+                    Lease.owner == owner,
+                    Lease.expires_at >= now
+                ).values(expires_at=now + ttl)
+            )
+            await session.commit()
+            held = await session.scalars(
+                select(Lease.name).where(
+                    Lease.name.in_(list(names)), Lease.owner == owner, Lease.expires_at >= now
+                )
+            )
+            return set(held)
+
+    async def release_leases(self, names, owner):
+        if not names:
+            return
+        async with self.Session() as session:
+            await session.execute(
+                delete(Lease).where(Lease.name.in_(list(names)), Lease.owner == owner)
+            )
+            await session.commit()
+
+    async def get_leases(self):
+        """{name: (owner, expires_at)} برای همه lease ها"""
+        async with self.Session() as session:
+            rows = (await session.execute(select(Lease.name, Lease.owner, Lease.expires_at))).all()
+        return {name: (owner, expires_at) for name, owner, expires_at in rows}
+
+    async def claim_job_runs(self, keys, owner):
+        """درج کلیدهای اجرای job؛ فقط کلیدهایی که قبلاً ثبت نشده بودند برگردانده می‌شوند"""
+        claimed = []
+        now = int(time.time())
+        for key in keys:
+            async with self.Session() as session:
+                session.add(JobRun(key=key, owner=owner, claimed_at=now))
+                try:
+                    await session.commit()
+                    claimed.append(key)
+                except IntegrityError:
+                    pass
+        return claimed
+
+    async def prune_cluster_state(self, before_epoch):
+        """حذف اجراهای قدیمی job و lease های مدت‌ها منقضی شده (workerهای از کار افتاده)"""
+        async with self.Session() as session:
+            await session.execute(delete(JobRun).where(JobRun.claimed_at < before_epoch))
+            await session.execute(delete(Lease).where(Lease.expires_at < before_epoch))
+            await session.commit()
+
+    async def get_parse_cache(self, key, min_created_at):
+        async with self.Session() as session:
+            return await session.scalar(
+                select(ParseCacheEntry.payload).where(
+                    ParseCacheEntry.key == key,
+                    ParseCacheEntry.created_at >= min_created_at
+                )
+            )
+
+    async def put_parse_cache(self, key, payload, created_at):
+        async with self.Session() as session:
+            await session.merge(ParseCacheEntry(key=key, payload=payload, created_at=created_at))
+            await session.commit()
+
+    async def prune_parse_cache(self, min_created_at, max_rows):
+        """حذف ردیف‌های منقضی و قدیمی‌ترین ردیف‌های مازاد بر max_rows"""
+        async with self.Session() as session:
+            await session.execute(
+                delete(ParseCacheEntry).where(ParseCacheEntry.created_at < min_created_at)
+            )
+            total = await session.scalar(select(func.count()).select_from(ParseCacheEntry))
+            if total > max_rows:
+                oldest = select(ParseCacheEntry.key).order_by(ParseCacheEntry.created_at).limit(total - max_rows)
+                await session.execute(
+                    delete(ParseCacheEntry).where(ParseCacheEntry.key.in_(oldest))
+                )
+            await session.commit()
 
 db = Database()
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    
+    parser = argparse.ArgumentParser(description="ابزارهای نگهداری دیتابیس")
+    parser.add_argument('command', choices=['backfill-summaries'])
+    args = parser.parse_args()
+    
+    async def main():
+        await db.init()
+        try:
+            if args.command == 'backfill-summaries':
+                days = await db.rebuild_daily_summaries()
+                print(f"✅ {days} daily summaries rebuilt")
+        finally:
+            await db.close()
+    
+    asyncio.run(main())
@@ -0,0 +1,169 @@
+"""کش درون‌پروسسی تسک‌های یک روز هر کاربر
+
+هر ورودی یک tuple از TaskSnapshot های تغییرناپذیر است که به ترتیب زمان
+مرتب شده‌اند. Database در add_task و update_task_status ورودی را مستقیم
+به‌روز می‌کند (write-through) و بقیه نوشتن‌ها ورودی‌های مربوط را دور
+می‌ریزند. حجم کش با تعداد ورودی و مجموع ردیف‌ها محدود است (LRU) و با
+عوض شدن روز ورودی‌های روزهای گذشته پاک می‌شوند.
+
+کش فقط نوشتن‌های همین پروسس را می‌بیند؛ وقتی چند پروسس روی یک دیتابیس
+کار می‌کنند (webhook پشت load balancer یا cluster) هر ورودی حداکثر
+DAY_CACHE_TTL ثانیه بعد از خواندن از دیتابیس دوباره خوانده می‌شود.
+"""
+from collections import OrderedDict, namedtuple
+import time
+from datetime import datetime
+
+import config
+from metrics import metrics
+
+TaskSnapshot = namedtuple('TaskSnapshot', [
+    'id', 'user_id', 'title', 'task_type', 'scheduled_date', 'scheduled_time',
+    'scheduled_at', 'duration', 'reminder_before', 'status', 'notes', 'is_recurring',
+])
+
+
+def snapshot(task):
+    """TaskSnapshot از یک Task یا Occurrence"""
+    if isinstance(task, TaskSnapshot):
+        return task
+    return TaskSnapshot(
+        task.id, task.user_id, task.title, task.task_type, task.scheduled_date, task.scheduled_time,
+        task.scheduled_at, task.duration, task.reminder_before, task.status, task.notes,
+        getattr(task, 'is_recurring', False),
+    )
+
+
+class DayCache:
+    """LRU روی (user_id, date) با سقف ورودی و مجموع ردیف‌ها"""
+
+    def __init__(self, max_entries=None, max_rows=None, ttl=None):
+        self.max_entries = config.DAY_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.max_rows = config.DAY_CACHE_MAX_ROWS if max_rows is None else max_rows
+        self.ttl = config.DAY_CACHE_TTL if ttl is None else ttl
+        # (user_id, date) -> (tuple تسک‌ها، زمان انقضا به monotonic)
+        self._entries = OrderedDict()
+        self._rows = 0
+        self._day = None
+        # ساعت نوشتن‌ها: با هر نوشتن زیاد می‌شود و برای هر کلید زمان آخرین نوشتن نگه داشته
+        # می‌شود؛ نتیجه خواندنی که همزمان با نوشتن روی همان (کاربر، روز) انجام شده ذخیره نمی‌شود
+        self.generation = 0
+        self._written = OrderedDict()
+        # بزرگ‌ترین زمان نوشتنی که از _written بیرون رفته؛ برای کلیدهای ناشناخته محافظه‌کارانه است
+        self._written_floor = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        metrics.gauge('day_cache_entries', lambda: len(self._entries))
+        metrics.gauge('day_cache_rows', lambda: self._rows)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _roll_over(self):
+        """پاک کردن ورودی‌های روزهای گذشته بعد از نیمه‌شب"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        if today == self._day:
+            return
+        self._day = today
+        for key in [key for key in self._entries if key[1] < today]:
+            self._drop(key)
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._rows -= len(entry[0])
+
+    def get(self, user_id, date):
+        """tuple تسک‌ها یا None"""
+        self._roll_over()
+        entry = self._entries.get((user_id, date))
+        if entry is not None and entry[1] < time.monotonic():
+            self._drop((user_id, date))
+            entry = None
+        if entry is None:
+            self.misses += 1
+            metrics.inc('day_cache_requests_total', result='miss')
+            return None
+        self._entries.move_to_end((user_id, date))
+        self.hits += 1
+        metrics.inc('day_cache_requests_total', result='hit')
+        return entry[0]
+
+    def _record_write(self, key):
+        self.generation += 1
+        self._written[key] = self.generation
+        self._written.move_to_end(key)
+        while len(self._written) > max(self.max_entries, 1024):
+            _, written = self._written.popitem(last=False)
+            self._written_floor = max(self._written_floor, written)
+
+    def _written_since(self, user_id, date, generation):
+        """آیا بعد از generation روی این (کاربر، روز) یا همه روزهای کاربر نوشتنی انجام شده"""
+        last = max(
+            self._written.get((user_id, date), 0),
+            self._written.get((user_id, None), 0),
+        )
+        return last > generation or self._written_floor > generation
+
+    def put(self, user_id, date, tasks, generation=None):
+        """ذخیره نتیجه خواندن از دیتابیس؛ اگر از generation به بعد روی همین روز کاربر نوشتنی انجام شده نادیده گرفته می‌شود"""
+        if not self.max_entries or (generation is not None and self._written_since(user_id, date, generation)):
+            return
+        if date < (self._day or ''):
+            return
+        key = (user_id, date)
+        self._drop(key)
+        rows = tuple(snapshot(task) for task in tasks)
+        self._entries[key] = (rows, time.monotonic() + self.ttl)
+        self._rows += len(rows)
+        self._evict()
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._rows > self.max_rows):
+            key = next(iter(self._entries))
+            self._drop(key)
+            self.evictions += 1
+
+    def apply(self, task):
+        """write-through: جایگزینی یا افزودن تسک در ورودی روزش اگر در کش باشد"""
+        key = (task.user_id, task.scheduled_date)
+        self._record_write(key)
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        tasks, expires = entry
+        row = snapshot(task)
+        updated = [existing for existing in tasks if existing.id != row.id]
+        updated.append(row)
+        updated.sort(key=lambda item: item.scheduled_at)
+        self._entries[key] = (tuple(updated), expires)
+        self._rows += len(updated) - len(tasks)
+        self._evict()
+
+    def invalidate(self, user_id, date=None):
+        """دور ریختن یک روز کاربر، یا همه روزهایش وقتی date داده نشود"""
+        self._record_write((user_id, date))
+        if date is not None:
+            self._drop((user_id, date))
+            return
+        for key in [key for key in self._entries if key[0] == user_id]:
+            self._drop(key)
+
+    def clear(self):
+        self.generation += 1
+        self._written.clear()
+        self._written_floor = self.generation
+        self._entries.clear()
+        self._rows = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'rows': self._rows,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0,
+        }
@@ -0,0 +1,116 @@
+"""نسخه‌های جعلی سرویس‌های بیرونی برای اجرای محلی، بنچمارک و بررسی رفتار بدون شبکه"""
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import deque
+
+from telegram.error import RetryAfter
+
+
+class FakeMessage:
+    def __init__(self, message_id, chat_id, text=None, photo_file_id=None):
+        self.message_id = message_id
+        self.chat_id = chat_id
+        self.text = text
+        self.photo = [FakePhotoSize(photo_file_id)] if photo_file_id else []
+        self.document = None
+
+
+class FakePhotoSize:
+    def __init__(self, file_id):
+        self.file_id = file_id
+
+
+class FakeBot:
+    """Bot جعلی که ارسال‌ها را ثبت می‌کند و محدودیت flood تلگرام را شبیه‌سازی می‌کند
+
+    اگر در یک پنجره یک ثانیه‌ای بیشتر از flood_limit پیام ارسال شود RetryAfter
+    پرتاب می‌شود. latency تأخیر هر فراخوانی را شبیه‌سازی می‌کند.
+    """
+
+    def __init__(self, latency=0.0, flood_limit=None, retry_after=1):
+        self.latency = latency
+        self.flood_limit = flood_limit
+        self.retry_after = retry_after
+        self.sent = []
+        self.flood_errors = 0
+        self._recent = deque()
+        self._ids = itertools.count(1)
+
+    async def _record(self, method, chat_id, kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] > 1:
+            self._recent.popleft()
+        if self.flood_limit is not None and len(self._recent) >= self.flood_limit:
+            self.flood_errors += 1
+            raise RetryAfter(self.retry_after)
+        self._recent.append(now)
+
+        self.sent.append((now, method, chat_id, kwargs))
+        message_id = next(self._ids)
+        photo_file_id = f"fake-file-{message_id}" if method == 'send_photo' else None
+        return FakeMessage(message_id, chat_id, kwargs.get('text'), photo_file_id)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        return await self._record('send_message', chat_id, dict(kwargs, text=text))
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        return await self._record('send_photo', chat_id, dict(kwargs, photo=photo))
+
+    async def send_document(self, chat_id, document, **kwargs):
+        return await self._record('send_document', chat_id, dict(kwargs, document=document))
+
+    def throughput(self):
+        """پیام در ثانیه بین اولین و آخرین ارسال"""
+        if len(self.sent) < 2:
+            return float(len(self.sent))
+        span = self.sent[-1][0] - self.sent[0][0]
+        return (len(self.sent) - 1) / span if span else float('inf')
+
+
+class FakeGeminiResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGeminiModel:
+    """مدل Gemini جعلی با تأخیر و خطای قابل تنظیم
+
+    respond(prompt) متن پاسخ را می‌سازد؛ پیش‌فرض یک JSON معتبر تسک است.
+    error_rate احتمال پرتاب خطا در هر فراخوانی است.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, respond=None, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.respond = respond or self.default_response
+        self.calls = 0
+        self.prompts = []
+        self._random = random.Random(seed)
+
+    @staticmethod
+    def default_response(prompt):
+        return json.dumps({
+            "task_title": "جلسه",
+            "task_type": "work",
+            "scheduled_date": time.strftime('%Y-%m-%d'),
+            "scheduled_time": "10:00",
+            "duration": 60,
+            "reminder_before": 15,
+            "notes": "",
+            "confidence": 0.9
+        }, ensure_ascii=False)
+
+    async def generate_content_async(self, prompt):
+        self.calls += 1
+        self.prompts.append(prompt)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.error_rate and self._random.random() < self.error_rate:
+            raise RuntimeError("fake gemini error")
+        return FakeGeminiResponse(self.respond(prompt))
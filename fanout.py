@@ -0,0 +1,65 @@
+import asyncio
+import time
+
+
+class FanOutReport:
+    """نتیجه یک اجرای fan-out"""
+
+    def __init__(self, name):
+        self.name = name
+        self.total = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.elapsed = 0.0
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'total': self.total,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'elapsed': round(self.elapsed, 3),
+        }
+
+    def __str__(self):
+        return (
+            f"{self.name}: {self.succeeded}/{self.total} ok, "
+            f"{self.failed} failed in {self.elapsed:.2f}s"
+        )
+
+
+async def fan_out(name, items, worker, concurrency=50):
+    """اجرای worker روی همه آیتم‌های یک async iterable با حداکثر concurrency همزمان
+
+    تولیدکننده (items) و مصرف‌کننده‌ها با یک صف محدود به هم وصل‌اند تا
+    خواندن دسته‌ای از دیتابیس جلوتر از ارسال‌ها حافظه را پر نکند.
+    """
+    report = FanOutReport(name)
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    started = time.monotonic()
+
+    async def consume():
+        while True:
+            item = await queue.get()
+            try:
+                await worker(item)
+                report.succeeded += 1
+            except Exception as e:
+                report.failed += 1
+                print(f"Error in {name} for {item!r:.80}: {e}")
+            finally:
+                queue.task_done()
+
+    consumers = [asyncio.create_task(consume()) for _ in range(concurrency)]
+    try:
+        async for item in items:
+            report.total += 1
+            await queue.put(item)
+        await queue.join()
+    finally:
+        for consumer in consumers:
+            consumer.cancel()
+        await asyncio.gather(*consumers, return_exceptions=True)
+
+    report.elapsed = time.monotonic() - started
+    return report
@@ -0,0 +1,134 @@
+import asyncio
+import time
+
+import config
+from metrics import metrics
+
+
+class GeminiUnavailable(Exception):
+    """Gemini در دسترس نیست (مدار باز، صف پر یا timeout)؛ باید از fallback استفاده شود"""
+
+
+class CircuitBreaker:
+    """قطع‌کننده مدار برای API کند یا خراب
+
+    بعد از failure_threshold خطا یا فراخوانی کندِ پشت سر هم باز می‌شود و
+    تا reset_timeout ثانیه همه درخواست‌ها را فوراً رد می‌کند. بعد از آن
+    یک درخواست آزمایشی (half-open) عبور می‌کند؛ موفقیتش مدار را می‌بندد
+    و شکستش دوباره بازش می‌کند.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=None, reset_timeout=None, slow_call_threshold=None):
+        self.failure_threshold = failure_threshold or config.GEMINI_BREAKER_FAILURES
+        self.reset_timeout = reset_timeout or config.GEMINI_BREAKER_RESET
+        self.slow_call_threshold = slow_call_threshold or config.GEMINI_SLOW_CALL
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self):
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def cancel_probe(self):
+        self._probing = False
+
+    def record_success(self, duration):
+        if duration >= self.slow_call_threshold:
+            self.record_failure()
+            return
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+
+class AsyncGeminiClient:
+    """لایه async روی مدل Gemini
+
+    تعداد فراخوانی‌های همزمان با یک semaphore محدود است، هر درخواست
+    timeout دارد و قطع‌کننده مدار جلوی انتظار پشت API کند را می‌گیرد.
+    در همه حالت‌های عدم دسترسی GeminiUnavailable پرتاب می‌شود.
+    اگر به جای model یک loader داده شود، مدل در اولین فراخوانی (یا
+    warm_up) در یک thread ساخته می‌شود تا import سنگین SDK شروع ربات را
+    کند نکند.
+    """
+
+    def __init__(self, model=None, concurrency=None, timeout=None, breaker=None, loader=None):
+        self._model = model
+        self.loader = loader
+        self.timeout = timeout or config.GEMINI_TIMEOUT
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = asyncio.Semaphore(concurrency or config.GEMINI_CONCURRENCY)
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = self.loader()
+        return self._model
+
+    async def warm_up(self):
+        """ساخت مدل در پس‌زمینه"""
+        if self._model is None:
+            await asyncio.to_thread(lambda: self.model)
+
+    async def _call(self, prompt):
+        await self.warm_up()
+        if hasattr(self.model, 'generate_content_async'):
+            return await self.model.generate_content_async(prompt)
+        return await asyncio.to_thread(self.model.generate_content, prompt)
+
+    async def generate(self, prompt):
+        """متن پاسخ مدل برای prompt"""
+        if not self.breaker.allow():
+            self.rejected += 1
+            metrics.inc('gemini_rejected_total', reason='circuit_open')
+            raise GeminiUnavailable("circuit open")
+
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            # صف پر است؛ این درخواست چیزی درباره سلامت API نمی‌گوید
+            self.breaker.cancel_probe()
+            self.rejected += 1
+            metrics.inc('gemini_rejected_total', reason='queue_full')
+            raise GeminiUnavailable("too many concurrent requests")
+
+        started = time.monotonic()
+        self.calls += 1
+        try:
+            response = await asyncio.wait_for(self._call(prompt), timeout=self.timeout)
+            text = response.text
+        except Exception as e:
+            self.failures += 1
+            self.breaker.record_failure()
+            metrics.observe('gemini_call_seconds', time.monotonic() - started, outcome='error')
+            raise GeminiUnavailable(f"{type(e).__name__}: {e}") from e
+        finally:
+            self._slots.release()
+
+        elapsed = time.monotonic() - started
+        self.breaker.record_success(elapsed)
+        metrics.observe('gemini_call_seconds', elapsed, outcome='ok')
+        return text
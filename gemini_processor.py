@@ -1,63 +1,70 @@
-import google.generativeai as genai
 import json
-import re
-from datetime import datetime, timedelta
+from datetime import datetime
 import config
+import persian_parser
+from parse_cache import ParseCache
+from gemini_client import AsyncGeminiClient
+from parse_batcher import ParseBatcher
 
-try:
-    import whisper
-    WHISPER_AVAILABLE = True
-except ImportError:
-    WHISPER_AVAILABLE = False
-    print("Whisper not available, voice processing disabled")
+def load_gemini_model():
+    """import و تنظیم SDK گوگل؛ کند است و فقط هنگام نیاز اجرا می‌شود"""
+    import google.generativeai as genai
+    
+    # تنظیم API Key برای Gemini
+    genai.configure(api_key=config.GEMINI_API_KEY)
+    
+    # تنظیم مدل Gemini
+    return genai.GenerativeModel('gemini-pro')
+
+def validate_task_data(task_data):
+    """اعتبارسنجی داده‌های یک تسک (خروجی Gemini، پارسر محلی یا فایل ورودی)"""
+    required_fields = ['task_title', 'task_type', 'scheduled_date', 'scheduled_time']
+    
+    for field in required_fields:
+        if field not in task_data or not task_data[field]:
+            return False
+    
+    # اعتبارسنجی تاریخ
+    try:
+        datetime.strptime(task_data['scheduled_date'], '%Y-%m-%d')
+        datetime.strptime(task_data['scheduled_time'], '%H:%M')
+    except:
+        return False
+        
+    return True
 
 class GeminiProcessor:
-    def __init__(self):
-        # تنظیم API Key برای Gemini
-        genai.configure(api_key=config.GEMINI_API_KEY)
-        
-        # تنظیم مدل Gemini
-        self.model = genai.GenerativeModel('gemini-pro')
-        
-        # مدل Whisper برای تبدیل صوت به متن (رایگان)
-        self.whisper_model = None
-        if WHISPER_AVAILABLE:
-            try:
-                self.whisper_model = whisper.load_model("base")
-            except Exception as e:
-                print(f"Error loading whisper model: {e}")
-                self.whisper_model = None
-    
-    def transcribe_audio(self, audio_path):
-        """تبدیل ویس به متن با Whisper"""
-        if not self.whisper_model:
-            return "پردازش ویس در حال حاضر غیرفعال است. لطفاً از متن استفاده کنید."
-        
-        try:
-            result = self.whisper_model.transcribe(audio_path, language="fa")
-            return result["text"]
-        except Exception as e:
-            print(f"Error in transcription: {e}")
-            return None
+    def __init__(self, model=None):
+        # فراخوانی async با محدودیت همزمانی، timeout و قطع‌کننده مدار
+        # مدل تا اولین درخواست یا warm_up ساخته نمی‌شود
+        self.client = AsyncGeminiClient(model, loader=load_gemini_model)
+        self.batcher = ParseBatcher(self.client, self.parse_prompt, self.batch_parse_prompt, self.validate_task_data)
+        
+        # کش نتیجه‌ها برای عبارت‌های تکراری
+        self.parse_cache = ParseCache()
+        self.local_hits = 0
     
-    def parse_schedule_request(self, text):
-        """پردازش متن و استخراج اطلاعات برنامه با Gemini"""
-        
-        prompt = f"""
+    @property
+    def model(self):
+        return self.client.model
+    
+    async def warm_up(self):
+        await self.client.warm_up()
+    
+    def _parse_rules(self):
+        return f"""
         شما یک دستیار برنامه‌ریزی هوشمند فارسی هستید. متن کاربر را تحلیل کرده و اطلاعات مربوط به برنامه‌ریزی را استخراج کنید.
         
         قوانین مهم:
         - اگر تاریخ ذکر نشده، امروز ({datetime.now().strftime('%Y-%m-%d')}) در نظر گرفته شود
-        - اگر زمان ذکر نشده، بر اساس上下文 زمان مناسب پیشنهاد دهید
+        - اگر زمان ذکر نشده، بر اساس متن زمان مناسب پیشنهاد دهید
         - نوع تسک را تشخیص دهید: lesson, work, sport, personal, exam
         - مدت زمان پیش‌فرض 60 دقیقه است مگر اینکه کاربر مشخص کند
         - یادآوری پیش‌فرض 15 دقیقه قبل است
-        
-        متن کاربر: "{text}"
-        
-        لطفاً خروجی را فقط و فقط به صورت JSON برگردانید بدون هیچ متن اضافی:
-        {{
-            "task_title": "عنوان تسک به فارسی",
+        """
+    
+    _TASK_SCHEMA = """{{
+            {index}"task_title": "عنوان تسک به فارسی",
             "task_type": "lesson/work/sport/personal/exam",
             "scheduled_date": "YYYY-MM-DD",
             "scheduled_time": "HH:MM",
@@ -65,134 +72,73 @@ class GeminiProcessor:
             "reminder_before": عدد به دقیقه,
             "notes": "توضیحات اضافی به فارسی",
             "confidence": میزان اطمینان از 0 تا 1
-        }}
+        }}"""
+    
+    def parse_prompt(self, text):
+        """prompt پردازش یک متن"""
+        return f"""{self._parse_rules()}
+        متن کاربر: "{text}"
+        
+        لطفاً خروجی را فقط و فقط به صورت JSON برگردانید بدون هیچ متن اضافی:
+        {self._TASK_SCHEMA.format(index='')}
         """
+    
+    def batch_parse_prompt(self, texts):
+        """prompt پردازش چند متن مستقل در یک درخواست"""
+        numbered = "\n".join(f'        {i}. "{text}"' for i, text in enumerate(texts))
+        return f"""{self._parse_rules()}
+        متن‌های زیر از کاربران مختلف هستند و هر کدام جداگانه تحلیل شوند:
+{numbered}
+        
+        لطفاً خروجی را فقط و فقط به صورت یک آرایه JSON با {len(texts)} عضو و به همان ترتیب برگردانید بدون هیچ متن اضافی.
+        هر عضو به این شکل است و index شماره متن است:
+        {self._TASK_SCHEMA.format(index='"index": شماره متن,' + chr(10) + '            ')}
+        """
+    
+    async def parse_schedule_request(self, text):
+        """پردازش متن و استخراج اطلاعات برنامه با Gemini"""
+        
+        cached = await self.parse_cache.get(text)
+        if cached:
+            return cached
+        
+        # عبارت‌های رایج بدون فراخوانی شبکه با قواعد محلی حل می‌شوند
+        local = persian_parser.parse(text)
+        if local['confidence'] >= config.LOCAL_PARSER_CONFIDENCE:
+            self.local_hits += 1
+            return local
         
         try:
-            response = self.model.generate_content(prompt)
-            result_text = response.text
-            
-            # تمیز کردن خروجی - حذف markdown blocks اگر وجود دارد
-            result_text = result_text.replace('```json', '').replace('```', '').strip()
-            
-            # پارس کردن JSON
-            task_data = json.loads(result_text)
-            
-            # اعتبارسنجی داده‌ها
-            if not self.validate_task_data(task_data):
-                return self.fallback_parsing(text)
-                
-            return task_data
-            
+            # درخواست‌های همزمان در یک prompt دسته‌ای ارسال می‌شوند
+            task_data = await self.batcher.parse(text)
         except Exception as e:
             print(f"Error in Gemini parsing: {e}")
             # Fallback به روش ساده‌تر
             return self.fallback_parsing(text)
+        
+        if task_data is None:
+            return self.fallback_parsing(text)
+        
+        await self.parse_cache.put(text, task_data)
+        return task_data
     
     def validate_task_data(self, task_data):
         """اعتبارسنجی داده‌های استخراج شده"""
-        required_fields = ['task_title', 'task_type', 'scheduled_date', 'scheduled_time']
-        
-        for field in required_fields:
-            if field not in task_data or not task_data[field]:
-                return False
-        
-        # اعتبارسنجی تاریخ
-        try:
-            datetime.strptime(task_data['scheduled_date'], '%Y-%m-%d')
-            datetime.strptime(task_data['scheduled_time'], '%H:%M')
-        except:
-            return False
-            
-        return True
+        return validate_task_data(task_data)
     
     def fallback_parsing(self, text):
-        """روش جایگزین برای زمانی که Gemini失败 می‌شود"""
-        # تشخیص نوع تسک
-        task_types = {
-            "درس": ["درس", "مدرسه", "کلاس", "امتحان", "تحصیل", "دانشگاه", "کالج"],
-            "کار": ["کار", "پروژه", "جلسه", "اداری", "شرکت", "دفتر", "کاری"],
-            "ورزش": ["ورزش", "باشگاه", "بدنسازی", "دویدن", "تمرین", " fitness", " gym"],
-            "امتحان": ["امتحان", "تست", "آزمون", "کوئیز", " آزمون"],
-            "شخصی": ["ملاقات", "دکتر", "استراحت", "ناهار", "شام", "صبحانه", "خواب"]
-        }
-        
-        detected_type = "personal"
-        for task_type, keywords in task_types.items():
-            if any(keyword in text for keyword in keywords):
-                detected_type = task_type
-                break
-        
-        # استخراج زمان
-        time_str = self.extract_time(text)
-        
-        # استخراج تاریخ
-        date_str = self.extract_date(text)
-        
-        return {
-            "task_title": self.extract_title(text),
-            "task_type": detected_type,
-            "scheduled_date": date_str,
-            "scheduled_time": time_str,
-            "duration": 60,
-            "reminder_before": 15,
-            "notes": "ثبت شده با پردازش متن",
-            "confidence": 0.7
-        }
+        """روش جایگزین برای زمانی که Gemini در دسترس نیست"""
+        return persian_parser.parse(text)
     
     def extract_time(self, text):
         """استخراج زمان از متن"""
-        patterns = [
-            r'ساعت\s*(\d+)[:]?(\d*)',
-            r'(\d+)[:]?(\d*)\s*بعدازظهر',
-            r'(\d+)[:]?(\d*)\s*عصر',
-            r'(\d+)[:]?(\d*)\s*صبح',
-            r'(\d+)[:]?(\d*)'
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text)
-            if match:
-                hour = int(match.group(1))
-                minute = match.group(2) if match.group(2) else "00"
-                
-                # تبدیل به فرمت 24 ساعته
-                if ("بعدازظهر" in text or "عصر" in text) and hour < 12:
-                    hour += 12
-                elif "صبح" in text and hour == 12:
-                    hour = 0
-                
-                return f"{hour:02d}:{minute}"
-        
-        return "10:00"  # زمان پیش‌فرض
+        return persian_parser.extract_time(text)
     
     def extract_date(self, text):
         """استخراج تاریخ از متن"""
-        today = datetime.now()
-        
-        if "فردا" in text:
-            date = today + timedelta(days=1)
-        elif "پس فردا" in text:
-            date = today + timedelta(days=2)
-        elif "هفته آینده" in text:
-            date = today + timedelta(days=7)
-        elif "هفته بعد" in text:
-            date = today + timedelta(days=7)
-        else:
-            date = today
-        
-        return date.strftime("%Y-%m-%d")
-    
-    def extract_title(self, text):
-        """استخراج عنوان از متن"""
-        # حذف کلمات اضافی
-        stop_words = ["می‌خواهم", "می‌خوام", "باید", "لطفا", "برای", "یک", "یه"]
-        words = text.split()
-        filtered_words = [word for word in words if word not in stop_words]
-        
-        return " ".join(filtered_words[:8])  # حداکثر 8 کلمه اول
-    
-    def generate_daily_summary(self, tasks, completed_tasks):
+        return persian_parser.extract_date(text)
+    
+    async def generate_daily_summary(self, tasks, completed_tasks):
         """تولید خلاصه روزانه با Gemini"""
         
         task_list = "\n".join([f"- {task.title} ({task.status})" for task in tasks])
@@ -209,8 +155,7 @@ class GeminiProcessor:
         """
         
         try:
-            response = self.model.generate_content(prompt)
-            return response.text
+            return await self.client.generate(prompt)
         except Exception as e:
             print(f"Error in summary generation: {e}")
             return "امروز روز خوبی بود! ادامه بده 💪"
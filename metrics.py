@@ -0,0 +1,233 @@
+"""شمارنده‌ها و هیستوگرام‌های زمان مسیرهای پرتکرار ربات
+
+همه ماژول‌ها در رجیستری سراسری metrics ثبت می‌کنند. MetricsExporter
+آن را روی یک endpoint محلی به فرمت متنی Prometheus (/metrics) و JSON
+(/metrics.json، شامل p50/p99 هر مرحله) منتشر می‌کند و در صورت تنظیم
+METRICS_DUMP_PATH به صورت دوره‌ای در یک فایل JSON هم می‌نویسد.
+"""
+import asyncio
+import bisect
+import json
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import config
+
+# مرزهای bucket بر حسب ثانیه
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram:
+    """هیستوگرام تجمعی به سبک Prometheus به‌علاوه نمونه‌های اخیر برای صدک‌ها"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, reservoir=1024):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=reservoir)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.recent.append(value)
+
+    def quantile(self, fraction):
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape_label_value(value):
+    """escape مقدار برچسب طبق فرمت متنی Prometheus (\\، " و خط جدید)"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape_label_value(value)}"' for key, value in pairs) + '}'
+
+
+class Metrics:
+    """رجیستری هیستوگرام، شمارنده و gauge با برچسب"""
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _label_key(labels))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge(self, name, callback, **labels):
+        """ثبت gauge که مقدارش هنگام خواندن از callback گرفته می‌شود (مثل عمق صف)"""
+        self._gauges[(name, _label_key(labels))] = callback
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def _gauge_values(self):
+        for (name, labels), callback in self._gauges.items():
+            try:
+                yield name, labels, float(callback())
+            except Exception:
+                continue
+
+    def snapshot(self):
+        """وضعیت فعلی همه متریک‌ها به صورت dict (زمان‌ها به میلی‌ثانیه)"""
+        return {
+            'timestamp': time.time(),
+            'histograms': [
+                {
+                    'name': name,
+                    'labels': dict(labels),
+                    'count': histogram.count,
+                    'mean_ms': round(histogram.sum / histogram.count * 1000, 3) if histogram.count else 0.0,
+                    'p50_ms': round(histogram.quantile(0.5) * 1000, 3),
+                    'p99_ms': round(histogram.quantile(0.99) * 1000, 3),
+                }
+                for (name, labels), histogram in sorted(self._histograms.items())
+            ],
+            'counters': [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(self._counters.items())
+            ],
+            'gauges': [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for name, labels, value in self._gauge_values()
+            ],
+        }
+
+    def prometheus(self):
+        """متریک‌ها در فرمت متنی Prometheus"""
+        lines = []
+        typed = set()
+
+        def declare(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), histogram in sorted(self._histograms.items()):
+            declare(name, 'histogram')
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram.count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+        for (name, labels), value in sorted(self._counters.items()):
+            declare(name, 'counter')
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        for name, labels, value in sorted(self._gauge_values()):
+            declare(name, 'gauge')
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+# رجیستری سراسری
+metrics = Metrics()
+
+
+class MetricsExporter:
+    """endpoint محلی HTTP برای متریک‌ها و ذخیره دوره‌ای JSON"""
+
+    def __init__(self, registry=None, host=None, port=None, dump_path=None, dump_interval=None):
+        self.registry = registry or metrics
+        self.host = host or config.METRICS_HOST
+        self.port = config.METRICS_PORT if port is None else port
+        self.dump_path = dump_path or config.METRICS_DUMP_PATH
+        self.dump_interval = dump_interval or config.METRICS_DUMP_INTERVAL
+        self._server = None
+        self._dumper = None
+
+    async def start(self):
+        if self.port and self._server is None:
+            try:
+                self._server = await asyncio.start_server(self._handle, self.host, self.port)
+                print(f"📈 Metrics on http://{self.host}:{self.port}/metrics")
+            except OSError as e:
+                # مثلاً پورت گرفته شده توسط worker دیگر؛ ربات بدون endpoint ادامه می‌دهد
+                print(f"Error starting metrics endpoint on {self.host}:{self.port}: {e}")
+        if self.dump_path and self._dumper is None:
+            self._dumper = asyncio.create_task(self._dump_loop())
+
+    async def stop(self):
+        if self._dumper is not None:
+            self._dumper.cancel()
+            self._dumper = None
+            await asyncio.to_thread(self.dump)
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def dump(self):
+        """نوشتن اتمیک snapshot در dump_path"""
+        temp_path = f"{self.dump_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.registry.snapshot(), f, ensure_ascii=False)
+        os.replace(temp_path, self.dump_path)
+
+    async def _dump_loop(self):
+        while True:
+            await asyncio.sleep(self.dump_interval)
+            try:
+                await asyncio.to_thread(self.dump)
+            except Exception as e:
+                print(f"Error dumping metrics: {e}")
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # هدرها خوانده و نادیده گرفته می‌شوند
+            while (await asyncio.wait_for(reader.readline(), timeout=5)).strip():
+                pass
+
+            parts = request_line.decode('latin-1').split()
+            path = parts[1].split('?')[0] if len(parts) > 1 else '/'
+            if path == '/metrics':
+                status, content_type = '200 OK', 'text/plain; version=0.0.4; charset=utf-8'
+                body = self.registry.prometheus().encode('utf-8')
+            elif path == '/metrics.json':
+                status, content_type = '200 OK', 'application/json; charset=utf-8'
+                body = json.dumps(self.registry.snapshot(), ensure_ascii=False).encode('utf-8')
+            else:
+                status, content_type, body = '404 Not Found', 'text/plain', b'not found\n'
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
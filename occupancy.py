@@ -0,0 +1,107 @@
+"""ایندکس بازه‌های زمانی اشغال شده هر کاربر
+
+برای هر کاربر یک لیست مرتب از بازه‌های [شروع، پایان) تسک‌ها (به epoch)
+نگه داشته می‌شود. چون طولانی‌ترین بازه هم ثبت می‌شود، هر پرسش فقط یک
+جستجوی دودویی و بررسی بازه‌های نزدیک است: O(log n + k).
+"""
+import bisect
+import time
+from collections import OrderedDict
+
+import config
+from database import db
+
+
+class IntervalList:
+    """لیست مرتب بازه‌ها (start, end, task) بر اساس start"""
+
+    def __init__(self, intervals=()):
+        self._items = sorted(intervals, key=lambda item: item[0])
+        self._starts = [item[0] for item in self._items]
+        self._max_length = max((end - start for start, end, _ in self._items), default=0)
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, start, end, task=None):
+        index = bisect.bisect_right(self._starts, start)
+        self._starts.insert(index, start)
+        self._items.insert(index, (start, end, task))
+        self._max_length = max(self._max_length, end - start)
+
+    def overlapping(self, start, end):
+        """بازه‌هایی که با [start, end) همپوشانی دارند"""
+        low = bisect.bisect_right(self._starts, start - self._max_length)
+        high = bisect.bisect_left(self._starts, end)
+        return [item for item in self._items[low:high] if item[1] > start]
+
+    def is_busy(self, at):
+        return bool(self.overlapping(at, at + 1))
+
+    def next_free_slot(self, after, duration):
+        """زودترین زمان >= after که بازه‌ای به طول duration در آن آزاد است"""
+        candidate = after
+        low = bisect.bisect_right(self._starts, after - self._max_length)
+        for start, end, _ in self._items[low:]:
+            if start >= candidate + duration:
+                break
+            if end > candidate:
+                candidate = end
+        return candidate
+
+
+class OccupancyIndex:
+    """بازه‌های اشغال شده کاربران با بارگذاری تنبل از دیتابیس
+
+    برای هر کاربر پنجره‌ای از یک روز قبل تا horizon روز بعد از لحظه پرسش
+    بارگذاری و در یک LRU نگه داشته می‌شود. هر نوشتن روی تسک‌های کاربر
+    (از طریق listener دیتابیس) پنجره او را دور می‌ریزد تا پرسش بعدی
+    وضعیت تازه را ببیند.
+    """
+
+    def __init__(self, horizon_days=None, max_users=None):
+        self.horizon = (horizon_days or config.OCCUPANCY_HORIZON_DAYS) * 86400
+        self.max_users = max_users or config.OCCUPANCY_MAX_USERS
+        self._users = OrderedDict()
+        self.loads = 0
+        db.add_task_listener(self.invalidate)
+
+    def invalidate(self, user_id, date=None):
+        self._users.pop(user_id, None)
+
+    async def _intervals(self, user_id, start, end):
+        entry = self._users.get(user_id)
+        if entry is not None and entry[1] <= start and end <= entry[2]:
+            self._users.move_to_end(user_id)
+            return entry[0]
+
+        window_start = min(start, time.time()) - 86400
+        window_end = max(end, start + self.horizon)
+        tasks = await db.get_tasks_between(user_id, window_start - config.MAX_TASK_DURATION * 60, window_end)
+        intervals = IntervalList(
+            (task.scheduled_at, task.scheduled_at + (task.duration or 60) * 60, task) for task in tasks
+        )
+        self.loads += 1
+
+        self._users[user_id] = (intervals, window_start, window_end)
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+        return intervals
+
+    async def overlapping(self, user_id, start, end):
+        """تسک‌هایی که با بازه [start, end) تداخل دارند"""
+        intervals = await self._intervals(user_id, start, end)
+        return [task for _, _, task in intervals.overlapping(start, end)]
+
+    async def is_busy(self, user_id, at):
+        return (await self._intervals(user_id, at, at + 1)).is_busy(at)
+
+    async def next_free_slot(self, user_id, after, duration):
+        """زودترین زمان آزاد به طول duration ثانیه از لحظه after (در پنجره بارگذاری شده)"""
+        intervals = await self._intervals(user_id, after, after + duration)
+        return intervals.next_free_slot(after, duration)
+
+
+# ایندکس سراسری
+occupancy = OccupancyIndex()
@@ -0,0 +1,277 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+from telegram.error import RetryAfter
+
+import config
+from metrics import metrics
+
+# اولویت‌ها؛ عدد کمتر زودتر ارسال می‌شود
+INTERACTIVE = 0
+NOTIFICATION = 1
+BULK = 2
+
+
+class TokenBucket:
+    """سطل توکن ساده برای محدود کردن نرخ"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        """چند ثانیه تا آزاد شدن یک توکن باید صبر کرد"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _Outgoing:
+    __slots__ = ('priority', 'seq', 'method', 'chat_id', 'kwargs', 'future', 'attempts', 'created_at', 'offsets')
+
+    def __init__(self, priority, seq, method, chat_id, kwargs, future):
+        self.priority = priority
+        self.seq = seq
+        self.method = method
+        self.chat_id = chat_id
+        self.kwargs = kwargs
+        self.future = future
+        self.attempts = 0
+        self.created_at = time.monotonic()
+        # موقعیت فایل‌های ارسالی (photo، document)؛ هر تلاش از همین نقطه می‌خواند
+        self.offsets = {
+            name: value.tell() for name, value in kwargs.items()
+            if hasattr(value, 'seek') and hasattr(value, 'tell') and getattr(value, 'seekable', lambda: True)()
+        }
+
+    def rewind(self):
+        for name, offset in self.offsets.items():
+            self.kwargs[name].seek(offset)
+
+    @property
+    def key(self):
+        return (self.priority, self.seq)
+
+    def __lt__(self, other):
+        return self.key < other.key
+
+
+class Outbox:
+    """صف مرکزی ارسال پیام به تلگرام
+
+    همه send_message/send_photo ها از اینجا عبور می‌کنند تا:
+    - نرخ کلی (حدود 30 پیام در ثانیه) و نرخ هر چت رعایت شود
+    - خطای RetryAfter باعث توقف موقت کل صف و ارسال مجدد شود
+    - پاسخ‌های تعاملی قبل از اعلان‌های گروهی ارسال شوند
+
+    ترتیب پیام‌های هم‌اولویت در یک چت حفظ می‌شود.
+    """
+
+    def __init__(self, bot, rate=None, per_chat_rate=None, per_chat_burst=None,
+                 max_inflight=None, max_retries=5):
+        self.bot = bot
+        self.max_retries = max_retries
+        # ظرفیت 1 یعنی پخش یکنواخت؛ هیچ پنجره یک ثانیه‌ای بیش از rate پیام ندارد
+        self._global = TokenBucket(rate or config.OUTBOX_RATE, 1)
+        self._per_chat_rate = per_chat_rate or config.OUTBOX_PER_CHAT_RATE
+        self._per_chat_burst = per_chat_burst or config.OUTBOX_PER_CHAT_BURST
+        self._inflight = asyncio.Semaphore(max_inflight or config.OUTBOX_MAX_INFLIGHT)
+        self._seq = itertools.count()
+
+        # صف هر چت (heap بر اساس اولویت و ترتیب ورود) و سطل نرخ آن
+        self._chats = {}
+        self._chat_buckets = {}
+        # چت‌هایی که سر صفشان آماده ارسال است: (priority, seq, chat_id)
+        self._ready = []
+        # چت‌هایی که منتظر توکن نرخ خودشان هستند: (ready_at, chat_id)
+        self._waiting = []
+        self._scheduled = set()
+
+        self._paused_until = 0.0
+        self._wakeup = asyncio.Event()
+        self._runner = None
+        self._sending = set()
+        self.pending = 0
+        self.sent = 0
+        self.failed = 0
+        metrics.gauge('outbox_pending', lambda: self.pending)
+
+    def start(self):
+        if self._runner is None:
+            self._runner = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self, drain_timeout=10):
+        """توقف صف پس از تخلیه پیام‌های باقی‌مانده (حداکثر drain_timeout ثانیه)"""
+        if self._runner is None:
+            return
+        deadline = time.monotonic() + drain_timeout
+        while (self.pending or self._sending) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        self._runner.cancel()
+        try:
+            await self._runner
+        except asyncio.CancelledError:
+            pass
+        self._runner = None
+
+    def submit(self, method, chat_id, priority=INTERACTIVE, **kwargs):
+        """قرار دادن یک درخواست در صف؛ future نتیجه متد Bot را برمی‌گرداند"""
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(_Outgoing(priority, next(self._seq), method, chat_id, kwargs, future))
+        return future
+
+    async def send_message(self, chat_id, text, priority=INTERACTIVE, **kwargs):
+        return await self.submit('send_message', chat_id, priority, text=text, **kwargs)
+
+    async def send_photo(self, chat_id, photo, priority=INTERACTIVE, **kwargs):
+        return await self.submit('send_photo', chat_id, priority, photo=photo, **kwargs)
+
+    async def send_document(self, chat_id, document, priority=INTERACTIVE, **kwargs):
+        return await self.submit('send_document', chat_id, priority, document=document, **kwargs)
+
+    def _enqueue(self, item):
+        self.pending += 1
+        heapq.heappush(self._chats.setdefault(item.chat_id, []), item)
+        self._schedule_chat(item.chat_id, time.monotonic())
+        self._wakeup.set()
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self._per_chat_rate, self._per_chat_burst)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _schedule_chat(self, chat_id, now):
+        """قرار دادن سر صف یک چت در ready یا waiting"""
+        queue = self._chats.get(chat_id)
+        if not queue:
+            return
+        head = queue[0]
+        wait = self._chat_bucket(chat_id).wait_time(now)
+        if wait > 0:
+            if chat_id not in self._scheduled:
+                self._scheduled.add(chat_id)
+                heapq.heappush(self._waiting, (now + wait, chat_id))
+        else:
+            # ورودی‌های کهنه هنگام برداشتن نادیده گرفته می‌شوند
+            heapq.heappush(self._ready, (head.priority, head.seq, chat_id))
+
+    def _promote_waiting(self, now):
+        while self._waiting and self._waiting[0][0] <= now:
+            _, chat_id = heapq.heappop(self._waiting)
+            self._scheduled.discard(chat_id)
+            self._schedule_chat(chat_id, now)
+
+    def _pop_ready(self):
+        while self._ready:
+            priority, seq, chat_id = heapq.heappop(self._ready)
+            queue = self._chats.get(chat_id)
+            if queue and queue[0].key == (priority, seq):
+                item = heapq.heappop(queue)
+                if not queue:
+                    del self._chats[chat_id]
+                return item
+        return None
+
+    def _next_delay(self, now):
+        delays = []
+        if self._waiting:
+            delays.append(self._waiting[0][0] - now)
+        if self._paused_until > now:
+            delays.append(self._paused_until - now)
+        return max(0.0, min(delays)) if delays else None
+
+    async def _sleep(self, timeout):
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            self._promote_waiting(now)
+
+            if self._paused_until > now or not self._ready:
+                await self._sleep(self._next_delay(now))
+                continue
+
+            wait = self._global.wait_time(now)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+
+            item = self._pop_ready()
+            if item is None:
+                continue
+
+            self._global.take(now)
+            self._chat_bucket(item.chat_id).take(now)
+            self._schedule_chat(item.chat_id, now)
+            self._prune_buckets(now)
+
+            await self._inflight.acquire()
+            sending = asyncio.create_task(self._send(item))
+            self._sending.add(sending)
+            sending.add_done_callback(self._sending.discard)
+
+    def _prune_buckets(self, now, limit=10000):
+        if len(self._chat_buckets) > limit:
+            for chat_id in [c for c, b in self._chat_buckets.items()
+                            if c not in self._chats and b.is_full(now)]:
+                del self._chat_buckets[chat_id]
+
+    async def _send(self, item):
+        started = time.monotonic()
+        if not item.attempts:
+            metrics.observe('outbox_queue_wait_seconds', started - item.created_at, priority=item.priority)
+        outcome = 'ok'
+        try:
+            item.attempts += 1
+            item.rewind()
+            result = await getattr(self.bot, item.method)(chat_id=item.chat_id, **item.kwargs)
+        except RetryAfter as e:
+            outcome = 'retry_after'
+            retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            self.pending -= 1
+            if item.attempts <= self.max_retries:
+                # با همان اولویت و ترتیب به صف برمی‌گردد
+                self._enqueue(item)
+            else:
+                self.failed += 1
+                if not item.future.done():
+                    item.future.set_exception(e)
+        except Exception as e:
+            outcome = 'error'
+            self.pending -= 1
+            self.failed += 1
+            if not item.future.done():
+                item.future.set_exception(e)
+        else:
+            self.pending -= 1
+            self.sent += 1
+            if not item.future.done():
+                item.future.set_result(result)
+        finally:
+            self._inflight.release()
+            metrics.observe('telegram_send_seconds', time.monotonic() - started, method=item.method, outcome=outcome)
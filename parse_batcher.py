@@ -0,0 +1,133 @@
+import asyncio
+import json
+
+import config
+from gemini_client import GeminiUnavailable
+
+
+def _load_json(text):
+    # حذف markdown blocks اگر وجود دارد
+    return json.loads(text.replace('```json', '').replace('```', '').strip())
+
+
+class ParseBatcher:
+    """جمع کردن درخواست‌های همزمان پردازش متن در یک prompt
+
+    درخواست‌هایی که در فاصله window ثانیه می‌رسند (حداکثر max_batch تا)
+    با یک فراخوانی Gemini پردازش می‌شوند و خروجی یک آرایه JSON است.
+    اگر پاسخ دسته‌ای قابل تفکیک نباشد هر درخواست جداگانه ارسال می‌شود.
+    parse برای نتیجه نامعتبر None برمی‌گرداند و در نبود Gemini
+    GeminiUnavailable پرتاب می‌کند.
+    """
+
+    def __init__(self, client, single_prompt, batch_prompt, validate, window=None, max_batch=None):
+        self.client = client
+        self.single_prompt = single_prompt
+        self.batch_prompt = batch_prompt
+        self.validate = validate
+        self.window = config.GEMINI_BATCH_WINDOW if window is None else window
+        self.max_batch = max_batch or config.GEMINI_BATCH_MAX
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+        self.batches = 0
+        self.batched_requests = 0
+        self.single_calls = 0
+        self.split_batches = 0
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'batched_requests': self.batched_requests,
+            'single_calls': self.single_calls,
+            'split_batches': self.split_batches,
+            'pending': len(self._pending),
+        }
+
+    async def parse(self, text):
+        if self.window <= 0 or self.max_batch <= 1:
+            return await self._single(text)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _single(self, text):
+        self.single_calls += 1
+        task_data = _load_json(await self.client.generate(self.single_prompt(text)))
+        if isinstance(task_data, dict) and self.validate(task_data):
+            return task_data
+        return None
+
+    async def _resolve(self, future, text):
+        """ارسال جداگانه یک درخواست و تحویل نتیجه به future آن"""
+        try:
+            result = await self._single(text)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(result)
+
+    async def _run(self, batch):
+        if len(batch) == 1:
+            await self._resolve(batch[0][1], batch[0][0])
+            return
+
+        texts = [text for text, _ in batch]
+        self.batches += 1
+        self.batched_requests += len(batch)
+        try:
+            results = self._split(_load_json(await self.client.generate(self.batch_prompt(texts))), len(batch))
+        except GeminiUnavailable as e:
+            # مدار باز یا API خراب است؛ تلاش جداگانه فقط بار را بیشتر می‌کند
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        except (ValueError, TypeError) as e:
+            print(f"Error in batch parsing, retrying individually: {e}")
+            self.split_batches += 1
+            results = [None] * len(batch)
+
+        retries = []
+        for (text, future), task_data in zip(batch, results):
+            if task_data is not None and self.validate(task_data):
+                if not future.done():
+                    future.set_result(task_data)
+            else:
+                retries.append(self._resolve(future, text))
+        if retries:
+            await asyncio.gather(*retries)
+
+    @staticmethod
+    def _split(results, size):
+        """مرتب کردن آرایه پاسخ بر اساس index هر مورد"""
+        if not isinstance(results, list):
+            raise ValueError("batch response is not a JSON array")
+
+        ordered = [None] * size
+        for position, item in enumerate(results):
+            if not isinstance(item, dict):
+                continue
+            index = item.pop('index', position)
+            if isinstance(index, int) and 0 <= index < size and ordered[index] is None:
+                ordered[index] = item
+        return ordered
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import config
+import database as db
+from persian_parser import find_weekday, next_weekday, normalize, prepare
+
+_ABSOLUTE_DATE = re.compile(
+    r'\d{1,4}\s*[/\-.]\s*\d{1,2}'
+    r'|\b(فروردین|اردیبهشت|خرداد|تیر|مرداد|شهریور|مهر|آبان|آذر|دی ماه|بهمن|اسفند)\b'
+)
+# زمان نسبی به لحظه فعلی ("دو ساعت دیگه") قابل کش نیست
+_RELATIVE_TIME = re.compile(r'(ساعت|دقیقه)\s*(دیگه|دیگر|بعد)|الان|همین حالا')
+
+
+class ParseCache:
+    """کش نتیجه پردازش متن‌های برنامه‌ریزی
+
+    کلید، متن نرمال‌شده است. تاریخ نتیجه نسبت به روز درخواست ذخیره می‌شود
+    تا عبارت‌هایی مثل «فردا» یا «شنبه» در روزهای بعد هم درست حل شوند.
+    یک LRU در حافظه جلوی جدول parse_cache در SQLite قرار دارد.
+    """
+
+    def __init__(self, max_items=None, ttl=None):
+        self.max_items = max_items or config.PARSE_CACHE_MEMORY_ITEMS
+        self.ttl = ttl or config.PARSE_CACHE_TTL
+        self._memory = OrderedDict()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self._puts = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return (self.memory_hits + self.db_hits) / lookups if lookups else 0.0
+
+    def stats(self):
+        return {
+            'memory_hits': self.memory_hits,
+            'db_hits': self.db_hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hit_rate, 3),
+            'memory_items': len(self._memory),
+        }
+
+    @staticmethod
+    def key(normalized):
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _anchor(normalized, task_date, today):
+        """نحوه ذخیره تاریخ نسبت به روز درخواست"""
+        if _ABSOLUTE_DATE.search(normalized):
+            return 'absolute', task_date.isoformat()
+        weekday = find_weekday(prepare(normalized))
+        if weekday is not None:
+            first = next_weekday(today, weekday)
+            return 'weekday', [weekday, (task_date - first).days]
+        return 'offset', (task_date - today).days
+
+    @staticmethod
+    def _resolve(anchor, value, today):
+        if anchor == 'absolute':
+            return value
+        if anchor == 'weekday':
+            weekday, extra_days = value
+            return (next_weekday(today, weekday) + timedelta(days=extra_days)).isoformat()
+        return (today + timedelta(days=value)).isoformat()
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    async def get(self, text, today=None):
+        """نتیجه کش شده با تاریخ حل‌شده برای امروز، یا None"""
+        today = today or datetime.now().date()
+        key = self.key(normalize(text))
+        now = time.time()
+
+        entry = self._memory.get(key)
+        if entry is not None and now - entry['created_at'] <= self.ttl:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+        else:
+            self._memory.pop(key, None)
+            payload = await db.db.get_parse_cache(key, now - self.ttl)
+            if payload is None:
+                self.misses += 1
+                return None
+            entry = json.loads(payload)
+            self._remember(key, entry)
+            self.db_hits += 1
+
+        task_data = dict(entry['data'])
+        task_data['scheduled_date'] = self._resolve(entry['anchor'], entry['value'], today)
+        return task_data
+
+    async def put(self, text, task_data, today=None):
+        today = today or datetime.now().date()
+        normalized = normalize(text)
+        if _RELATIVE_TIME.search(normalized):
+            return
+
+        try:
+            task_date = datetime.strptime(task_data['scheduled_date'], '%Y-%m-%d').date()
+        except (KeyError, TypeError, ValueError):
+            return
+
+        anchor, value = self._anchor(normalized, task_date, today)
+        data = {k: v for k, v in task_data.items() if k != 'scheduled_date'}
+        entry = {'data': data, 'anchor': anchor, 'value': value, 'created_at': time.time()}
+
+        key = self.key(normalized)
+        self._remember(key, entry)
+        await db.db.put_parse_cache(key, json.dumps(entry, ensure_ascii=False), int(entry['created_at']))
+
+        self._puts += 1
+        if self._puts % 1000 == 0:
+            await db.db.prune_parse_cache(time.time() - self.ttl, config.PARSE_CACHE_MAX_ROWS)
@@ -0,0 +1,429 @@
+"""پارسر قاعده‌محور و سریع برای درخواست‌های برنامه‌ریزی فارسی
+
+حالت‌های رایج («فردا ساعت ۱۰ جلسه»، «هر روز ساعت ۱۸ باشگاه»،
+«پس فردا ساعت ده و نیم صبح امتحان فیزیک») را بدون LLM و در کسری از
+میلی‌ثانیه پارس می‌کند و یک امتیاز اطمینان برمی‌گرداند تا فقط موارد
+مبهم به Gemini فرستاده شوند. همه الگوها یک بار کامپایل می‌شوند.
+"""
+import re
+from datetime import date as date_type, datetime, timedelta
+
+# یکسان‌سازی ارقام فارسی/عربی و حروف عربی
+_TRANSLATION = str.maketrans({
+    **{chr(0x06F0 + i): str(i) for i in range(10)},
+    **{chr(0x0660 + i): str(i) for i in range(10)},
+    'ي': 'ی',
+    'ك': 'ک',
+    'ة': 'ه',
+    '\u200c': ' ',  # نیم‌فاصله
+    '\u200f': '',
+    '\u200e': '',
+    '،': ' ',
+})
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize(text):
+    """متن با ارقام لاتین، حروف فارسی یکسان و فاصله‌های یکدست"""
+    return _WHITESPACE.sub(' ', text.translate(_TRANSLATION)).strip().lower()
+
+
+WEEKDAYS = {
+    # weekday() پایتون: دوشنبه = 0
+    'شنبه': 5,
+    'یکشنبه': 6,
+    'دوشنبه': 0,
+    'سهشنبه': 1,
+    'چهارشنبه': 2,
+    'پنجشنبه': 3,
+    'جمعه': 4,
+}
+# روزهای کاری ایران: شنبه تا چهارشنبه
+WORK_WEEKDAYS = [5, 6, 0, 1, 2]
+
+# عبارت‌های چندکلمه‌ای که قبل از پارس به یک توکن تبدیل می‌شوند
+_JOIN = [
+    (re.compile(r'\b(یک|دو|سه|چهار|پنج) ?شنبه\b'), r'\1شنبه'),
+    (re.compile(r'\bپس ?فردا\b'), 'پسفردا'),
+    (re.compile(r'\bبعد ?از ?ظهر\b'), 'بعدازظهر'),
+    (re.compile(r'\bنیمه ?شب\b'), 'نیمهشب'),
+]
+
+_UNITS = {
+    'یک': 1, 'یه': 1, 'دو': 2, 'سه': 3, 'چهار': 4, 'پنج': 5, 'شش': 6, 'شیش': 6,
+    'هفت': 7, 'هشت': 8, 'نه': 9, 'ده': 10, 'یازده': 11, 'دوازده': 12,
+    'سیزده': 13, 'چهارده': 14, 'پانزده': 15, 'پونزده': 15, 'شانزده': 16,
+    'شونزده': 16, 'هفده': 17, 'هیفده': 17, 'هجده': 18, 'هیجده': 18, 'نوزده': 19,
+}
+_TENS = {'بیست': 20, 'سی': 30, 'چهل': 40, 'پنجاه': 50}
+_COMPOUND_NUMBER = re.compile(
+    r'\b(' + '|'.join(_TENS) + r') و (' + '|'.join(k for k, v in _UNITS.items() if v < 10) + r')\b'
+)
+_SINGLE_NUMBER = re.compile(
+    r'\b(' + '|'.join(sorted(list(_UNITS) + list(_TENS), key=len, reverse=True)) + r')\b'
+)
+
+_PERIODS = r'(صبح|ظهر|بعدازظهر|عصر|شب|نیمهشب)'
+_TIME_PATTERNS = [
+    # ساعت 10، ساعت 10:30، ساعت 10 و نیم، ساعت 10 و 20 دقیقه، ساعت 10 صبح
+    re.compile(
+        r'ساعت ?(\d{1,2})(?:[:.](\d{1,2}))?(?: و (نیم|ربع|(\d{1,2}) ?دقیقه))?(?: ?' + _PERIODS + r')?'
+    ),
+    # 10:30 یا 10:30 عصر
+    re.compile(r'\b(\d{1,2}):(\d{2})\b()()(?: ?' + _PERIODS + r')?'),
+    # 10 صبح، 5 و نیم عصر
+    re.compile(r'\b(\d{1,2})()(?: و (نیم|ربع))?() ?' + _PERIODS),
+]
+_PERIOD_ONLY = re.compile(r'\b' + _PERIODS + r'\b')
+
+_RECURRENCE_DAILY = re.compile(r'\bهر ?روز(?! کاری)\b|\bروزانه\b')
+_RECURRENCE_WORKDAYS = re.compile(r'\b(?:هر )?روزهای کاری\b|\bهر روز کاری\b')
+_WEEKDAY_NAMES = '|'.join(sorted(WEEKDAYS, key=len, reverse=True))
+# «هر شنبه و سه شنبه» یا «هر شنبه، دوشنبه و چهارشنبه»
+_RECURRENCE_WEEKLY = re.compile(r'\bهر ((?:' + _WEEKDAY_NAMES + r')(?: (?:و )?(?:' + _WEEKDAY_NAMES + r'))*)\b')
+_WEEKDAY_IN_LIST = re.compile(_WEEKDAY_NAMES)
+
+_RELATIVE_DAYS = [
+    (re.compile(r'\bپسفردا\b'), 2),
+    (re.compile(r'\bفردا\b'), 1),
+    (re.compile(r'\bامروز\b|\bامشب\b'), 0),
+    (re.compile(r'\bهفته (?:بعد|آینده|دیگه|دیگر)\b'), 7),
+]
+_DAYS_LATER = re.compile(r'\b(\d{1,2}) ?روز (?:دیگه|دیگر|بعد)\b')
+_WEEKDAY = re.compile(r'\b(' + _WEEKDAY_NAMES + r')\b')
+_NUMERIC_DATE = re.compile(r'\b(\d{4})[/\-.](\d{1,2})[/\-.](\d{1,2})\b')
+_JALALI_MONTHS = {
+    'فروردین': 1, 'اردیبهشت': 2, 'خرداد': 3, 'تیر': 4, 'مرداد': 5, 'شهریور': 6,
+    'مهر': 7, 'آبان': 8, 'آذر': 9, 'دی': 10, 'بهمن': 11, 'اسفند': 12,
+}
+_MONTH_DATE = re.compile(r'\b(\d{1,2}) ?(' + '|'.join(_JALALI_MONTHS) + r')\b(?: ?ماه)?')
+
+_DURATION = re.compile(
+    r'(?:به مدت |مدت )?\b(\d{1,3}|نیم) ?(ساعت|دقیقه)(?: و (نیم|ربع))?(?! ?(?:قبل|زودتر|دیگه|دیگر|بعد))'
+)
+_REMINDER = re.compile(r'\b(\d{1,3}) ?(دقیقه|ساعت) ?(?:قبل|زودتر)(?: ?(?:یادم بنداز|یادآوری|خبرم کن))?')
+
+# سقف اطمینان وقتی ساعت بدون صبح/عصر حدس زده شده
+AMBIGUOUS_CONFIDENCE = 0.5
+
+TASK_TYPE_KEYWORDS = [
+    ('exam', ['امتحان', 'آزمون', 'کوئیز', 'تست', 'میانترم', 'پایانترم']),
+    ('lesson', ['درس', 'کلاس', 'مدرسه', 'دانشگاه', 'تحصیل', 'مطالعه', 'تمرین درسی', 'کنکور']),
+    ('sport', ['ورزش', 'باشگاه', 'بدنسازی', 'دویدن', 'پیاده روی', 'شنا', 'فوتبال', 'یوگا', 'gym', 'fitness']),
+    ('work', ['کار', 'جلسه', 'پروژه', 'اداری', 'شرکت', 'دفتر', 'کاری', 'مشتری', 'ارائه']),
+    ('personal', ['دکتر', 'ملاقات', 'مهمانی', 'خرید', 'ناهار', 'شام', 'صبحانه', 'استراحت', 'خواب', 'تولد']),
+]
+# کلمه کامل، با پسوند چسبیده «ها/های/م» («کلاسم»)؛ «درست»، «شامل» و «کارت» نوع تسک نیستند
+_TASK_TYPE_PATTERNS = [
+    (task_type, re.compile(r'\b(?:' + '|'.join(keywords) + r')(?:ها|های|م)?(?![\w\u200c])'))
+    for task_type, keywords in TASK_TYPE_KEYWORDS
+]
+
+_STOP_WORDS = {
+    'می خواهم', 'می خوام', 'میخوام', 'باید', 'لطفا', 'لطفاً', 'برای', 'یک', 'یه', 'من',
+    'دارم', 'داریم', 'برم', 'بروم', 'برو', 'هست', 'است', 'رو', 'را', 'به', 'در', 'تا',
+    'و', 'با', 'که', 'ساعت', 'یادم', 'بنداز', 'یادآوری', 'کن', 'کنم', 'مدت',
+}
+
+
+def next_weekday(today, weekday):
+    """نزدیک‌ترین روز با weekday داده شده از امروز (خود امروز هم حساب می‌شود)"""
+    return today + timedelta(days=(weekday - today.weekday()) % 7)
+
+
+def find_weekday(prepared):
+    """weekday اولین نام روز هفته در متن آماده‌شده، یا None"""
+    match = _WEEKDAY.search(prepared)
+    return WEEKDAYS[match.group(1)] if match else None
+
+
+def jalali_to_gregorian(jy, jm, jd):
+    jy += 1595
+    days = -355668 + 365 * jy + (jy // 33) * 8 + ((jy % 33) + 3) // 4 + jd
+    days += (jm - 1) * 31 if jm < 7 else (jm - 7) * 30 + 186
+    gy = 400 * (days // 146097)
+    days %= 146097
+    if days > 36524:
+        days -= 1
+        gy += 100 * (days // 36524)
+        days %= 36524
+        if days >= 365:
+            days += 1
+    gy += 4 * (days // 1461)
+    days %= 1461
+    if days > 365:
+        gy += (days - 1) // 365
+        days = (days - 1) % 365
+    leap = (gy % 4 == 0 and gy % 100 != 0) or gy % 400 == 0
+    month_days = [31, 29 if leap else 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+    gd = days + 1
+    gm = 0
+    while gd > month_days[gm]:
+        gd -= month_days[gm]
+        gm += 1
+    return date_type(gy, gm + 1, gd)
+
+
+def prepare(text):
+    """نرمال‌سازی و تبدیل عددهای حروفی و عبارت‌های چندکلمه‌ای به توکن"""
+    text = normalize(text)
+    for pattern, replacement in _JOIN:
+        text = pattern.sub(replacement, text)
+    text = _COMPOUND_NUMBER.sub(lambda m: str(_TENS[m.group(1)] + _UNITS[m.group(2)]), text)
+    return _SINGLE_NUMBER.sub(lambda m: str(_UNITS.get(m.group(1)) or _TENS[m.group(1)]), text)
+
+
+def _to_24h(hour, period):
+    if period in ('بعدازظهر', 'عصر') and hour < 12:
+        return hour + 12
+    if period == 'شب':
+        if hour == 12:
+            return 0
+        if 5 <= hour < 12:
+            return hour + 12
+    if period == 'نیمهشب' and hour == 12:
+        return 0
+    if period == 'ظهر' and hour < 6:
+        return hour + 12
+    if period == 'صبح' and hour == 12:
+        return 0
+    return hour
+
+
+class ParseResult:
+    def __init__(self, text):
+        self.text = text
+        self.spans = []
+        self.time = None
+        self.time_ambiguous = False
+        # «ساعت ۲۴» یا «۱۲ شب»: نیمه‌شبِ پایان روز، یعنی 00:00 روز بعد
+        self.end_of_day = False
+        self.date = None
+        self.date_explicit = False
+        # تاریخ از نام روز هفته آمده («شنبه»)، نه از تاریخ عددی یا نسبی
+        self.date_from_weekday = False
+        self.recurrence = None
+        self.duration = None
+        self.reminder_before = None
+        self.task_type = None
+
+    def consume(self, match):
+        self.spans.append(match.span())
+
+
+def _parse_time(text, result):
+    for pattern in _TIME_PATTERNS:
+        match = pattern.search(text)
+        if not match:
+            continue
+        hour = int(match.group(1))
+        minute = int(match.group(2)) if match.group(2) else 0
+        fraction = match.group(3)
+        if fraction == 'نیم':
+            minute = 30
+        elif fraction == 'ربع':
+            minute = 15
+        elif match.group(4):
+            minute = int(match.group(4))
+        period = match.group(5)
+        if not period:
+            other = _PERIOD_ONLY.search(text)
+            period = other.group(1) if other else None
+        if hour > 24 or minute > 59:
+            continue
+
+        result.end_of_day = hour == 24 or (hour == 12 and period in ('شب', 'نیمهشب'))
+        hour = _to_24h(hour, period) % 24
+        if not period and 1 <= hour <= 6:
+            # «ساعت ۵ باشگاه» بدون صبح/عصر احتمالاً بعدازظهر است، ولی مطمئن نیستیم
+            hour += 12
+            result.time_ambiguous = True
+        result.time = f"{hour:02d}:{minute:02d}"
+        result.consume(match)
+        return
+
+
+def _parse_date(text, result, today):
+    match = _NUMERIC_DATE.search(text)
+    if match:
+        year, month, day = (int(g) for g in match.groups())
+        try:
+            result.date = (
+                jalali_to_gregorian(year, month, day) if year < 1700 else date_type(year, month, day)
+            )
+            result.date_explicit = True
+            result.consume(match)
+            return
+        except (ValueError, IndexError):
+            pass
+
+    match = _MONTH_DATE.search(text)
+    if match:
+        day, month = int(match.group(1)), _JALALI_MONTHS[match.group(2)]
+        jalali_year = today.year - 621 if (today.month, today.day) >= (3, 21) else today.year - 622
+        try:
+            resolved = jalali_to_gregorian(jalali_year, month, day)
+            if resolved < today:
+                resolved = jalali_to_gregorian(jalali_year + 1, month, day)
+            result.date = resolved
+            result.date_explicit = True
+            result.consume(match)
+            return
+        except (ValueError, IndexError):
+            pass
+
+    match = _DAYS_LATER.search(text)
+    if match:
+        result.date = today + timedelta(days=int(match.group(1)))
+        result.date_explicit = True
+        result.consume(match)
+        return
+
+    for pattern, days in _RELATIVE_DAYS:
+        match = pattern.search(text)
+        if match:
+            result.date = today + timedelta(days=days)
+            result.date_explicit = True
+            result.consume(match)
+            return
+
+    match = _WEEKDAY.search(text)
+    if match:
+        result.date = next_weekday(today, WEEKDAYS[match.group(1)])
+        result.date_explicit = True
+        result.date_from_weekday = True
+        result.consume(match)
+        return
+
+    result.date = today
+
+
+def _resolve_end_of_day(result):
+    """انتقال نیمه‌شبِ پایان روز به 00:00 روز بعد تا تسک در گذشته ثبت نشود"""
+    if not result.end_of_day or result.date is None:
+        return
+    result.date += timedelta(days=1)
+    if result.recurrence and result.recurrence['weekdays']:
+        # «دوشنبه‌ها ساعت ۱۲ شب» یعنی بامداد سه‌شنبه‌ها
+        result.recurrence['weekdays'] = sorted((day + 1) % 7 for day in result.recurrence['weekdays'])
+
+
+def _parse_recurrence(text, result, today):
+    match = _RECURRENCE_WORKDAYS.search(text)
+    if match:
+        result.recurrence = {'freq': 'weekly', 'weekdays': list(WORK_WEEKDAYS)}
+    else:
+        match = _RECURRENCE_DAILY.search(text)
+        if match:
+            result.recurrence = {'freq': 'daily', 'weekdays': []}
+        else:
+            match = _RECURRENCE_WEEKLY.search(text)
+            if match:
+                weekdays = {WEEKDAYS[name] for name in _WEEKDAY_IN_LIST.findall(match.group(1))}
+                result.recurrence = {'freq': 'weekly', 'weekdays': sorted(weekdays)}
+    if match:
+        result.consume(match)
+        weekdays = result.recurrence['weekdays']
+        if not result.date_explicit or (weekdays and result.date_from_weekday):
+            result.date = min(next_weekday(today, wd) for wd in weekdays) if weekdays else today
+            result.date_explicit = True
+
+
+def _parse_reminder_and_duration(text, result):
+    match = _REMINDER.search(text)
+    if match:
+        amount = int(match.group(1))
+        result.reminder_before = amount * 60 if match.group(2) == 'ساعت' else amount
+        result.consume(match)
+        text = text[:match.start()] + ' ' * (match.end() - match.start()) + text[match.end():]
+
+    for match in _DURATION.finditer(text):
+        # «ساعت ۱۰» زمان است نه مدت؛ فقط «۲ ساعت» و «۹۰ دقیقه» مدت حساب می‌شوند
+        if any(start <= match.start() < end for start, end in result.spans):
+            continue
+        amount = 0.5 if match.group(1) == 'نیم' else int(match.group(1))
+        minutes = amount * 60 if match.group(2) == 'ساعت' else amount
+        if match.group(3) == 'نیم':
+            minutes += 30
+        elif match.group(3) == 'ربع':
+            minutes += 15
+        result.duration = int(minutes)
+        result.consume(match)
+        return
+
+
+def _detect_type(text, result):
+    for task_type, pattern in _TASK_TYPE_PATTERNS:
+        if pattern.search(text):
+            result.task_type = task_type
+            return
+
+
+def _title(text, result):
+    chars = list(text)
+    for start, end in result.spans:
+        for i in range(start, end):
+            chars[i] = ' '
+    words = [
+        word for word in ''.join(chars).split()
+        if word not in _STOP_WORDS and not word.isdigit()
+        and word not in WEEKDAYS and word != 'هر'
+    ]
+    return ' '.join(words[:8])
+
+
+def parse(text, today=None):
+    """پارس متن و برگرداندن داده تسک به همراه confidence بین 0 و 1"""
+    today = today or datetime.now().date()
+    prepared = prepare(text)
+    result = ParseResult(prepared)
+
+    _parse_time(prepared, result)
+    _parse_date(prepared, result, today)
+    _parse_recurrence(prepared, result, today)
+    _resolve_end_of_day(result)
+    _parse_reminder_and_duration(prepared, result)
+    _detect_type(prepared, result)
+    title = _title(prepared, result)
+
+    confidence = 0.0
+    if result.time:
+        confidence += 0.45
+    confidence += 0.25 if result.date_explicit else 0.1
+    if result.task_type:
+        confidence += 0.2
+    if title:
+        confidence += 0.1
+    if result.time_ambiguous:
+        # ساعت حدسی («ساعت ۵») باید به Gemini برسد؛ زیر آستانه پیش‌فرض LOCAL_PARSER_CONFIDENCE (0.8)
+        confidence = min(confidence, AMBIGUOUS_CONFIDENCE)
+
+    task_data = {
+        "task_title": title or text.strip()[:50],
+        "task_type": result.task_type or "personal",
+        "scheduled_date": result.date.strftime('%Y-%m-%d'),
+        "scheduled_time": result.time or "10:00",
+        "duration": result.duration or 60,
+        "reminder_before": result.reminder_before if result.reminder_before is not None else 15,
+        "notes": "ثبت شده با پردازش متن",
+        "confidence": round(min(confidence, 1.0), 2),
+    }
+    if result.recurrence:
+        task_data["recurrence"] = result.recurrence
+    return task_data
+
+
+def extract_time(text):
+    result = ParseResult(text)
+    _parse_time(prepare(text), result)
+    return result.time or "10:00"
+
+
+def extract_date(text, today=None):
+    today = today or datetime.now().date()
+    prepared = prepare(text)
+    result = ParseResult(prepared)
+    _parse_time(prepared, result)
+    _parse_date(prepared, result, today)
+    _resolve_end_of_day(result)
+    return result.date.strftime('%Y-%m-%d')
@@ -0,0 +1,119 @@
+"""قانون‌های تکرار و تولید تنبل وقوع‌های آن‌ها
+
+یک برنامه تکراری («هر روز ساعت ۱۸ باشگاه») فقط یک ردیف در جدول
+recurring_tasks است. وقوع‌ها هیچ‌وقت ذخیره نمی‌شوند و فقط برای بازه‌ای
+که یک کوئری لازم دارد ساخته می‌شوند؛ فقط وضعیت وقوع‌هایی که با پیش‌فرض
+فرق دارند (انجام شده، رد شده، یادآوری ارسال شده) در recurrence_exceptions
+نگه داشته می‌شود.
+"""
+from datetime import datetime, timedelta
+
+DAILY = 'daily'
+WEEKLY = 'weekly'
+SKIPPED = 'skipped'
+
+_PREFIX = 'r'
+
+
+def occurrence_id(rule_id, date):
+    """شناسه یک وقوع، مثل r12:2026-10-18"""
+    return f"{_PREFIX}{rule_id}:{date}"
+
+
+def parse_occurrence_id(task_id):
+    """(rule_id, date) برای شناسه وقوع، یا None برای شناسه تسک معمولی"""
+    if not isinstance(task_id, str) or not task_id.startswith(_PREFIX):
+        return None
+    rule_id, _, date = task_id[len(_PREFIX):].partition(':')
+    return int(rule_id), date
+
+
+def encode_weekdays(weekdays):
+    return ','.join(str(day) for day in sorted(set(weekdays or [])))
+
+
+def decode_weekdays(value):
+    return {int(day) for day in value.split(',')} if value else set()
+
+
+def _as_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date() if isinstance(value, str) else value
+
+
+def occurrence_dates(rule, start, end):
+    """تاریخ وقوع‌های rule در بازه [start, end)؛ هزینه به طول بازه بستگی دارد نه عمر قانون"""
+    first = max(_as_date(start), _as_date(rule.start_date))
+    end = _as_date(end)
+    if rule.end_date:
+        end = min(end, _as_date(rule.end_date) + timedelta(days=1))
+
+    weekdays = decode_weekdays(rule.weekdays) if rule.freq == WEEKLY else set()
+    day = first
+    while day < end:
+        if not weekdays or day.weekday() in weekdays:
+            yield day
+        day += timedelta(days=1)
+
+
+def next_occurrence_date(rule, after):
+    """اولین وقوع بعد از تاریخ after، یا None اگر قانون تمام شده باشد
+
+    جستجو از max(فردای after، شروع قانون) هفته به هفته تا پایان قانون ادامه
+    پیدا می‌کند. الگوی قانون‌ها هفتگی است، پس اگر یک هفته کامل از شروع
+    جستجو وقوعی نداشته باشد قانون دیگر وقوعی ندارد.
+    """
+    start = max(_as_date(after) + timedelta(days=1), _as_date(rule.start_date))
+    end = _as_date(rule.end_date) if rule.end_date else start + timedelta(days=7)
+    while start <= end:
+        following = next(occurrence_dates(rule, start, start + timedelta(days=7)), None)
+        if following is not None:
+            return following
+        start += timedelta(days=7)
+    return None
+
+
+class Occurrence:
+    """یک وقوع از برنامه تکراری با همان فیلدهای Task
+
+    هندلرها، نمودارها و یادآوری‌ها بدون تفاوت با Task از آن استفاده می‌کنند.
+    """
+
+    is_recurring = True
+
+    def __init__(self, rule, date, exception=None):
+        date = _as_date(date).isoformat()
+        self.id = occurrence_id(rule.id, date)
+        self.rule_id = rule.id
+        self.user_id = rule.user_id
+        self.title = rule.title
+        self.task_type = rule.task_type
+        self.scheduled_date = date
+        self.scheduled_time = rule.scheduled_time
+        self.scheduled_at = int(datetime.strptime(f"{date} {rule.scheduled_time}", '%Y-%m-%d %H:%M').timestamp())
+        self.duration = rule.duration
+        self.reminder_before = rule.reminder_before
+        self.notes = rule.notes
+        self.status = exception.status if exception else 'pending'
+        self.reminder_sent = bool(exception and exception.reminder_sent)
+
+    def __repr__(self):
+        return f"<Occurrence {self.id} {self.title!r}>"
+
+
+WEEKDAY_NAMES = ['دوشنبه', 'سه\u200cشنبه', 'چهارشنبه', 'پنجشنبه', 'جمعه', 'شنبه', 'یکشنبه']
+# ترتیب نمایش از شنبه
+_WEEK_ORDER = [5, 6, 0, 1, 2, 3, 4]
+
+
+def describe(recurrence):
+    """توضیح فارسی قانون تکرار برای پیام‌های ربات"""
+    weekdays = set(recurrence.get('weekdays') or [])
+    if recurrence.get('freq') != WEEKLY or not weekdays or len(weekdays) == 7:
+        text = "هر روز"
+    elif weekdays == {5, 6, 0, 1, 2}:
+        text = "روزهای کاری"
+    else:
+        text = "هر " + "، ".join(WEEKDAY_NAMES[day] for day in _WEEK_ORDER if day in weekdays)
+    if recurrence.get('until'):
+        text += f" تا {recurrence['until']}"
+    return text
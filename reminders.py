@@ -0,0 +1,119 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+import config
+import database as db
+from metrics import metrics
+
+
+class ReminderEngine:
+    """موتور یادآوری مبتنی بر جدول tasks
+
+    به جای یک job جداگانه در APScheduler برای هر تسک، فقط یک heap از
+    (زمان یادآوری به epoch، ترتیب ورود، شناسه تسک) نگه داشته می‌شود و یک حلقه asyncio
+    روی event loop ربات آن را تخلیه می‌کند. منبع حقیقت همان جدول tasks است،
+    پس بعد از ری‌استارت با یک کوئری دوباره ساخته می‌شود.
+    """
+
+    def __init__(self, send_callback, shards=None):
+        self._send = send_callback
+        # تابعی که شاردهای این worker را برمی‌گرداند (None یعنی همه)
+        self._shards = shards or (lambda: None)
+        self._heap = []
+        self._wakeup = asyncio.Event()
+        self._runner = None
+        self._inflight = set()
+        # شناسه تسک‌ها عدد و شناسه وقوع‌های تکراری رشته است؛ ترتیب ورود مقایسه آن‌ها را لازم نمی‌کند
+        self._order = itertools.count()
+        metrics.gauge('reminders_scheduled', lambda: len(self._heap))
+        metrics.gauge('reminders_inflight', lambda: len(self._inflight))
+
+    def __len__(self):
+        return len(self._heap)
+
+    @property
+    def running(self):
+        return self._runner is not None
+
+    async def load(self):
+        """ادغام یادآوری‌های REMINDER_LOOKAHEAD آینده از دیتابیس (فقط شاردهای این worker) در صف
+
+        صف جایگزین نمی‌شود: یادآوری‌هایی که همین worker برای کاربران شاردهای
+        دیگر زمان‌بندی کرده در صف می‌مانند و همین‌جا ارسال می‌شوند، چون ممکن
+        است worker مالک تا بارگذاری بعدی آن‌ها را نبیند. claim_reminder
+        تضمین می‌کند هر یادآوری فقط یک بار ارسال شود.
+        """
+        now = time.time()
+        pending = await db.db.get_pending_reminders(now, self._shards(), now + config.REMINDER_LOOKAHEAD)
+        loaded = {task_id for task_id, _ in pending}
+        self._heap = [entry for entry in self._heap if entry[2] not in loaded]
+        self._heap.extend((due, next(self._order), task_id) for task_id, due in pending)
+        heapq.heapify(self._heap)
+        self._wakeup.set()
+        return len(self._heap)
+
+    async def start(self):
+        """شروع حلقه تخلیه روی event loop جاری"""
+        if self._runner is None:
+            await self.load()
+            self._runner = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+
+    def schedule(self, task_id, due_epoch):
+        """افزودن یک یادآوری به صف"""
+        heapq.heappush(self._heap, (due_epoch, next(self._order), task_id))
+        # فقط وقتی زودترین زمان عوض شده باید حلقه را بیدار کرد
+        if self._heap[0][2] == task_id:
+            self._wakeup.set()
+
+    def schedule_many(self, reminders):
+        """افزودن دسته‌ای [(task_id, due_epoch)] با یک بازسازی heap"""
+        if not reminders:
+            return
+        earliest = self._heap[0][0] if self._heap else None
+        self._heap.extend((due, next(self._order), task_id) for task_id, due in reminders)
+        heapq.heapify(self._heap)
+        if earliest is None or self._heap[0][0] < earliest:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            due, _, task_id = self._heap[0]
+            delay = due - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            # تأخیر ارسال نسبت به زمان مقرر یادآوری
+            metrics.observe('reminder_lag_seconds', -delay)
+            fire = asyncio.create_task(self._fire(task_id))
+            self._inflight.add(fire)
+            fire.add_done_callback(self._inflight.discard)
+
+    async def _fire(self, task_id):
+        try:
+            with metrics.timer('reminder_send_seconds'):
+                await self._send(task_id)
+        except Exception as e:
+            metrics.inc('reminder_errors_total')
+            print(f"Error sending reminder for task {task_id}: {e}")
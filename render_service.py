@@ -0,0 +1,86 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import config
+
+
+class RenderService:
+    """اجرای رندر نمودار در پروسس‌های worker ماندگار
+
+    هر worker یک بار plotly/kaleido را بارگذاری می‌کند و گرم نگه می‌دارد،
+    پس رندر نه event loop ربات را بلاک می‌کند و نه هر بار هزینه راه‌اندازی دارد.
+    تعداد کارهای در صف محدود است؛ وقتی صف پر است یا رندر از timeout بگذرد
+    None برگردانده می‌شود و هندلر بدون نمودار پاسخ می‌دهد.
+    """
+
+    def __init__(self, workers=None, queue_size=None, timeout=None, initializer=None):
+        self.workers = workers or config.CHART_WORKERS
+        self.queue_size = queue_size or config.CHART_QUEUE_SIZE
+        self.timeout = timeout or config.CHART_RENDER_TIMEOUT
+        self.initializer = initializer
+        self._executor = None
+        self._slots = None
+        self.rejected = 0
+        self.timeouts = 0
+
+    def start(self):
+        """ساخت pool؛ workerها در پس‌زمینه گرم می‌شوند"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=self.initializer
+            )
+            self._slots = asyncio.Semaphore(self.queue_size)
+            # spawn شدن workerها بدون منتظر ماندن برای اولین درخواست
+            for _ in range(self.workers):
+                self._executor.submit(int)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @property
+    def queue_depth(self):
+        if self._slots is None:
+            return 0
+        return self.queue_size - self._slots._value
+
+    async def render(self, func, *args):
+        """اجرای func(*args) در یک worker و برگرداندن نتیجه (یا None)"""
+        self.start()
+
+        if self._slots.locked():
+            self.rejected += 1
+            print(f"Chart render queue full, skipping {func.__name__}")
+            return None
+
+        slots = self._slots
+        await slots.acquire()
+        try:
+            future = self._executor.submit(func, *args)
+        except BrokenProcessPool:
+            slots.release()
+            self.shutdown()
+            print(f"Chart render pool broken, restarting: {func.__name__}")
+            return None
+        # جایگاه صف تا پایان واقعی کار در worker آزاد نمی‌شود، حتی بعد از timeout
+        result = asyncio.wrap_future(future)
+        result.add_done_callback(lambda _: slots.release())
+        try:
+            return await asyncio.wait_for(asyncio.shield(result), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            # کاری که هنوز شروع نشده لغو می‌شود؛ کار در حال اجرا تا پایان جایگاهش را نگه می‌دارد
+            future.cancel()
+            print(f"Chart render timed out: {func.__name__}")
+        except BrokenProcessPool:
+            # یک worker کرش کرده؛ pool برای درخواست بعدی از نو ساخته می‌شود
+            self.shutdown()
+            print(f"Chart render pool broken, restarting: {func.__name__}")
+        except Exception as e:
+            print(f"Error rendering chart {func.__name__}: {e}")
+        return None
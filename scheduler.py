@@ -1,16 +1,84 @@
-from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_MISSED, EVENT_JOB_SUBMITTED
 from apscheduler.triggers.cron import CronTrigger
-from datetime import datetime, timedelta
+from datetime import datetime
+import asyncio
+import time
 import database as db
 import chart_generator as chart_gen
-from telegram import Bot
+from reminders import ReminderEngine
+from recurrence import parse_occurrence_id
+from fanout import fan_out
+from outbox import BULK, NOTIFICATION
+from cluster import cluster
+from metrics import metrics
 import config
 
 class TaskScheduler:
-    def __init__(self, bot_token):
-        self.bot = Bot(token=bot_token)
-        self.scheduler = BackgroundScheduler()
+    def __init__(self, outbox):
+        self.outbox = outbox
+        self.scheduler = AsyncIOScheduler()
+        self.scheduler.add_listener(
+            self._record_job_event,
+            EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED
+        )
+        self.reminders = ReminderEngine(self.send_task_reminder, shards=cluster.shards)
+        # اجراهای اخیر jobها برای تکرار روی شاردهایی که از worker دیگری تحویل گرفته می‌شوند
+        self._recent_runs = {}
+        self._catch_ups = set()
+        cluster.add_listener(self._on_shards_changed)
+    
+    async def start(self):
+        """شروع زمان‌بندها روی event loop ربات"""
         self.setup_schedulers()
+        await cluster.start()
+        await self.reminders.start()
+    
+    async def shutdown(self):
+        await self.reminders.stop()
+        self.scheduler.shutdown(wait=False)
+        await cluster.stop()
+    
+    async def _on_shards_changed(self, gained, lost):
+        """بارگذاری یادآوری‌های شاردهای جدید و اجرای jobهای اخیر برای آن‌ها"""
+        if self.reminders.running:
+            await self.reminders.load()
+        if not gained:
+            return
+        now = time.time()
+        for job_key, (job, args, fired_at) in list(self._recent_runs.items()):
+            if now - fired_at > config.CLUSTER_CATCH_UP:
+                del self._recent_runs[job_key]
+                continue
+            catch_up = asyncio.create_task(job(*args, shards=gained))
+            self._catch_ups.add(catch_up)
+            catch_up.add_done_callback(self._catch_ups.discard)
+    
+    async def _claim_shards(self, job_key, job, args, shards):
+        """شاردهایی که این اجرای job باید پوشش دهد؛ None یعنی همه کاربران
+
+        هر (job_key، شارد) فقط یک بار در کل workerها گرفته می‌شود.
+        """
+        if not cluster.enabled:
+            return None
+        if shards is None:
+            self._recent_runs[job_key] = (job, args, time.time())
+        return await cluster.claim(job_key, shards)
+    
+    def _record_job_event(self, event):
+        """تأخیر شروع jobها و زمان پایانشان نسبت به زمان مقرر، و شمارش خطا و اجراهای از دست رفته"""
+        now = datetime.now().astimezone()
+        if event.code == EVENT_JOB_SUBMITTED:
+            for run_time in event.scheduled_run_times:
+                metrics.observe('scheduler_job_lag_seconds', max(0.0, (now - run_time).total_seconds()), job=event.job_id)
+        elif event.code == EVENT_JOB_MISSED:
+            metrics.inc('scheduler_job_missed_total', job=event.job_id)
+        else:
+            outcome = 'error' if event.code == EVENT_JOB_ERROR else 'ok'
+            metrics.observe(
+                'scheduler_job_completion_seconds', (now - event.scheduled_run_time).total_seconds(),
+                job=event.job_id, outcome=outcome
+            )
     
     def setup_schedulers(self):
         """تنظیم زمان‌بندها"""
@@ -22,115 +90,154 @@ class TaskScheduler:
             id='daily_summary'
         )
         
-        # چک کردن تسک‌های پیش‌فرض هر 30 دقیقه
+        # یادآوری برنامه پیش‌فرض دقیقاً سر هر ساعت تعریف شده
+        for slot, activity in config.DEFAULT_SCHEDULE.items():
+            hour, minute = slot.split(':')
+            self.scheduler.add_job(
+                self.send_default_nudge,
+                trigger=CronTrigger(hour=int(hour), minute=int(minute)),
+                args=[slot, activity],
+                id=f'default_nudge_{slot}',
+                misfire_grace_time=300
+            )
+        
+        # صف یادآوری فقط REMINDER_LOOKAHEAD آینده را نگه می‌دارد و دوره‌ای تکمیل می‌شود؛
+        # در حالت چند worker یادآوری‌های ثبت شده در workerهای دیگر هم همین‌جا می‌رسند
         self.scheduler.add_job(
-            self.check_default_schedule,
+            self.reminders.load,
             trigger='interval',
-            minutes=30,
-            id='default_schedule_check'
+            seconds=config.REMINDER_RELOAD,
+            id='reload_reminders'
         )
         
         # شروع زمان‌بند
         self.scheduler.start()
     
-    async def send_daily_summary(self):
-        """ارسال خلاصه روزانه برای همه کاربران"""
-        users = db.db.session.query(db.User).all()
+    async def send_daily_summary(self, shards=None):
+        """ارسال خلاصه روزانه برای همه کاربران (یا کاربران شاردهای این worker)
+
+        شمارش تسک‌های همه کاربران با یک کوئری گروه‌بندی شده انجام می‌شود،
+        کاربران دسته‌ای خوانده می‌شوند و ارسال‌ها به صورت همزمان با تعداد
+        worker محدود انجام می‌شوند.
+        """
+        today = datetime.now().strftime('%Y-%m-%d')
+        shards = await self._claim_shards(f'daily_summary:{today}', self.send_daily_summary, (), shards)
+        if shards == []:
+            return None
+        counts = await db.db.get_day_counts(today)
         
-        for user in users:
-            try:
-                today = datetime.now().strftime('%Y-%m-%d')
-                
-                # تولید نمودار
-                chart_img = chart_gen.chart_generator.generate_daily_chart(user.telegram_id, today)
-                
-                if chart_img:
-                    # ارسال عکس
-                    await self.bot.send_photo(
-                        chat_id=user.telegram_id,
-                        photo=chart_img,
-                        caption="📊 خلاصه برنامه امروز شما"
-                    )
-                
-                # ارسال خلاصه متنی
-                tasks = db.db.get_today_tasks(user.telegram_id)
-                completed_tasks = [t for t in tasks if t.status == 'completed']
-                
-                summary_text = (
-                    f"📅 گزارش روزانه\n\n"
-                    f"✅ تسک‌های انجام شده: {len(completed_tasks)}/{len(tasks)}\n"
-                    f"📈 میزان بهره‌وری: {int((len(completed_tasks)/len(tasks))*100) if tasks else 0}%\n\n"
-                    f"فردا رو هم با انرژی شروع کن! 💪"
+        async def recipients():
+            async for user_ids in db.db.iter_user_ids(config.FANOUT_BATCH_SIZE, shards=shards):
+                # تسک‌های نمودار فقط برای کاربرانی که امروز تسک دارند، یکجا برای کل دسته
+                tasks_by_user = await db.db.get_tasks_for_users_on_date(
+                    [user_id for user_id in user_ids if user_id in counts], today
                 )
-                
-                await self.bot.send_message(
-                    chat_id=user.telegram_id,
-                    text=summary_text
-                )
-                
-            except Exception as e:
-                print(f"Error sending summary to user {user.telegram_id}: {e}")
-    
-    async def check_default_schedule(self):
-        """چک کردن و اجرای برنامه پیش‌فرض"""
-        users = db.db.session.query(db.User).all()
-        current_time = datetime.now().strftime('%H:%M')
+                for user_id in user_ids:
+                    yield user_id, tasks_by_user.get(user_id, [])
         
-        for user in users:
-            try:
-                # چک کن اگر کاربر برای زمان فعلی تسکی ثبت نکرده باشد
-                today_tasks = db.db.get_today_tasks(user.telegram_id)
-                current_hour = datetime.now().strftime('%H:%M')
-                
-                has_task_now = any(
-                    task.scheduled_time <= current_hour <= 
-                    (datetime.strptime(task.scheduled_time, '%H:%M') + 
-                     timedelta(minutes=task.duration or 60)).strftime('%H:%M')
-                    for task in today_tasks
+        async def send(item):
+            user_id, tasks = item
+            completed, total = counts.get(user_id, (0, 0))
+            
+            if tasks:
+                # ارسال نمودار (از کش یا با file_id قبلی)
+                await chart_gen.chart_generator.send_daily_chart(
+                    lambda photo: self.outbox.send_photo(
+                        chat_id=user_id,
+                        photo=photo,
+                        caption="📊 خلاصه برنامه امروز شما",
+                        priority=BULK
+                    ),
+                    user_id, today, tasks=tasks
                 )
-                
-                if not has_task_now and current_time in config.DEFAULT_SCHEDULE:
-                    default_task = config.DEFAULT_SCHEDULE[current_time]
-                    
-                    await self.bot.send_message(
-                        chat_id=user.telegram_id,
-                        text=f"⏰ طبق برنامه پیش‌فرض، الان وقت {default_task} هست!\n"
-                             f"آماده‌اید؟"
-                    )
-                    
-            except Exception as e:
-                print(f"Error in default schedule for user {user.telegram_id}: {e}")
+            
+            # ارسال خلاصه متنی
+            summary_text = (
+                f"📅 گزارش روزانه\n\n"
+                f"✅ تسک‌های انجام شده: {completed}/{total}\n"
+                f"📈 میزان بهره‌وری: {int((completed/total)*100) if total else 0}%\n\n"
+                f"فردا رو هم با انرژی شروع کن! 💪"
+            )
+            
+            await self.outbox.send_message(
+                chat_id=user_id,
+                text=summary_text,
+                priority=BULK
+            )
+        
+        report = await fan_out('daily_summary', recipients(), send, concurrency=config.FANOUT_CONCURRENCY)
+        print(f"📤 {report}")
+        return report
     
-    def schedule_task_reminder(self, task):
-        """زمان‌بندی یادآوری برای یک تسک"""
-        task_time = datetime.strptime(
-            f"{task.scheduled_date} {task.scheduled_time}", 
-            '%Y-%m-%d %H:%M'
+    async def send_default_nudge(self, slot, activity, shards=None):
+        """یادآوری برنامه پیش‌فرض فقط برای کاربرانی که در این ساعت تسکی ندارند
+
+        کاربران آزاد با یک کوئری مجموعه‌ای (به ازای هر دسته) پیدا می‌شوند؛
+        برای کاربران مشغول هیچ کاری انجام نمی‌شود.
+        """
+        today = datetime.now().strftime('%Y-%m-%d')
+        shards = await self._claim_shards(
+            f'default_nudge:{today}:{slot}', self.send_default_nudge, (slot, activity), shards
         )
-        reminder_time = task_time - timedelta(minutes=task.reminder_before)
+        if shards == []:
+            return None
+        at_epoch = db.scheduled_epoch(today, slot)
         
-        if reminder_time > datetime.now():
-            self.scheduler.add_job(
-                self.send_task_reminder,
-                'date',
-                run_date=reminder_time,
-                args=[task.id],
-                id=f"reminder_{task.id}"
+        async def recipients():
+            async for user_ids in db.db.iter_free_user_ids(at_epoch, config.FANOUT_BATCH_SIZE, shards=shards):
+                for user_id in user_ids:
+                    yield user_id
+        
+        async def send(user_id):
+            await self.outbox.send_message(
+                chat_id=user_id,
+                text=f"⏰ طبق برنامه پیش‌فرض، الان وقت {activity} هست!\n"
+                     f"آماده‌اید؟",
+                priority=BULK
             )
+        
+        report = await fan_out(f'default_nudge {slot}', recipients(), send, concurrency=config.FANOUT_CONCURRENCY)
+        print(f"📤 {report}")
+        return report
+    
+    def schedule_task_reminder(self, task):
+        """زمان‌بندی یادآوری برای یک تسک یا وقوع بعدی یک برنامه تکراری"""
+        if task is None:
+            return
+        reminder_at = task.scheduled_at - (task.reminder_before or 0) * 60
+        
+        # یادآوری‌هایی که زمانشان گذشته ولی تسک هنوز شروع نشده فوراً ارسال می‌شوند
+        if task.scheduled_at > datetime.now().timestamp():
+            self.reminders.schedule(task.id, reminder_at)
+    
+    def schedule_task_reminders(self, reminders):
+        """زمان‌بندی دسته‌ای یادآوری‌ها از خروجی Database.add_tasks"""
+        now = datetime.now().timestamp()
+        self.reminders.schedule_many([
+            (task_id, reminder_at) for task_id, scheduled_at, reminder_at in reminders if scheduled_at > now
+        ])
     
     async def send_task_reminder(self, task_id):
         """ارسال یادآوری تسک"""
-        task = db.db.session.query(db.Task).filter_by(id=task_id).first()
-        if task and task.status == 'pending':
-            user = db.db.session.query(db.User).filter_by(telegram_id=task.user_id).first()
-            
-            if user:
-                await self.bot.send_message(
-                    chat_id=user.telegram_id,
-                    text=f"🔔 یادآوری!\n\n"
-                         f"📝 {task.title}\n"
-                         f"⏰ ساعت: {task.scheduled_time}\n"
-                         f"📅 تاریخ: {task.scheduled_date}\n"
-                         f"🎯 نوع: {task.task_type}\n\n"
-                         f"آماده باشید!"
-                )
+        claimed = await db.db.claim_reminder(task_id)
+        task = await db.db.get_task(task_id)
+        
+        if parse_occurrence_id(task_id) and (claimed or task is None or not task.reminder_sent):
+            # فقط یک وقوع از هر برنامه تکراری در صف است؛ وقوع بعدی همین‌جا اضافه می‌شود
+            # (وقوع رد شده یا انجام شده هم زنجیره را ادامه می‌دهد، ارسال تکراری نه)
+            self.schedule_task_reminder(await db.db.get_next_occurrence(task_id))
+        
+        if not claimed:
+            return
+        
+        if task:
+            await self.outbox.send_message(
+                chat_id=task.user_id,
+                text=f"🔔 یادآوری!\n\n"
+                     f"📝 {task.title}\n"
+                     f"⏰ ساعت: {task.scheduled_time}\n"
+                     f"📅 تاریخ: {task.scheduled_date}\n"
+                     f"🎯 نوع: {task.task_type}\n\n"
+                     f"آماده باشید!",
+                priority=NOTIFICATION
+            )
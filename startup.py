@@ -0,0 +1,80 @@
+"""زمان‌سنجی مراحل راه‌اندازی ربات و بررسی بودجه زمان import
+
+اجرای مستقیم این فایل زمان `import bot` را در یک پروسس تازه اندازه
+می‌گیرد و اگر از بودجه بیشتر باشد با کد خروج 1 تمام می‌شود:
+
+    python startup.py --budget 1.5
+
+همین اندازه‌گیری در benchmarks هم با نام startup.import_bot ثبت می‌شود تا
+با --baseline کند شدن آن دیده شود.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+import config
+
+
+class StartupReport:
+    """مدت زمان هر مرحله از شروع پروسس تا آماده شدن کامل ربات"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = []
+
+    def record(self, name, seconds):
+        self.phases.append((name, seconds))
+
+    def mark(self, name):
+        """ثبت زمان سپری شده از شروع پروسس تا این نقطه"""
+        self.record(name, time.perf_counter() - self.started)
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def report(self):
+        lines = ["⏱ Startup report:"]
+        for name, seconds in self.phases:
+            lines.append(f"  {name:<28} {seconds * 1000:8.1f} ms")
+        lines.append(f"  {'total':<28} {(time.perf_counter() - self.started) * 1000:8.1f} ms")
+        return "\n".join(lines)
+
+
+# گزارش سراسری؛ bot.py این ماژول را قبل از بقیه import می‌کند
+startup_report = StartupReport()
+
+
+def measure_import(module='bot'):
+    """زمان import یک ماژول (ثانیه) در یک پروسس تازه"""
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    result = subprocess.run(
+        [sys.executable, '-W', 'ignore', '-c', code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, check=True
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="بررسی بودجه زمان import ربات")
+    parser.add_argument('--module', default='bot')
+    parser.add_argument('--budget', type=float, default=config.STARTUP_IMPORT_BUDGET)
+    args = parser.parse_args()
+
+    seconds = measure_import(args.module)
+    print(f"import {args.module}: {seconds:.3f}s (budget {args.budget:.3f}s)")
+    if seconds > args.budget:
+        print("❌ import time is over budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+"""ورود گروهی تسک از فایل CSV یا iCalendar و خروجی iCalendar
+
+فایل‌ها خط به خط خوانده می‌شوند و هر ردیف با پارسر محلی و همان قوانین
+validate_task_data بررسی می‌شود، بدون هیچ فراخوانی Gemini. تسک‌های
+یک‌باره در دسته‌های IMPORT_BATCH_SIZE تایی با یک executemany ثبت و
+یادآوری‌هایشان یکجا زمان‌بندی می‌شوند. خروجی iCalendar هم دسته‌ای از
+دیتابیس خوانده و مستقیم در فایل مقصد نوشته می‌شود.
+
+ستون‌های CSV (سطر اول، فارسی یا انگلیسی):
+    title/عنوان, type/نوع, date/تاریخ, time/ساعت, duration/مدت, reminder/یادآوری, notes/توضیحات
+تاریخ میلادی (2026-10-18) یا شمسی (1405/07/26) پذیرفته می‌شود.
+"""
+import csv
+import re
+from datetime import datetime, timedelta, timezone
+
+import config
+import database as db
+import persian_parser
+from gemini_processor import validate_task_data
+from recurrence import DAILY, WEEKLY
+
+TASK_TYPES = ('lesson', 'work', 'sport', 'personal', 'exam')
+
+# نام ستون‌ها و نوع‌های فارسی
+_CSV_COLUMNS = {
+    'title': 'task_title', 'task_title': 'task_title', 'عنوان': 'task_title',
+    'type': 'task_type', 'task_type': 'task_type', 'نوع': 'task_type',
+    'date': 'scheduled_date', 'تاریخ': 'scheduled_date',
+    'time': 'scheduled_time', 'ساعت': 'scheduled_time', 'زمان': 'scheduled_time',
+    'duration': 'duration', 'مدت': 'duration',
+    'reminder': 'reminder_before', 'reminder_before': 'reminder_before', 'یادآوری': 'reminder_before',
+    'notes': 'notes', 'توضیحات': 'notes',
+}
+_POSITIONAL_COLUMNS = ['task_title', 'task_type', 'scheduled_date', 'scheduled_time', 'duration', 'reminder_before', 'notes']
+_TYPE_NAMES = {'درس': 'lesson', 'کلاس': 'lesson', 'کار': 'work', 'ورزش': 'sport', 'شخصی': 'personal', 'امتحان': 'exam'}
+
+_DATE = re.compile(r'^(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})$')
+_TIME = re.compile(r'^(\d{1,2})(?::(\d{2}))?$')
+_ICS_DURATION = re.compile(r'^([-+])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$')
+_ICS_WEEKDAYS = {'MO': 0, 'TU': 1, 'WE': 2, 'TH': 3, 'FR': 4, 'SA': 5, 'SU': 6}
+
+
+class ImportReport:
+    """نتیجه یک ورود گروهی"""
+
+    def __init__(self):
+        self.imported = 0
+        self.recurring = 0
+        self.invalid_lines = []
+
+    @property
+    def invalid(self):
+        return len(self.invalid_lines)
+
+
+def _parse_date(value):
+    """تاریخ میلادی یا شمسی به YYYY-MM-DD؛ None اگر نامعتبر باشد"""
+    match = _DATE.match(persian_parser.normalize(value))
+    if not match:
+        return None
+    year, month, day = (int(part) for part in match.groups())
+    try:
+        if year < 1700:
+            return persian_parser.jalali_to_gregorian(year, month, day).isoformat()
+        return datetime(year, month, day).date().isoformat()
+    except (ValueError, IndexError):
+        return None
+
+
+def _parse_time(value):
+    match = _TIME.match(persian_parser.normalize(value))
+    if not match:
+        return None
+    return f"{int(match.group(1)):02d}:{int(match.group(2) or 0):02d}"
+
+
+def _parse_minutes(value, default):
+    value = persian_parser.normalize(value or '')
+    return int(value) if value.isdigit() else default
+
+
+def _task_type(value, title):
+    value = persian_parser.normalize(value or '')
+    if value in TASK_TYPES:
+        return value
+    if value in _TYPE_NAMES:
+        return _TYPE_NAMES[value]
+    # همان تشخیص نوع پارسر محلی از روی عنوان
+    return persian_parser.parse(title)['task_type'] if title else 'personal'
+
+
+def _finish(task_data):
+    """task_data کامل شده اگر با قوانین validate_task_data معتبر باشد، وگرنه None"""
+    if not validate_task_data(task_data):
+        return None
+    if not 0 < task_data['duration'] <= config.MAX_TASK_DURATION:
+        return None
+    return task_data
+
+
+def csv_row_to_task(row):
+    title = (row.get('task_title') or '').strip()
+    return _finish({
+        'task_title': title,
+        'task_type': _task_type(row.get('task_type'), title),
+        'scheduled_date': _parse_date(row.get('scheduled_date') or ''),
+        'scheduled_time': _parse_time(row.get('scheduled_time') or ''),
+        'duration': _parse_minutes(row.get('duration'), 60),
+        'reminder_before': _parse_minutes(row.get('reminder_before'), 15),
+        'notes': (row.get('notes') or '').strip(),
+    })
+
+
+def iter_csv_tasks(stream):
+    """(شماره خط، task_data یا None) برای هر ردیف CSV
+
+    اگر سطر اول نام ستون‌ها نباشد ستون‌ها به ترتیب پیش‌فرض خوانده می‌شوند.
+    """
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = [_CSV_COLUMNS.get(persian_parser.normalize(name).lstrip('\ufeff')) for name in header]
+    if 'task_title' not in columns:
+        columns = _POSITIONAL_COLUMNS
+        yield reader.line_num, csv_row_to_task(dict(zip(columns, header)))
+
+    for values in reader:
+        if not any(value.strip() for value in values):
+            continue
+        yield reader.line_num, csv_row_to_task(dict(zip(columns, values)))
+
+
+def _unfold(stream):
+    """خطوط منطقی iCalendar (خطوط ادامه‌دار با فاصله یا tab شروع می‌شوند)"""
+    current, current_line = None, 0
+    for number, line in enumerate(stream, 1):
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current_line, current
+        current, current_line = line, number
+    if current is not None:
+        yield current_line, current
+
+
+def _split_property(line):
+    """('NAME', {param: value}, value) برای یک خط iCalendar"""
+    head, _, value = line.partition(':')
+    name, *params = head.split(';')
+    return name.upper(), dict(param.partition('=')[::2] for param in params), value
+
+
+def _unescape(value):
+    return re.sub(r'\\([\\;,nN])', lambda m: '\n' if m.group(1) in 'nN' else m.group(1), value)
+
+
+def _ics_datetime(value, params):
+    """datetime محلی (بدون tzinfo) و اینکه آیا رویداد تمام‌روز است"""
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        return datetime.strptime(value[:8], '%Y%m%d'), True
+    moment = datetime.strptime(value[:15], '%Y%m%dT%H%M%S')
+    if value.endswith('Z'):
+        moment = moment.replace(tzinfo=timezone.utc)
+    elif params.get('TZID'):
+        try:
+            from zoneinfo import ZoneInfo
+            moment = moment.replace(tzinfo=ZoneInfo(params['TZID']))
+        except Exception:
+            pass
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment, False
+
+
+def _ics_minutes(value):
+    match = _ICS_DURATION.match(value.strip())
+    if not match:
+        return None
+    weeks, days, hours, minutes, seconds = (int(part or 0) for part in match.groups()[1:])
+    return weeks * 10080 + days * 1440 + hours * 60 + minutes + seconds // 60
+
+
+def _ics_recurrence(value, start):
+    """قانون تکرار پشتیبانی شده (روزانه یا هفتگی با فاصله 1) یا None برای قانون پشتیبانی نشده یا خراب"""
+    rule = dict(part.partition('=')[::2] for part in value.upper().split(';'))
+    if rule.get('INTERVAL', '1') != '1' or 'COUNT' in rule:
+        return None
+    recurrence = {}
+    if rule.get('FREQ') == 'DAILY':
+        recurrence['freq'] = DAILY
+    elif rule.get('FREQ') == 'WEEKLY':
+        weekdays = [_ICS_WEEKDAYS[day[-2:]] for day in rule.get('BYDAY', '').split(',') if day[-2:] in _ICS_WEEKDAYS]
+        # بدون BYDAY روز هفته همان روز DTSTART است (RFC 5545)
+        recurrence.update(freq=WEEKLY, weekdays=weekdays or [start.weekday()])
+    else:
+        return None
+    if rule.get('UNTIL'):
+        try:
+            recurrence['until'] = _ics_datetime(rule['UNTIL'], {})[0].date().isoformat()
+        except ValueError:
+            return None
+    return recurrence
+
+
+def ics_event_to_task(properties):
+    """task_data یک VEVENT (شامل recurrence) یا None؛ رویداد با RRULE پشتیبانی نشده هم None است"""
+    if 'DTSTART' not in properties:
+        return None
+    try:
+        start, all_day = _ics_datetime(properties['DTSTART'][1], properties['DTSTART'][0])
+        if 'DTEND' in properties:
+            end = _ics_datetime(properties['DTEND'][1], properties['DTEND'][0])[0]
+            duration = int((end - start).total_seconds() // 60)
+        elif 'DURATION' in properties:
+            duration = _ics_minutes(properties['DURATION'][1])
+        else:
+            duration = 1440 if all_day else 60
+    except ValueError:
+        return None
+
+    title = _unescape(properties.get('SUMMARY', ({}, ''))[1]).strip()
+    categories = _unescape(properties.get('CATEGORIES', ({}, ''))[1]).split(',')[0]
+    trigger = _ics_minutes(properties['TRIGGER'][1]) if 'TRIGGER' in properties else None
+    task_data = _finish({
+        'task_title': title,
+        'task_type': _task_type(categories, title),
+        'scheduled_date': start.date().isoformat(),
+        'scheduled_time': start.strftime('%H:%M'),
+        'duration': duration or 0,
+        'reminder_before': trigger if trigger is not None else 15,
+        'notes': _unescape(properties.get('DESCRIPTION', ({}, ''))[1]).strip(),
+    })
+    if task_data is not None and 'RRULE' in properties:
+        # ثبت یک وقوع از یک قانون ناشناخته (ماهانه، COUNT، INTERVAL) گمراه‌کننده است؛ رویداد نامعتبر گزارش می‌شود
+        recurrence = _ics_recurrence(properties['RRULE'][1], start)
+        if recurrence is None:
+            return None
+        task_data['recurrence'] = recurrence
+    return task_data
+
+
+def iter_ics_tasks(stream):
+    """(شماره خط، task_data یا None) برای هر VEVENT فایل iCalendar"""
+    properties, event_line, depth = None, 0, 0
+    for number, line in _unfold(stream):
+        name, params, value = _split_property(line)
+        if name == 'BEGIN' and value.upper() == 'VEVENT':
+            properties, event_line, depth = {}, number, 0
+        elif properties is None:
+            continue
+        elif name == 'BEGIN':
+            # VALARM و ...؛ فقط TRIGGER آن استفاده می‌شود
+            depth += 1
+        elif name == 'END' and depth:
+            depth -= 1
+        elif name == 'END' and value.upper() == 'VEVENT':
+            yield event_line, ics_event_to_task(properties)
+            properties = None
+        elif depth == 0 or name == 'TRIGGER':
+            properties.setdefault(name, (params, value))
+
+
+async def import_tasks(user_id, stream, kind, scheduler, batch_size=None, max_rows=None):
+    """ورود تسک‌ها از stream متنی (kind: 'csv' یا 'ics') و زمان‌بندی یادآوری‌ها"""
+    batch_size = batch_size or config.IMPORT_BATCH_SIZE
+    max_rows = max_rows or config.IMPORT_MAX_ROWS
+    rows = iter_csv_tasks(stream) if kind == 'csv' else iter_ics_tasks(stream)
+    report = ImportReport()
+    batch = []
+
+    async def flush():
+        scheduler.schedule_task_reminders(await db.db.add_tasks(user_id, batch))
+        report.imported += len(batch)
+        batch.clear()
+
+    for count, (line, task_data) in enumerate(rows):
+        if count >= max_rows:
+            break
+        if task_data is None:
+            report.invalid_lines.append(line)
+        elif task_data.get('recurrence'):
+            scheduler.schedule_task_reminder(await db.db.add_recurring_task(user_id, task_data))
+            report.recurring += 1
+        else:
+            batch.append(task_data)
+            if len(batch) >= batch_size:
+                await flush()
+    if batch:
+        await flush()
+    return report
+
+
+def _escape(value):
+    return (value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _fold(line):
+    """شکستن خط به تکه‌های حداکثر 75 بایتی (RFC 5545)"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return encoded + b'\r\n'
+    parts, current, size = [], '', 0
+    for char in line:
+        char_size = len(char.encode('utf-8'))
+        if size + char_size > (75 if not parts else 74):
+            parts.append(current)
+            current, size = '', 0
+        current += char
+        size += char_size
+    parts.append(current)
+    return '\r\n '.join(parts).encode('utf-8') + b'\r\n'
+
+
+def _event_lines(uid, stamp, title, task_type, start, duration, reminder_before, notes, extra=()):
+    yield 'BEGIN:VEVENT'
+    yield f'UID:{uid}'
+    yield f'DTSTAMP:{stamp}'
+    yield f"DTSTART:{start.strftime('%Y%m%dT%H%M%S')}"
+    yield f"DURATION:PT{duration or 60}M"
+    yield f'SUMMARY:{_escape(title)}'
+    yield f'CATEGORIES:{_escape(task_type)}'
+    if notes:
+        yield f'DESCRIPTION:{_escape(notes)}'
+    yield from extra
+    if reminder_before:
+        yield 'BEGIN:VALARM'
+        yield 'ACTION:DISPLAY'
+        yield f'DESCRIPTION:{_escape(title)}'
+        yield f'TRIGGER:-PT{reminder_before}M'
+        yield 'END:VALARM'
+    yield 'END:VEVENT'
+
+
+async def export_ics(user_id, out, batch_size=None):
+    """نوشتن همه تسک‌ها و برنامه‌های تکراری کاربر در out (فایل باینری)؛ تعداد رویدادها
+
+    زمان‌ها floating (به وقت محلی) نوشته می‌شوند، همان‌طور که در ربات ثبت شده‌اند.
+    ردیف‌هایی که تاریخ یا زمان نامعتبر دارند ثبت در لاگ و رد می‌شوند.
+    """
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    count = 0
+
+    def write(lines):
+        for line in lines:
+            out.write(_fold(line))
+
+    write(['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//telegram_scheduler//FA', 'CALSCALE:GREGORIAN'])
+    async for tasks in db.db.iter_user_tasks(user_id, batch_size or config.EXPORT_BATCH_SIZE):
+        for task in tasks:
+            try:
+                start = datetime.strptime(f"{task.scheduled_date} {task.scheduled_time}", '%Y-%m-%d %H:%M')
+                # رویداد کامل ساخته و بعد نوشته می‌شود تا ردیف خراب نیمه‌کاره در فایل نماند
+                lines = list(_event_lines(
+                    f'task-{task.id}@telegram-scheduler', stamp, task.title, task.task_type,
+                    start, task.duration, task.reminder_before, task.notes,
+                    [f'X-SCHEDULER-STATUS:{task.status}']
+                ))
+            except (TypeError, ValueError) as e:
+                print(f"Error exporting task {task.id}: {e}")
+                continue
+            write(lines)
+            count += 1
+
+    weekday_names = {number: name for name, number in _ICS_WEEKDAYS.items()}
+    for rule, skipped in await db.db.get_recurring_tasks(user_id):
+        try:
+            start = datetime.strptime(f"{rule.start_date} {rule.scheduled_time}", '%Y-%m-%d %H:%M')
+            rrule = 'RRULE:FREQ=DAILY' if rule.freq == DAILY else 'RRULE:FREQ=WEEKLY'
+            if rule.freq == WEEKLY and rule.weekdays:
+                rrule += ';BYDAY=' + ','.join(weekday_names[int(day)] for day in rule.weekdays.split(','))
+            if rule.end_date:
+                rrule += f";UNTIL={rule.end_date.replace('-', '')}T235959"
+            extra = [rrule, *(
+                f"EXDATE:{date.replace('-', '')}T{rule.scheduled_time.replace(':', '')}00" for date in skipped
+            )]
+            lines = list(_event_lines(
+                f'rule-{rule.id}@telegram-scheduler', stamp, rule.title, rule.task_type,
+                start, rule.duration, rule.reminder_before, rule.notes, extra
+            ))
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Error exporting recurring task {rule.id}: {e}")
+            continue
+        write(lines)
+        count += 1
+
+    write(['END:VCALENDAR'])
+    return count
@@ -0,0 +1,148 @@
+"""قطع‌کننده مدار، AsyncGeminiClient و ParseBatcher با FakeGeminiModel"""
+import asyncio
+import json
+import time
+
+import pytest
+
+from fakes import FakeGeminiModel
+from gemini_client import AsyncGeminiClient, CircuitBreaker, GeminiUnavailable
+from parse_batcher import ParseBatcher
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60, slow_call_threshold=1)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_breaker_half_open_allows_a_single_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01, slow_call_threshold=1)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+
+    breaker.record_success(0.0)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_breaker_failed_probe_reopens():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.01, slow_call_threshold=1)
+    for _ in range(3):
+        breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_slow_call_counts_as_failure():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60, slow_call_threshold=0.5)
+    breaker.record_success(0.6)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_client_stops_calling_model_when_circuit_opens():
+    async def scenario():
+        model = FakeGeminiModel(error_rate=1.0)
+        client = AsyncGeminiClient(model, breaker=CircuitBreaker(2, 60, 1))
+        for _ in range(5):
+            with pytest.raises(GeminiUnavailable):
+                await client.generate('prompt')
+        return model, client
+
+    model, client = run(scenario())
+    assert model.calls == 2
+    assert client.failures == 2 and client.rejected == 3
+
+
+def test_client_timeout_raises_unavailable():
+    async def scenario():
+        client = AsyncGeminiClient(FakeGeminiModel(latency=0.5), timeout=0.05)
+        with pytest.raises(GeminiUnavailable):
+            await client.generate('prompt')
+        return client
+
+    assert run(scenario()).breaker.failures == 1
+
+
+def _batch_response(prompt):
+    """پاسخ جعلی: برای prompt دسته‌ای آرایه با index، به ترتیب معکوس"""
+    texts = json.loads(prompt)
+    if isinstance(texts, str):
+        return json.dumps({'task_title': texts})
+    items = [{'index': i, 'task_title': text} for i, text in enumerate(texts) if text != 'bad']
+    return json.dumps(list(reversed(items)))
+
+
+def _batcher(model, **kwargs):
+    return ParseBatcher(
+        AsyncGeminiClient(model), single_prompt=json.dumps, batch_prompt=json.dumps,
+        validate=lambda data: 'task_title' in data, **kwargs
+    )
+
+
+def test_batcher_fans_out_one_call_to_each_caller():
+    async def scenario():
+        model = FakeGeminiModel(respond=_batch_response)
+        batcher = _batcher(model, window=0.05, max_batch=8)
+        results = await asyncio.gather(*[batcher.parse(f"task {i}") for i in range(5)])
+        return model, batcher, results
+
+    model, batcher, results = run(scenario())
+    assert model.calls == 1
+    assert [result['task_title'] for result in results] == [f"task {i}" for i in range(5)]
+    assert batcher.batches == 1 and batcher.batched_requests == 5
+
+
+def test_batcher_retries_only_missing_items_individually():
+    async def scenario():
+        model = FakeGeminiModel(respond=_batch_response)
+        batcher = _batcher(model, window=0.05, max_batch=8)
+        results = await asyncio.gather(batcher.parse('a'), batcher.parse('bad'), batcher.parse('c'))
+        return model, batcher, results
+
+    model, batcher, results = run(scenario())
+    assert results[0]['task_title'] == 'a' and results[2]['task_title'] == 'c'
+    assert results[1] == {'task_title': 'bad'}
+    assert model.calls == 2 and batcher.single_calls == 1
+
+
+def test_batcher_flushes_at_max_batch():
+    async def scenario():
+        model = FakeGeminiModel(respond=_batch_response)
+        batcher = _batcher(model, window=10, max_batch=3)
+        results = await asyncio.wait_for(
+            asyncio.gather(*[batcher.parse(str(i)) for i in range(6)]), timeout=1
+        )
+        return model, results
+
+    model, results = run(scenario())
+    assert model.calls == 2
+    assert [result['task_title'] for result in results] == [str(i) for i in range(6)]
+
+
+def test_batcher_propagates_unavailable_without_individual_retries():
+    async def scenario():
+        model = FakeGeminiModel(error_rate=1.0)
+        batcher = _batcher(model, window=0.05, max_batch=8)
+        results = await asyncio.gather(
+            batcher.parse('a'), batcher.parse('b'), return_exceptions=True
+        )
+        return model, results
+
+    model, results = run(scenario())
+    assert all(isinstance(result, GeminiUnavailable) for result in results)
+    assert model.calls == 1
@@ -0,0 +1,98 @@
+"""رفتار Outbox در برابر FakeBot: ترتیب اولویت‌ها و توقف صف با RetryAfter"""
+import asyncio
+import io
+
+from telegram.error import RetryAfter
+
+from fakes import FakeBot
+from outbox import BULK, INTERACTIVE, NOTIFICATION, Outbox
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_interactive_messages_are_sent_before_bulk():
+    async def scenario():
+        bot = FakeBot()
+        outbox = Outbox(bot, rate=1000, per_chat_rate=1000, per_chat_burst=1000)
+        futures = [
+            outbox.send_message(1, 'bulk', priority=BULK),
+            outbox.send_message(2, 'notification', priority=NOTIFICATION),
+            outbox.send_message(3, 'interactive', priority=INTERACTIVE),
+        ]
+        outbox.start()
+        await asyncio.gather(*futures)
+        await outbox.stop()
+        return [kwargs['text'] for _, _, _, kwargs in bot.sent]
+
+    assert run(scenario()) == ['interactive', 'notification', 'bulk']
+
+
+def test_same_chat_messages_keep_their_order():
+    async def scenario():
+        bot = FakeBot()
+        outbox = Outbox(bot, rate=1000, per_chat_rate=1000, per_chat_burst=1000)
+        outbox.start()
+        await asyncio.gather(*[outbox.send_message(7, str(i)) for i in range(20)])
+        await outbox.stop()
+        return [kwargs['text'] for _, _, _, kwargs in bot.sent]
+
+    assert run(scenario()) == [str(i) for i in range(20)]
+
+
+def test_retry_after_pauses_the_queue_and_resends():
+    async def scenario():
+        bot = FakeBot(flood_limit=2, retry_after=1)
+        outbox = Outbox(bot, rate=1000, per_chat_rate=1000, per_chat_burst=1000)
+        outbox.start()
+        results = await asyncio.gather(*[outbox.send_message(chat_id, 'x') for chat_id in range(4)])
+        await outbox.stop()
+        return bot, outbox, results
+
+    bot, outbox, results = run(scenario())
+    assert bot.flood_errors >= 1
+    assert len(bot.sent) == 4 and outbox.sent == 4 and outbox.failed == 0
+    assert all(result.message_id for result in results)
+    # ارسال سوم فقط بعد از پایان توقف RetryAfter انجام شده است
+    assert bot.sent[2][0] - bot.sent[1][0] >= 0.9
+
+
+def test_retry_after_exhausted_fails_the_future():
+    async def scenario():
+        bot = FakeBot(flood_limit=0, retry_after=0.01)
+        outbox = Outbox(bot, rate=1000, max_retries=2)
+        outbox.start()
+        try:
+            await outbox.send_message(1, 'x')
+        except RetryAfter:
+            return bot, outbox
+        finally:
+            await outbox.stop()
+
+    bot, outbox = run(scenario())
+    assert bot.flood_errors == 3
+    assert outbox.failed == 1 and outbox.pending == 0
+
+
+def test_retried_photo_is_read_from_the_start():
+    class FloodOnceBot(FakeBot):
+        def __init__(self):
+            super().__init__()
+            self.reads = []
+
+        async def send_photo(self, chat_id, photo, **kwargs):
+            self.reads.append(photo.read())
+            if len(self.reads) == 1:
+                raise RetryAfter(0.01)
+            return await super().send_photo(chat_id, photo, **kwargs)
+
+    async def scenario():
+        bot = FloodOnceBot()
+        outbox = Outbox(bot, rate=1000)
+        outbox.start()
+        await outbox.send_photo(1, io.BytesIO(b'png-bytes'))
+        await outbox.stop()
+        return bot
+
+    assert run(scenario()).reads == [b'png-bytes', b'png-bytes']
@@ -0,0 +1,39 @@
+"""بودجه زمان import ربات و بارگذاری تنبل زیرسیستم‌های سنگین"""
+import os
+import subprocess
+import sys
+
+import config
+import startup
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_bot_is_within_budget():
+    # بهترین از سه اجرا تا نوسان ماشین تست نتیجه را خراب نکند
+    seconds = min(startup.measure_import('bot') for _ in range(3))
+    assert seconds < config.STARTUP_IMPORT_BUDGET, f"import bot took {seconds:.3f}s"
+
+
+def test_import_bot_defers_heavy_modules():
+    code = (
+        "import sys, bot; "
+        "print(','.join(m for m in ('google.generativeai', 'numpy') if m in sys.modules)); "
+        "print(bot.db.db._engine is None)"
+    )
+    result = subprocess.run(
+        [sys.executable, '-W', 'ignore', '-c', code],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    loaded, engine_deferred = result.stdout.strip().splitlines()[-2:]
+    assert loaded == ''
+    assert engine_deferred == 'True'
+
+
+def test_startup_report_records_phases():
+    report = startup.StartupReport()
+    with report.phase('build'):
+        pass
+    report.mark('ready')
+    assert [name for name, _ in report.phases] == ['build', 'ready']
+    assert 'total' in report.report()
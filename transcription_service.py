@@ -0,0 +1,153 @@
+import asyncio
+import importlib.util
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import config
+import whisper_worker
+from metrics import metrics
+
+WHISPER_AVAILABLE = importlib.util.find_spec('whisper') is not None
+if not WHISPER_AVAILABLE:
+    print("Whisper not available, voice processing disabled")
+
+
+class TranscriptionBusy(Exception):
+    """صف تبدیل ویس پر است"""
+
+
+class TranscriptionService:
+    """تبدیل ویس به متن در پروسس‌های worker با صف محدود
+
+    کارها در یک صف asyncio با ظرفیت queue_size قرار می‌گیرند و به تعداد
+    workerها dispatcher آن‌ها را به pool می‌سپارند، پس event loop ربات
+    هیچ‌وقت منتظر Whisper نمی‌ماند. وقتی صف پر است TranscriptionBusy
+    پرتاب می‌شود؛ در خطا یا timeout نتیجه None است.
+    """
+
+    def __init__(self, workers=None, queue_size=None, timeout=None):
+        self.workers = workers or config.WHISPER_WORKERS
+        self.queue_size = queue_size or config.WHISPER_QUEUE_SIZE
+        self.timeout = timeout or config.WHISPER_TIMEOUT
+        self.available = WHISPER_AVAILABLE
+        self._executor = None
+        self._queue = None
+        self._dispatchers = []
+        self._running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self._waits = deque(maxlen=500)
+        self._latencies = deque(maxlen=500)
+        metrics.gauge('whisper_queue_depth', lambda: self.queue_depth)
+
+    def start(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.queue_size)
+            self._dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+
+    async def stop(self):
+        for dispatcher in self._dispatchers:
+            dispatcher.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+        self._dispatchers = []
+        self._queue = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @property
+    def queue_depth(self):
+        """کارهای در انتظار به‌علاوه کارهای در حال اجرا"""
+        waiting = self._queue.qsize() if self._queue is not None else 0
+        return waiting + self._running
+
+    @staticmethod
+    def _percentile(values, fraction):
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+    def stats(self):
+        return {
+            'queue_depth': self.queue_depth,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'timeouts': self.timeouts,
+            'wait_p50': round(self._percentile(self._waits, 0.5), 3),
+            'latency_p50': round(self._percentile(self._latencies, 0.5), 3),
+            'latency_p95': round(self._percentile(self._latencies, 0.95), 3),
+        }
+
+    async def transcribe(self, audio):
+        """متن ویس یا None؛ اگر صف پر باشد TranscriptionBusy"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((audio, future, time.monotonic()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            metrics.inc('whisper_rejected_total')
+            raise TranscriptionBusy(f"{self.queue_depth} voice notes in queue")
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            metrics.inc('whisper_timeouts_total')
+            future.cancel()
+            print("Voice transcription timed out")
+            return None
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            audio, future, queued_at = await self._queue.get()
+            started = time.monotonic()
+            self._running += 1
+            try:
+                if future.done():
+                    # کاربر قبلاً timeout خورده؛ worker را مشغول نکن
+                    continue
+                self._waits.append(started - queued_at)
+                metrics.observe('whisper_queue_wait_seconds', started - queued_at)
+                text = await loop.run_in_executor(self._executor, whisper_worker.transcribe, audio)
+                self.completed += 1
+                self._latencies.append(time.monotonic() - queued_at)
+                metrics.observe('whisper_transcribe_seconds', time.monotonic() - started)
+                if not future.done():
+                    future.set_result(text)
+            except asyncio.CancelledError:
+                raise
+            except BrokenProcessPool:
+                # یک worker کرش کرده (مثلاً کمبود حافظه)؛ pool از نو ساخته می‌شود
+                self.failed += 1
+                print("Transcription pool broken, restarting")
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+                self.start()
+                if not future.done():
+                    future.set_result(None)
+            except Exception as e:
+                self.failed += 1
+                print(f"Error in transcription: {e}")
+                if not future.done():
+                    future.set_result(None)
+            finally:
+                self._running -= 1
+                self._queue.task_done()
+
+
+# سرویس سراسری تبدیل ویس
+transcription_service = TranscriptionService()
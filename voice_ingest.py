@@ -0,0 +1,59 @@
+"""دریافت ویس در حافظه و تبدیل آن به صوت خام برای Whisper
+
+فایل OGG/Opus تلگرام در یک buffer دانلود می‌شود و از طریق pipe به ffmpeg
+داده می‌شود؛ خروجی PCM مونو 16kHz مستقیماً به آرایه float32 تبدیل
+می‌شود و هیچ فایل موقتی روی دیسک نوشته نمی‌شود.
+"""
+import asyncio
+
+import config
+
+SAMPLE_RATE = 16000  # نرخ نمونه‌برداری مورد انتظار Whisper
+
+
+class VoiceRejected(Exception):
+    """ویس از محدودیت حجم یا مدت بیشتر است"""
+
+
+def check_limits(file_size=None, duration=None):
+    if file_size and file_size > config.VOICE_MAX_BYTES:
+        raise VoiceRejected(f"voice too large: {file_size} bytes")
+    if duration and duration > config.VOICE_MAX_SECONDS:
+        raise VoiceRejected(f"voice too long: {duration} seconds")
+
+
+async def download(voice):
+    """دانلود ویس تلگرام به صورت bytes با بررسی محدودیت‌ها"""
+    check_limits(voice.file_size, voice.duration)
+    voice_file = await voice.get_file()
+    data = bytes(await voice_file.download_as_bytearray())
+    check_limits(len(data))
+    return data
+
+
+async def decode(data):
+    """تبدیل OGG/Opus به آرایه float32 مونو 16kHz، یا None در صورت خطا"""
+    try:
+        process = await asyncio.create_subprocess_exec(
+            config.FFMPEG_PATH, '-nostdin', '-loglevel', 'error',
+            '-i', 'pipe:0',
+            # ویس‌های طولانی‌تر از حد مجاز هنگام decode بریده می‌شوند
+            '-t', str(config.VOICE_MAX_SECONDS),
+            '-f', 's16le', '-ac', '1', '-ar', str(SAMPLE_RATE), 'pipe:1',
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        output, errors = await process.communicate(data)
+    except OSError as e:
+        print(f"Error starting audio decoder: {e}")
+        return None
+
+    if process.returncode != 0:
+        print(f"Error decoding voice: {errors.decode(errors='ignore').strip()}")
+        return None
+    if not output:
+        return None
+
+    import numpy as np
+    return np.frombuffer(output, np.int16).astype(np.float32) / 32768.0
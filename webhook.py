@@ -0,0 +1,167 @@
+"""سرور webhook داخلی برای دریافت آپدیت‌های تلگرام
+
+آپدیت‌ها از طریق POST روی WEBHOOK_PATH می‌رسند، هدر
+X-Telegram-Bot-Api-Secret-Token با WEBHOOK_SECRET مقایسه می‌شود و
+آپدیت در update_queue خود Application قرار می‌گیرد تا همان هندلرها با
+همزمانی concurrent_updates اجرایش کنند. پاسخ 200 بلافاصله بعد از صف
+شدن برمی‌گردد. اتصال‌ها keep-alive هستند و GET /healthz برای load
+balancer وضعیت سرور را برمی‌گرداند.
+
+برای تست محلی کافی است یک آپدیت ضبط شده را POST کرد:
+
+    curl -X POST -H 'X-Telegram-Bot-Api-Secret-Token: <secret>' \\
+         -H 'Content-Type: application/json' -d @update.json \\
+         http://127.0.0.1:8443/telegram
+"""
+import asyncio
+import hmac
+import json
+import secrets
+import time
+
+from telegram import Update
+
+import config
+from metrics import metrics
+
+SECRET_HEADER = 'x-telegram-bot-api-secret-token'
+
+_REASONS = {
+    200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found',
+    405: 'Method Not Allowed', 503: 'Service Unavailable',
+}
+
+
+class WebhookServer:
+    """سرور HTTP روی asyncio که آپدیت‌ها را به Application می‌سپارد"""
+
+    def __init__(self, application, host=None, port=None, path=None, secret_token=None,
+                 max_body=None, idle_timeout=30):
+        self.application = application
+        self.host = host or config.WEBHOOK_LISTEN
+        self.port = config.WEBHOOK_PORT if port is None else port
+        self.path = path or config.WEBHOOK_PATH
+        # بدون WEBHOOK_SECRET یک توکن تصادفی ساخته می‌شود؛ چند نمونه پشت load balancer باید توکن مشترک داشته باشند
+        self.secret_token = secret_token or config.WEBHOOK_SECRET or secrets.token_urlsafe(32)
+        self.max_body = max_body or config.WEBHOOK_MAX_BODY
+        self.idle_timeout = idle_timeout
+        self.accepting = False
+        self._server = None
+        self._connections = set()
+        self._busy = set()
+        self.received = 0
+        self.rejected = 0
+        metrics.gauge('update_queue_depth', lambda: self.application.update_queue.qsize())
+
+    async def start(self):
+        if self._server is None:
+            self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+            self.accepting = True
+            print(f"🌐 Webhook listening on {self.host}:{self.port}{self.path}")
+
+    async def stop(self, drain_timeout=None):
+        """توقف پذیرش اتصال جدید و انتظار برای درخواست‌های در حال دریافت
+
+        اتصالی که خط اول درخواستش رسیده تا پاسخ دادن (یا drain_timeout) صبر
+        داده می‌شود و اتصال‌های keep-alive بیکار فوراً بسته می‌شوند. آپدیت‌های صف شده را
+        خود Application.stop() تا آخر پردازش می‌کند.
+        """
+        if self._server is None:
+            return
+        self.accepting = False
+        self._server.close()
+        for connection in self._connections - self._busy:
+            connection.cancel()
+        if self._busy:
+            _, pending = await asyncio.wait(
+                set(self._busy), timeout=drain_timeout or config.WEBHOOK_DRAIN_TIMEOUT
+            )
+            for connection in pending:
+                connection.cancel()
+        await self._server.wait_closed()
+        self._server = None
+
+    async def _handle_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            keep_alive = True
+            while keep_alive and self.accepting:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                started = time.perf_counter()
+                status, payload = await self._route(method, path, headers, body)
+                metrics.observe('webhook_request_seconds', time.perf_counter() - started, status=status)
+
+                keep_alive = (
+                    status < 400 and self.accepting
+                    and headers.get('connection', '').lower() != 'close'
+                )
+                writer.write(
+                    f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1')
+                    + payload
+                )
+                await writer.drain()
+                self._busy.discard(task)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self._connections.discard(task)
+            self._busy.discard(task)
+            writer.close()
+
+    async def _read_request(self, reader):
+        """(method, path, headers, body) یا None وقتی اتصال بسته شده"""
+        request_line = await asyncio.wait_for(reader.readline(), timeout=self.idle_timeout)
+        if not request_line.strip():
+            return None
+        # از اینجا اتصال در حال دریافت درخواست است و stop() برایش صبر می‌کند
+        self._busy.add(asyncio.current_task())
+        method, path, _ = request_line.decode('latin-1').split(' ', 2)
+
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout=self.idle_timeout)
+            if not line.strip():
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get('content-length') or 0)
+        if length > self.max_body:
+            raise ValueError(f"body too large: {length}")
+        body = await asyncio.wait_for(reader.readexactly(length), timeout=self.idle_timeout) if length else b''
+        return method, path.split('?')[0], headers, body
+
+    async def _route(self, method, path, headers, body):
+        if path == '/healthz':
+            status = 200 if self.accepting and self.application.running else 503
+            return status, json.dumps({'ok': status == 200}).encode()
+        if path != self.path:
+            return 404, b'{}'
+        if method != 'POST':
+            return 405, b'{}'
+        if not hmac.compare_digest(headers.get(SECRET_HEADER, '').encode(), self.secret_token.encode()):
+            self.rejected += 1
+            metrics.inc('webhook_rejected_total', reason='secret')
+            return 403, b'{}'
+        if not self.application.running:
+            return 503, b'{}'
+
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+            if update is None:
+                raise ValueError("empty update")
+        except Exception as e:
+            self.rejected += 1
+            metrics.inc('webhook_rejected_total', reason='malformed')
+            print(f"Error decoding webhook update: {e}")
+            return 400, b'{}'
+
+        self.received += 1
+        await self.application.update_queue.put(update)
+        return 200, b'{}'
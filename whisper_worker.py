@@ -0,0 +1,21 @@
+"""تبدیل ویس به متن داخل پروسس worker
+
+مدل Whisper در هر worker فقط یک بار و هنگام اولین کار بارگذاری می‌شود.
+"""
+import config
+
+_model = None
+
+
+def _load_model():
+    global _model
+    if _model is None:
+        import whisper
+        _model = whisper.load_model(config.WHISPER_MODEL)
+    return _model
+
+
+def transcribe(audio):
+    """متن فارسی ویس؛ audio آرایه float32 مونو 16kHz است"""
+    result = _load_model().transcribe(audio, language="fa")
+    return result["text"].strip()